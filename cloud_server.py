@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify, render_template_string
 import logging
 import datetime
 import json
+import gzip
 import os
 
 # Setup Logging
@@ -112,13 +113,22 @@ def clear_storage():
     save_db()
     return render_template_string("<script>window.location.href='/'</script>")
 
+def read_json_body():
+    """Parse the request body as JSON, accepting gzip bodies (Content-Encoding: gzip)."""
+    raw = request.get_data()
+    if not raw:
+        return None
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
 def process_payload(endpoint_name):
     """
     Unified Processor that handles guessing fields for the UI.
     Explicitly looking for 'device_id' and determining 'type' from endpoint.
     """
     try:
-        payload = request.json
+        payload = read_json_body()
         if payload is None:
             return jsonify({"status": "error", "message": "No JSON payload"}), 400
 
@@ -1,19 +1,36 @@
 import os
+import configparser
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# config.ini (repo root, or CONFIG_INI): defaults for the keys read from it below, env vars take precedence
+_ini = configparser.ConfigParser(interpolation=None)
+_ini.read(os.getenv('CONFIG_INI') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.ini'))
+
 device_id = os.getenv('GATEWAY_ID')
 port_app = int(os.getenv('PORT_WEB', 5001))
 hostmqtt = os.getenv('MQTT_HOST')
 port_mqtt = int(os.getenv('MQTT_PORT', 1883))
 user_mqtt = os.getenv('MQTT_USERNAME')
 pass_mqtt = os.getenv('MQTT_PASSWORD')
+# Sensor ingest workers (partitioned by device_id): MQTT_WORKERS or [MQTT] WORKERS
+mqtt_workers = int(os.getenv('MQTT_WORKERS') or _ini.get('MQTT', 'WORKERS', fallback='') or 1)
+# Set to consume via $share/<group>/sensor/data/#: MQTT_SHARE_GROUP or [MQTT] SHARE_GROUP
+mqtt_share_group = os.getenv('MQTT_SHARE_GROUP', _ini.get('MQTT', 'SHARE_GROUP', fallback='')).strip()
+ingest_queue_size = int(os.getenv('INGEST_QUEUE_SIZE', 10000)) # Per ingest queue (MQTT workers, DB writer)
+ingest_shed_policy = os.getenv('INGEST_SHED_POLICY', 'drop_oldest') # drop_oldest | drop_newest | sample
 secret_key = os.getenv('SECRET_KEY')
 database = os.getenv('DATABASE', 'app.db')
 token_api = os.getenv('TOKEN_API')
 host_api = os.getenv('HOST_API')
 
+# Retention: raw device_records older than RAW_RETENTION_DAYS are rolled into 1m/1h/1d tables
+raw_retention_days = int(os.getenv('RAW_RETENTION_DAYS', 30))
+rollup_1m_retention_days = int(os.getenv('ROLLUP_1M_RETENTION_DAYS', 90))
+rollup_1h_retention_days = int(os.getenv('ROLLUP_1H_RETENTION_DAYS', 730)) # 1d rollups are kept forever
+retention_chunk = int(os.getenv('RETENTION_CHUNK', 5000)) # Raw rows per roll-up/delete transaction
+
 basedir = os.path.abspath(os.path.dirname(__file__))
 SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, database)
 SQLALCHEMY_TRACK_MODIFICATIONS = True
\ No newline at end of file
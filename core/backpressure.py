@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import deque
+
+
+class LatencyStats:
+    """Rolling window of latencies (seconds) -> count / avg / p50 / p99 / max in ms."""
+
+    WINDOW = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=LatencyStats.WINDOW)
+        self.count = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {'count': count, 'avg_ms': None, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+        return {
+            'count': count,
+            'avg_ms': round(sum(samples) / len(samples) * 1000, 2),
+            'p50_ms': pct(0.50),
+            'p99_ms': pct(0.99),
+            'max_ms': round(samples[-1] * 1000, 2)
+        }
+
+
+class IngestQueue:
+    """
+    Bounded FIFO between ingest stages with a load-shedding policy when it is full:
+      drop_newest  reject the incoming item
+      drop_oldest  evict the oldest sheddable item to make room
+      sample       above SAMPLE_HIGH_WATER, keep at most one pending item per device
+                   (a device's newer reading replaces its queued one in place), drop_newest when full
+    Alarm items (fire, gas, smoke) are never shed: they evict a sheddable item, or go over
+    capacity when the queue holds only alarms.
+    Alarms and sheddable items are kept in two deques (get() takes the older head), so eviction
+    is a popleft and memory never holds more than the items actually queued.
+    on_drop(item) is called for every shed item (e.g. to undo the rate limiter mark).
+    As with queue.Queue, a consumer that calls task_done() after handling items lets
+    join() wait until everything queued so far was handled (or shed).
+    """
+
+    POLICIES = ('drop_newest', 'drop_oldest', 'sample')
+    SAMPLE_HIGH_WATER = 0.5  # Fraction of capacity where per-device sampling starts
+
+    def __init__(self, name, maxsize=10000, policy='drop_oldest', on_drop=None):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy if policy in IngestQueue.POLICIES else 'drop_oldest'
+        self.on_drop = on_drop
+        self._sheddable = deque()  # [seq, enqueued_at, key, item]
+        self._alarms = deque()
+        self._by_key = {}          # key -> queued sheddable entry (sample policy)
+        self._seq = 0
+        self._unfinished = 0       # Accepted, not yet shed or task_done()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._all_done = threading.Condition(self._lock)
+        self.enqueued = 0
+        self.dropped = {'full': 0, 'evicted': 0, 'sampled': 0}
+        self.max_depth = 0
+        self.wait = LatencyStats()
+
+        ingest_metrics.register(self)
+
+    def __len__(self):
+        return len(self._sheddable) + len(self._alarms)
+
+    def _forget(self, entry):
+        # Caller holds the lock
+        if entry[2] is not None and self._by_key.get(entry[2]) is entry:
+            del self._by_key[entry[2]]
+
+    def put(self, item, key=None, alarm=False):
+        """Never blocks. Returns False when `item` itself was shed."""
+        shed, accepted = None, True
+        with self._cond:
+            queued = None
+            if not alarm and self.policy == 'sample' and key is not None \
+                    and len(self) >= self.maxsize * IngestQueue.SAMPLE_HIGH_WATER:
+                queued = self._by_key.get(key)
+
+            if queued is not None:
+                # Newer reading takes the queued one's place, depth unchanged
+                shed, queued[3] = queued[3], item
+                self.dropped['sampled'] += 1
+                self.enqueued += 1
+            else:
+                if len(self) >= self.maxsize:
+                    if (alarm or self.policy == 'drop_oldest') and self._sheddable:
+                        evicted = self._sheddable.popleft()
+                        self._forget(evicted)
+                        shed = evicted[3]
+                        self.dropped['evicted'] += 1
+                        self._unfinished -= 1
+                    elif not alarm:
+                        self.dropped['full'] += 1
+                        shed, accepted = item, False
+                    # An alarm with nothing sheddable left goes over capacity
+
+                if accepted:
+                    self._seq += 1
+                    entry = [self._seq, time.monotonic(), None if alarm else key, item]
+                    (self._alarms if alarm else self._sheddable).append(entry)
+                    if entry[2] is not None:
+                        self._by_key[key] = entry
+                    self.enqueued += 1
+                    self._unfinished += 1
+                    self.max_depth = max(self.max_depth, len(self))
+                    self._cond.notify()
+
+        # on_drop runs outside the queue lock
+        if shed is not None and self.on_drop:
+            self.on_drop(shed)
+        return accepted
+
+    def get(self, timeout=None):
+        """Oldest item; raises IndexError when nothing arrived within timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._sheddable and not self._alarms:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise IndexError("empty")
+                self._cond.wait(remaining)
+            if not self._alarms:
+                queue = self._sheddable
+            elif not self._sheddable:
+                queue = self._alarms
+            else:
+                queue = self._alarms if self._alarms[0][0] < self._sheddable[0][0] else self._sheddable
+            entry = queue.popleft()
+            self._forget(entry)
+        self.wait.add(time.monotonic() - entry[1])
+        return entry[3]
+
+    def task_done(self, count=1):
+        """Consumer side: `count` items returned by get() are fully handled."""
+        with self._lock:
+            self._unfinished = max(0, self._unfinished - count)
+            if not self._unfinished:
+                self._all_done.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until every accepted item was shed or task_done(). Returns False on timeout."""
+        with self._lock:
+            return self._all_done.wait_for(lambda: not self._unfinished, timeout)
+
+    def stats(self):
+        with self._cond:
+            depth = len(self)
+        return {
+            'policy': self.policy,
+            'depth': depth,
+            'capacity': self.maxsize,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'dropped': dict(self.dropped),
+            'wait': self.wait.snapshot()
+        }
+
+
+class IngestMetrics:
+    """Registry of ingest queues and stage timings, served by /api/ingest_stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = []
+        self._latency = {}
+        self._counters = {}
+
+    def register(self, queue):
+        with self._lock:
+            self._queues.append(queue)
+
+    def latency(self, name):
+        """Shared LatencyStats of a pipeline stage (created on first use)."""
+        with self._lock:
+            return self._latency.setdefault(name, LatencyStats())
+
+    def counters(self, name, provider):
+        """provider() -> dict of counters reported under name."""
+        with self._lock:
+            self._counters[name] = provider
+
+    def snapshot(self):
+        with self._lock:
+            queues, latency, counters = list(self._queues), dict(self._latency), dict(self._counters)
+        return {
+            'queues': {q.name: q.stats() for q in queues},
+            'latency': {name: stats.snapshot() for name, stats in latency.items()},
+            'counters': {name: provider() for name, provider in counters.items()}
+        }
+
+
+# Shared instance (queues register themselves)
+ingest_metrics = IngestMetrics()
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from config import config
+from flask_server.app import db
+from flask_server.app.model.model import Device, DeviceRecord
+from flask_server.app.model.user_model import User
+
+
+class DashboardFeed:
+    """
+    Push-based live dashboard.
+    Ingest calls notify() after writes; at most once per interval the feed reads the new
+    rows ONCE, finds the users owning the changed devices and publishes to each of them:
+      <gateway_id>/dashboard/<user_id>   {"last_record_id", "server_time"} (not retained)
+    The WebSocket broker has no per-user ACL, so the message only says *that* something changed:
+    readings, device names and status are fetched by the browser from the authenticated
+    /api/dashboard_updates and /api/records, which filter by the logged-in user.
+    /api/dashboard_updates is served from snapshot(): built once per change and per user, then
+    from memory, so the DB cost follows data changes, not the number of open pages.
+    """
+
+    MAX_ROWS = 1000  # New rows read per publish cycle
+
+    def __init__(self):
+        self.app = None
+        self.publish = None
+        self.interval = 1.0
+        self.last_record_id = None
+        self._dirty = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._snapshots = {}  # user_id -> dashboard snapshot (HomeController.dashboard_snapshot)
+        self._version = 0     # Bumped on every change, a snapshot built across a change is not cached
+
+    @staticmethod
+    def topic(user_id, suffix=None):
+        topic = f"{config.device_id}/dashboard/{user_id}"
+        return f"{topic}/{suffix}" if suffix else topic
+
+    def start(self, app, publish, interval=1.0):
+        """publish: callable(topic, message, retain) e.g. MqttSensor.publish_message"""
+        self.app = app
+        self.publish = publish
+        self.interval = interval
+        with app.app_context():
+            self.last_record_id = db.session.query(db.func.max(DeviceRecord.id)).scalar() or 0
+            self.clear_retained()
+        self._thread = threading.Thread(target=self._run, name="dashboard-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        """Mark data as changed (cheap, safe from any thread; no-op until started)."""
+        if self._thread:
+            self._dirty.set()
+
+    def snapshot(self, user_id):
+        """
+        Dashboard snapshot of a user, from memory when nothing changed since it was built.
+        Not cached while the feed is not running (nothing would refresh it).
+        """
+        from flask_server.app.controller.home_Controller import HomeController
+        with self._lock:
+            data, version = self._snapshots.get(user_id), self._version
+        if data is None:
+            data = HomeController.dashboard_snapshot(user_id)
+            with self._lock:
+                if self._thread and version == self._version:
+                    self._snapshots[user_id] = data
+        return dict(data, server_time=time.time())
+
+    def forget(self, user_id):
+        """Drop a user's cached snapshot (devices added, renamed or deleted)."""
+        with self._lock:
+            self._version += 1
+            self._snapshots.pop(user_id, None)
+
+    def _refresh(self, user_ids):
+        # Rebuild the snapshots somebody is watching before signalling, drop the others
+        from flask_server.app.controller.home_Controller import HomeController
+        with self._lock:
+            self._version += 1
+            version = self._version
+            watched = [user_id for user_id in user_ids if self._snapshots.pop(user_id, None) is not None]
+        for user_id in watched:
+            data = HomeController.dashboard_snapshot(user_id)
+            with self._lock:
+                if version == self._version:
+                    self._snapshots[user_id] = data
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.interval) # Coalesce bursts into one publish
+            self._dirty.clear()
+            try:
+                with self.app.app_context():
+                    self.publish_changes()
+            except Exception as e:
+                print(f"[DASHBOARD FEED] Error: {e}")
+
+    def clear_retained(self):
+        """Remove the retained per-user snapshots older gateway versions left on the broker."""
+        for (user_id,) in db.session.query(User.id).all():
+            self.publish(DashboardFeed.topic(user_id), "", True)
+            self.publish(DashboardFeed.topic(user_id, 'records'), "", True)
+
+    def publish_changes(self):
+        rows = db.session.query(DeviceRecord.id, DeviceRecord.device_id)\
+                         .filter(DeviceRecord.id > self.last_record_id)\
+                         .order_by(DeviceRecord.id.asc()).limit(DashboardFeed.MAX_ROWS).all()
+        if not rows:
+            return 0
+        self.last_record_id = rows[-1].id
+        if len(rows) == DashboardFeed.MAX_ROWS:
+            self._dirty.set() # More left, continue next cycle
+
+        # Which users own the devices that changed
+        user_ids = {user_id for (user_id,) in db.session.query(Device.user_id).distinct()
+                    .filter(Device.device_id.in_({r.device_id for r in rows}), Device.user_id.isnot(None)).all()}
+
+        self._refresh(user_ids)
+        message = json.dumps({'last_record_id': self.last_record_id, 'server_time': time.time()})
+        for user_id in user_ids:
+            self.publish(DashboardFeed.topic(user_id), message, False)
+        return len(user_ids)
+
+
+# Shared instance: ingest paths call dashboard_feed.notify()
+dashboard_feed = DashboardFeed()
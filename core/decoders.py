@@ -0,0 +1,120 @@
+import json
+
+# Optional binary formats for constrained nodes (pip install msgpack / cbor2)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class DecoderRegistry:
+    """
+    Payload decoding for sensor messages.
+    - decode(): JSON, MessagePack or CBOR, picked by topic suffix (.../msgpack, .../cbor) or first byte.
+    - extractor(type): reading dict -> DeviceRecord columns. One function per sensor type is generated
+      at startup with its keys/aliases/conversions inlined, so a message costs one data.get per key
+      instead of a generic loop.
+    """
+
+    # Every extractor returns all of these (multi-row INSERT needs the same keys in every row)
+    COLUMNS = ('power', 'voltage', 'current', 'frequency', 'energy', 'humidity', 'temperature',
+               'weather', 'fire', 'gas', 'gas_ppm', 'gas_voltage', 'smoke', 'lux', 'water',
+               'water_level', 'total_volume', 'distance')
+
+    # Payload keys accepted for a column, first match wins
+    ALIASES = {
+        'humidity': ('humidity', 'hum'),
+        'temperature': ('temperature', 'temp'),
+    }
+
+    # Columns read per routed type (sensor/data/<type>/<device_id>).
+    # None = legacy topic, the fields ESP32 nodes send without a type.
+    TYPE_FIELDS = {
+        None: ('power', 'humidity', 'temperature', 'weather', 'fire', 'gas', 'gas_ppm', 'gas_voltage',
+               'smoke', 'lux', 'distance'),
+        'power': ('power', 'voltage', 'current', 'frequency', 'energy'),
+        'lux': ('lux',),
+        'gas': ('gas', 'gas_ppm', 'gas_voltage'),
+        'smoke': ('smoke',),
+        'water': ('water', 'water_level', 'total_volume'),
+        'fire': ('fire', 'temperature', 'smoke'),
+        'weather': ('weather', 'temperature'),
+        'humidity_temp': ('humidity', 'temperature'),
+        'ultrasonic': ('distance',),
+    }
+
+    FORMATS = ('json', 'msgpack', 'cbor')
+
+    def __init__(self):
+        self._extractors = {t: self._compile(t, fields) for t, fields in DecoderRegistry.TYPE_FIELDS.items()}
+
+    @staticmethod
+    def _converter(column):
+        if column == 'weather':
+            return 'str'
+        if column == 'fire':
+            return 'int'
+        return 'float'
+
+    @staticmethod
+    def _compile(sensor_type, fields):
+        """Generate `def extract(data)` with one inlined lookup (+ alias fallbacks) per field."""
+        lines = ["def extract(data):", "    get = data.get"]
+        values = {}
+        for i, column in enumerate(fields):
+            keys = DecoderRegistry.ALIASES.get(column, (column,))
+            lines.append(f"    v{i} = get({keys[0]!r})")
+            for alias in keys[1:]:
+                lines.append(f"    if v{i} is None: v{i} = get({alias!r})")
+            values[column] = f"None if v{i} is None else {DecoderRegistry._converter(column)}(v{i})"
+        items = ", ".join(f"{c!r}: {values.get(c, 'None')}" for c in DecoderRegistry.COLUMNS)
+        lines.append(f"    return {{'device_id': get('device_id'), {items}}}")
+
+        namespace = {}
+        exec(compile("\n".join(lines), f"<extractor {sensor_type or 'default'}>", "exec"), namespace)
+        return namespace['extract']
+
+    def extractor(self, sensor_type=None):
+        if sensor_type == 'humidity-temp':
+            sensor_type = 'humidity_temp'
+        return self._extractors.get(sensor_type, self._extractors[None])
+
+    @staticmethod
+    def detect_format(payload, topic_format=None):
+        """topic suffix first, then the first byte (JSON text starts with '{', '[' or whitespace)."""
+        if topic_format in DecoderRegistry.FORMATS:
+            return topic_format
+        if not payload:
+            return 'json'
+        first = payload[0]
+        if first in b'{[ \t\r\n':
+            return 'json'
+        # CBOR: map (major type 5) or self-describe tag 55799
+        if 0xa0 <= first <= 0xbf or payload[:3] == b'\xd9\xd9\xf7':
+            return 'cbor'
+        # MessagePack: fixmap, fixarray, map16/32, array16/32
+        # (a CBOR array starts in the same range: publish those on .../cbor)
+        if 0x80 <= first <= 0x9f or first in (0xdc, 0xdd, 0xde, 0xdf):
+            return 'msgpack'
+        return 'json'
+
+    @staticmethod
+    def decode(payload, topic_format=None):
+        fmt = DecoderRegistry.detect_format(payload, topic_format)
+        if fmt == 'msgpack':
+            if msgpack is None:
+                raise ValueError("MessagePack payload but the msgpack package is not installed")
+            return msgpack.unpackb(payload, raw=False)
+        if fmt == 'cbor':
+            if cbor2 is None:
+                raise ValueError("CBOR payload but the cbor2 package is not installed")
+            return cbor2.loads(payload)
+        return json.loads(payload)
+
+
+# Shared instance, extractors are compiled once at import
+decoders = DecoderRegistry()
@@ -0,0 +1,116 @@
+import bisect
+import threading
+from array import array
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_server.app.model.model import DeviceLatest, DeviceRecord
+
+
+class DeviceStateCache:
+    """
+    Process-wide last accepted reading per device_id (timestamp + values).
+    Lets the ingest rate limiter decide drop/accept in O(1) without touching SQLite.
+    Accepted timestamps (epoch floats, array('d')) are kept sorted per device for HISTORY_WINDOW
+    before last_seen, so readings that arrive out of order (device backlogs with their own
+    timestamps) are rate limited against their real neighbours. Older timestamps, and anything
+    before what this process has seen (after warm() only last_seen is known), are checked with
+    one indexed device_records lookup.
+    """
+
+    # Accepted timestamps remembered per device, relative to its last_seen (~2.3 KB at 5 min rate)
+    HISTORY_WINDOW = timedelta(days=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._app = None
+        # device_id -> {'last_seen': datetime, 'values': dict, 'accepted': array('d'), 'covered_from': float}
+        # covered_from: every accepted reading at or after this epoch is in 'accepted'
+        self._state = {}
+
+    def warm(self):
+        """Load the latest reading of every device from device_latest (call once at startup, inside an app context)."""
+        self._app = current_app._get_current_object()
+        rows = DeviceLatest.query.all()
+        with self._lock:
+            for row in rows:
+                seen = row.last_seen.timestamp() if row.last_seen else None
+                self._state[row.device_id] = {'last_seen': row.last_seen, 'values': row.to_dict(),
+                                              'accepted': array('d', [seen] if seen else []),
+                                              'covered_from': seen if seen else float('inf')}
+        print(f"[DEVICE STATE] Warmed cache for {len(rows)} devices")
+        return len(rows)
+
+    def get(self, device_id):
+        with self._lock:
+            state = self._state.get(device_id)
+            return {'last_seen': state['last_seen'], 'values': state['values']} if state else None
+
+    def last_seen(self, device_id):
+        with self._lock:
+            state = self._state.get(device_id)
+            return state['last_seen'] if state else None
+
+    def is_rate_limited(self, device_id, ts, min_interval):
+        """True when an accepted reading of device_id lies less than min_interval before OR after ts."""
+        epoch, gap = ts.timestamp(), min_interval.total_seconds()
+        with self._lock:
+            state = self._state.get(device_id)
+            if not state:
+                return False
+            accepted = state['accepted']
+            i = bisect.bisect_left(accepted, epoch)
+            if i > 0 and epoch - accepted[i - 1] < gap:
+                return True
+            if i < len(accepted) and accepted[i] - epoch < gap:
+                return True
+            if epoch - gap >= state['covered_from']:
+                return False
+        # Neighbours older than the remembered history: ask the table (device_id, created_at index)
+        return self._stored_near(device_id, ts, min_interval)
+
+    def _stored_near(self, device_id, ts, min_interval):
+        if self._app is None:
+            return False
+        with self._app.app_context():
+            return DeviceRecord.query.with_entities(DeviceRecord.id)\
+                               .filter(DeviceRecord.device_id == device_id,
+                                       DeviceRecord.created_at > ts - min_interval,
+                                       DeviceRecord.created_at < ts + min_interval).first() is not None
+
+    def mark_accepted(self, device_id, ts, values=None):
+        """Record an accepted write. last_seen / values only move forward in time."""
+        epoch = ts.timestamp()
+        with self._lock:
+            state = self._state.setdefault(device_id, {'last_seen': None, 'values': {}, 'accepted': array('d'),
+                                                       'covered_from': epoch})
+            accepted = state['accepted']
+            accepted.insert(bisect.bisect_left(accepted, epoch), epoch)
+            if state['last_seen'] is None or ts >= state['last_seen']:
+                state['last_seen'] = ts
+                state['values'] = dict(values) if values else {}
+                # Drop timestamps older than the window, the DB lookup covers them from now on.
+                # Only when time moves forward: a backlog burst keeps its (not yet flushed) readings.
+                horizon = epoch - DeviceStateCache.HISTORY_WINDOW.total_seconds()
+                old = bisect.bisect_left(accepted, horizon)
+                if old:
+                    del accepted[:old]
+                    state['covered_from'] = max(state['covered_from'], horizon)
+
+    def forget(self, device_id, ts=None):
+        """Undo mark_accepted (write failed). Without ts the whole device state is dropped."""
+        with self._lock:
+            state = self._state.get(device_id)
+            if not state:
+                return
+            if ts is None:
+                self._state.pop(device_id, None)
+                return
+            accepted, epoch = state['accepted'], ts.timestamp()
+            i = bisect.bisect_left(accepted, epoch)
+            if i < len(accepted) and accepted[i] == epoch:
+                del accepted[i]
+            if state['last_seen'] == ts:
+                state['last_seen'] = datetime.fromtimestamp(accepted[-1]) if accepted else None
+
+# Shared instance used by MQTT ingest and the HTTP controllers
+device_state = DeviceStateCache()
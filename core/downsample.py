@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class Downsampler:
+    """
+    Visual downsampling of a (x, y) series to at most `threshold` points.
+    Both modes return the indices of the kept points (sorted), so the caller can pick x/y/extra columns.
+      lttb    Largest-Triangle-Three-Buckets, keeps the visual shape of smooth series
+      minmax  min and max of every bucket, never hides a spike (alarms)
+    """
+
+    MODES = ('lttb', 'minmax')
+
+    @staticmethod
+    def lttb(x, y, threshold):
+        n = len(x)
+        if threshold >= n or threshold < 3:
+            return np.arange(n)
+
+        # threshold-2 buckets between the fixed first and last points
+        edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+        indices = np.empty(threshold, dtype=np.int64)
+        indices[0], indices[-1] = 0, n - 1
+
+        a = 0
+        for i in range(threshold - 2):
+            start, end = edges[i], edges[i + 1]
+            # Average point of the next bucket (the last point for the last bucket)
+            next_start = end
+            next_end = edges[i + 2] if i + 2 < len(edges) else n
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+
+            # Triangle area (x2) between the previous kept point, each candidate and the next average
+            area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                          (x[a] - x[start:end]) * (avg_y - y[a]))
+            a = start + int(area.argmax())
+            indices[i + 1] = a
+        return indices
+
+    @staticmethod
+    def min_max(y, threshold):
+        n = len(y)
+        if threshold >= n or threshold < 4:
+            return np.arange(n)
+
+        # Each bucket contributes its min and its max (2 points), plus first and last
+        buckets = (threshold - 2) // 2
+        edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+        keep = [0, n - 1]
+        for start, end in zip(edges[:-1], edges[1:]):
+            if end <= start:
+                continue
+            chunk = y[start:end]
+            keep.append(start + int(chunk.argmin()))
+            keep.append(start + int(chunk.argmax()))
+        return np.unique(np.array(keep, dtype=np.int64))
+
+    @staticmethod
+    def downsample(x, y, threshold, mode='lttb'):
+        """x, y: 1-D float arrays sorted by x. Returns kept indices."""
+        if mode == 'minmax':
+            return Downsampler.min_max(y, threshold)
+        return Downsampler.lttb(x, y, threshold)
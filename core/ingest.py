@@ -0,0 +1,167 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+from flask_server.app import db
+from flask_server.app.model.model import DeviceRecord, DeviceLatest
+from core.device_state import device_state
+from core.dashboard_feed import dashboard_feed
+from core.backpressure import IngestQueue, ingest_metrics
+
+
+class IngestWriter:
+    """
+    Group-commit writer for sensor readings.
+    The MQTT thread only parses, rate-limits (DeviceStateCache) and submit()s rows;
+    a dedicated thread inserts them in multi-row batches, flushing on size (batch_size)
+    or time (flush_interval seconds).
+    The queue in between is bounded (IngestQueue): when SQLite stalls, readings are shed by
+    shed_policy instead of piling up in memory; fire / gas / smoke readings are never shed.
+    """
+
+    # Readings with any of these non-zero are alarms (never shed), same keys as MqttConsumer.is_alarm
+    ALARM_COLUMNS = ('fire', 'gas', 'smoke')
+
+    # Saves only if > 5 minutes since last record for this device
+    RATE_LIMIT = timedelta(minutes=5)
+
+    # Device timestamps outside [now - MAX_BACKFILL, now + MAX_CLOCK_SKEW] are not trusted
+    # (unsynced RTC after boot, wrong timezone), the reading is stamped with the gateway time.
+    MAX_BACKFILL = timedelta(days=365)
+    MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+    # A batch hitting "database is locked" (index builds, retention deletes, outbox commits
+    # write from other threads) is retried with exponential backoff before it counts as failed
+    FLUSH_RETRIES = 5
+    FLUSH_RETRY_DELAY = 0.1  # Seconds, doubled per attempt (~3s in total)
+
+    @staticmethod
+    def reading_time(data, now=None):
+        """
+        Timestamp of a reading: data['ts'] or data['created_at'] as epoch (seconds or ms) or ISO 8601,
+        converted to gateway local time like datetime.now(). Falls back to now.
+        """
+        now = now or datetime.now()
+        value = data.get('ts') if data.get('ts') is not None else data.get('created_at')
+        if value is None or value == '':
+            return now
+        ts = None
+        try:
+            epoch = float(value)
+            if epoch > 1e11: # Milliseconds
+                epoch /= 1000.0
+            ts = datetime.fromtimestamp(epoch)
+        except (TypeError, ValueError, OverflowError, OSError):
+            try:
+                ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+                if ts.tzinfo is not None:
+                    ts = ts.astimezone().replace(tzinfo=None)
+            except ValueError:
+                return now
+        if ts < now - IngestWriter.MAX_BACKFILL or ts > now + IngestWriter.MAX_CLOCK_SKEW:
+            return now
+        return ts
+
+    def __init__(self, app, batch_size=500, flush_interval=0.2, max_queue=10000, shed_policy='drop_oldest'):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = IngestQueue('ingest-writer', max_queue, shed_policy, on_drop=self._on_shed)
+        self.written = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.retried = 0
+        self.flush_latency = ingest_metrics.latency('db_flush')
+        ingest_metrics.counters('ingest-writer', lambda: {
+            'written': self.written, 'failed': self.failed, 'rate_limited': self.rate_limited,
+            'retried': self.retried})
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def accept(self, row):
+        """
+        Rate limit + queue one parsed reading (dict of DeviceRecord columns).
+        Returns False when the reading is dropped. Never blocks and never queries the DB.
+        """
+        device_id, ts = row['device_id'], row['created_at']
+        if device_state.is_rate_limited(device_id, ts, IngestWriter.RATE_LIMIT):
+            self.rate_limited += 1
+            return False
+        device_state.mark_accepted(device_id, ts, row)
+        if not self.submit(row):
+            device_state.forget(device_id, ts)
+            return False
+        return True
+
+    def submit(self, row):
+        """Queue one parsed reading (dict of DeviceRecord columns). Never blocks the caller."""
+        alarm = any(row.get(c) for c in IngestWriter.ALARM_COLUMNS)
+        return self.queue.put(row, key=row['device_id'], alarm=alarm)
+
+    def _on_shed(self, row):
+        # A queued reading was evicted: it will never be written, undo its rate limiter mark
+        device_state.forget(row['device_id'], row['created_at'])
+        dropped = sum(self.queue.dropped.values())
+        if dropped % 1000 == 1:
+            print(f"[INGEST] Queue overloaded ({self.queue.policy}), shed {dropped} readings so far")
+
+    def _run(self):
+        while True:
+            rows = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self.queue.get(timeout=remaining))
+                except IndexError:
+                    break
+            try:
+                self._flush(rows)
+            finally:
+                self.queue.task_done(len(rows))
+
+    def wait_flushed(self, timeout=None):
+        """Block until every queued reading was committed (or failed / shed). False on timeout."""
+        return self.queue.join(timeout)
+
+    def _flush(self, rows):
+        started = time.monotonic()
+        delay = IngestWriter.FLUSH_RETRY_DELAY
+        with self.app.app_context():
+            try:
+                for attempt in range(IngestWriter.FLUSH_RETRIES + 1):
+                    try:
+                        # executemany: one multi-row INSERT, one commit (one fsync) per batch
+                        db.session.execute(DeviceRecord.__table__.insert(), rows)
+                        DeviceLatest.upsert(rows)
+                        db.session.commit()
+                        break
+                    except OperationalError as e:
+                        db.session.rollback()
+                        if attempt == IngestWriter.FLUSH_RETRIES:
+                            raise
+                        self.retried += 1
+                        print(f"[INGEST] Flush of {len(rows)} records failed ({e.orig}), retrying in {delay:.1f}s")
+                        time.sleep(delay)
+                        delay *= 2
+                self.written += len(rows)
+                self.flush_latency.add(time.monotonic() - started)
+                dashboard_feed.notify()
+                print(f"[INGEST] Saved {len(rows)} records")
+            except Exception as e:
+                db.session.rollback()
+                self.failed += len(rows)
+                # Not saved: let the next reading of these devices through again
+                for row in rows:
+                    device_state.forget(row['device_id'], row['created_at'])
+                print(f"Error saving to DB: {e}")
+            finally:
+                db.session.remove()
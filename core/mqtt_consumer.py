@@ -0,0 +1,115 @@
+import re
+import threading
+import time
+import zlib
+import paho.mqtt.client as mqtt
+from core.backpressure import IngestQueue, ingest_metrics
+from core.decoders import DecoderRegistry
+
+
+class MqttConsumer:
+    """
+    Multi-worker MQTT consumer for sensor traffic. callback(payload bytes, topic) runs on the workers.
+
+    One client per process; messages are partitioned over `workers` threads by device_id (crc32),
+    so all readings of a device are handled in order by the same worker.
+    share_group set   -> the client subscribes to $share/<group>/<topic>, the broker balances messages
+                         between gateway processes. Within a process the order is kept as above;
+                         across processes it needs a broker share strategy that keeps a publisher
+                         on one subscriber (sticky / hash by client id).
+    workers=1 without a share group is the classic single loop.
+    Worker queues are bounded IngestQueues (shed_policy); messages carrying a fire / gas / smoke
+    reading are never shed, so the network loop never blocks and memory stays flat under bursts.
+    """
+
+    KEEPALIVE = 60
+
+    # Routed types of alarm sensors, and their keys with a meaningful value in a raw JSON payload
+    # (null / false / "" / 0 readings are routine and stay sheddable; device ids like "gas01" do not match)
+    ALARM_TYPES = ('fire', 'gas', 'smoke')
+    _ALARM_RE = re.compile(rb'"(?:fire|gas|smoke)"\s*:(?!\s*(?:null\b|false\b|""|0(?:\.0*)?(?![\d.eE])))')
+
+    # device_id of legacy topics without a full JSON decode
+    _DEVICE_ID_RE = re.compile(rb'"device_id"\s*:\s*"([^"]*)"')
+
+    def __init__(self, host, callback, workers=1, share_group=None, topic_prefix="sensor/data/",
+                 queue_size=10000, shed_policy='drop_oldest'):
+        self.host = host
+        self.callback = callback
+        self.workers = max(1, int(workers or 1))
+        self.share_group = share_group or None
+        self.topic_prefix = topic_prefix
+        self.queue_size = queue_size
+        self.shed_policy = shed_policy
+        self.queues = []
+        self.clients = []
+        self.latency = ingest_metrics.latency('mqtt_callback')
+
+    def is_alarm(self, payload, topic):
+        if DecoderRegistry.detect_format(payload, topic.rsplit('/', 1)[-1]) == 'json':
+            return MqttConsumer._ALARM_RE.search(payload) is not None
+        # MessagePack / CBOR are not inspected without a decode: the routed type decides
+        if topic.startswith(self.topic_prefix):
+            return topic[len(self.topic_prefix):].split('/', 1)[0] in MqttConsumer.ALARM_TYPES
+        return False
+
+    def partition_key(self, payload, topic):
+        """sensor/data/<type>/<device_id>[/<format>] -> device_id from the topic, else from the payload bytes, else topic."""
+        if topic.startswith(self.topic_prefix):
+            parts = topic[len(self.topic_prefix):].split('/')
+            if len(parts) in (2, 3) and parts[1]: # optional /<format> suffix
+                return parts[1].encode()
+        match = MqttConsumer._DEVICE_ID_RE.search(payload)
+        return match.group(1) if match else topic.encode()
+
+    def dispatch(self, payload, topic):
+        key = self.partition_key(payload, topic)
+        q = self.queues[0] if len(self.queues) == 1 else self.queues[zlib.crc32(key) % len(self.queues)]
+        q.put((payload, topic), key=key, alarm=self.is_alarm(payload, topic))
+
+    def _worker(self, q):
+        while True:
+            payload, topic = q.get()
+            self._process(payload, topic)
+
+    def _process(self, payload, topic):
+        started = time.monotonic()
+        try:
+            self.callback(payload, topic)
+        except Exception as e:
+            print(f"[MQTT CONSUMER] Error processing message on {topic}: {e}")
+        self.latency.add(time.monotonic() - started)
+
+    def _new_client(self, subscription, on_message):
+        from config import config
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        if config.user_mqtt and config.pass_mqtt:
+            client.username_pw_set(config.user_mqtt, config.pass_mqtt)
+
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                print(f"Subscriber connected to MQTT Broker! ({subscription})")
+                # Subscribe again on every (re)connect
+                client.subscribe(subscription, qos=1)
+            else:
+                print(f"Failed to connect subscriber, return code {rc}")
+
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.reconnect_delay_set(min_delay=1, max_delay=60)
+        client.connect_async(self.host, config.port_mqtt, MqttConsumer.KEEPALIVE)
+        return client
+
+    def run(self, topic):
+        """Start the clients and workers, then block in the network loop of the last client."""
+        subscription = f"$share/{self.share_group}/{topic}" if self.share_group else topic
+        self.queues = [IngestQueue(f"mqtt-worker-{i}", self.queue_size, self.shed_policy)
+                       for i in range(self.workers)]
+        for i, q in enumerate(self.queues):
+            threading.Thread(target=self._worker, args=(q,), name=f"mqtt-worker-{i}", daemon=True).start()
+        on_message = lambda client, userdata, msg: self.dispatch(msg.payload, msg.topic)
+        self.clients = [self._new_client(subscription, on_message)]
+
+        print(f"[MQTT CONSUMER] {self.workers} worker(s) partitioned by device_id"
+              f"{', shared subscription ' + self.share_group if self.share_group else ''}")
+        self.clients[0].loop_forever(retry_first_connection=True)
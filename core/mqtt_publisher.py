@@ -0,0 +1,112 @@
+import atexit
+import threading
+from collections import deque
+import paho.mqtt.client as mqtt
+
+
+class MqttPublisher:
+    """
+    Long-lived publisher, one per broker (host, port).
+    Connects once in the background and reconnects by itself (paho network loop thread).
+    publish() never waits for the broker: while connected the message is handed to paho
+    (at most INFLIGHT QoS 1 messages unacknowledged), while disconnected it is kept in a
+    bounded pending queue (oldest dropped first) and flushed on reconnect.
+    """
+
+    INFLIGHT = 20          # Unacknowledged QoS 1 messages on the wire
+    MAX_PENDING = 1000     # Messages kept while the broker is unreachable
+    KEEPALIVE = 60
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, host, port=None):
+        """Shared publisher for a broker (created and connected on first use)."""
+        from config import config
+        port = port or config.port_mqtt
+        with cls._instances_lock:
+            publisher = cls._instances.get((host, port))
+            if publisher is None:
+                publisher = cls(host, port, config.user_mqtt, config.pass_mqtt)
+                publisher.start()
+                cls._instances[(host, port)] = publisher
+            return publisher
+
+    def __init__(self, host, port, username=None, password=None):
+        self.host = host
+        self.port = port
+        self.connected = False
+        self.published = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pending = deque()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        if username and password:
+            self.client.username_pw_set(username, password)
+        self.client.max_inflight_messages_set(MqttPublisher.INFLIGHT)
+        self.client.max_queued_messages_set(MqttPublisher.MAX_PENDING)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+
+    def start(self):
+        # connect_async + loop_start: never blocks the caller, paho retries until the broker is up
+        self.client.connect_async(self.host, self.port, MqttPublisher.KEEPALIVE)
+        self.client.loop_start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        try:
+            self.client.disconnect()
+            self.client.loop_stop()
+        except Exception:
+            pass
+
+    def publish(self, topic, message, qos=0, retain=False):
+        """Queue one message. Returns False when it had to be dropped."""
+        with self._lock:
+            if not self.connected:
+                self._queue(topic, message, qos, retain)
+                return True
+        info = self.client.publish(topic, message, qos=qos, retain=retain)
+        if info.rc == mqtt.MQTT_ERR_NO_CONN:
+            with self._lock:
+                self._queue(topic, message, qos, retain)
+            return True
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def _queue(self, topic, message, qos, retain):
+        # Caller holds self._lock
+        if len(self._pending) >= MqttPublisher.MAX_PENDING:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append((topic, message, qos, retain))
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"[MQTT PUBLISHER] Failed to connect to {self.host}, return code {rc}")
+            return
+        with self._lock:
+            self.connected = True
+            pending, self._pending = self._pending, deque()
+        for topic, message, qos, retain in pending:
+            self.publish(topic, message, qos, retain)
+
+    def _on_disconnect(self, client, userdata, rc):
+        with self._lock:
+            self.connected = False
+        if rc != 0:
+            print(f"[MQTT PUBLISHER] Lost connection to {self.host} (rc={rc}), reconnecting...")
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {'connected': self.connected, 'published': self.published,
+                'dropped': self.dropped, 'pending': pending}
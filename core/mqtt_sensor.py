@@ -1,6 +1,7 @@
 import paho.mqtt.client as mqtt
 import time,json
 from core import SystemInfo
+from core.mqtt_publisher import MqttPublisher
 
 
 class MqttSensor:
@@ -9,34 +10,9 @@ class MqttSensor:
         self.subscriber_client = None
 
 
-    def publish_message(self, topic, message):
-        from config import config
-        def on_connect(client, userdata, flags, rc):
-            if rc == 0:
-                # print("Connected to MQTT Broker for publishing!")
-                pass
-            else:
-                print(f"Failed to connect for publishing, return code {rc}")
-
-        client = mqtt.Client()
-        
-        # Tambahkan autentikasi di sini
-        if config.user_mqtt and config.pass_mqtt:
-            client.username_pw_set(config.user_mqtt, config.pass_mqtt)
-            
-        client.on_connect = on_connect
-
-        try:
-            client.connect(self.host, config.port_mqtt, 60)
-            client.loop_start()
-            result = client.publish(topic, message, qos=0)
-            status = result[0]
-        except Exception as e:
-            # print(f"Publish error: {e}")
-            pass
-        finally:
-            client.loop_stop()
-            client.disconnect()
+    def publish_message(self, topic, message, retain=False, qos=0):
+        """Non-blocking publish through the shared, persistent connection of this broker."""
+        return MqttPublisher.get(self.host).publish(topic, message, qos=qos, retain=retain)
 
     def start_subscriber(self, topic, on_message_callback=None):
         from config import config
@@ -63,11 +39,11 @@ class MqttSensor:
             print(f"Failed to connect subscriber, return code {rc}")
     
     def _on_message(self, client, userdata, msg):
-        payload = msg.payload.decode()
-        # print(f"Received message: {payload} on topic {msg.topic}")
+        # Raw bytes + topic: the callback routes on the topic and only decodes what it keeps
+        # print(f"Received message: {msg.payload} on topic {msg.topic}")
         
         if self.on_message_callback:
-            self.on_message_callback(payload)
+            self.on_message_callback(msg.payload, msg.topic)
 
     @staticmethod
     def sensor_record(msg):
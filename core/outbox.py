@@ -0,0 +1,178 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask_server.app import db
+from flask_server.app.model.model import EndpointConfig, OutboxBatch
+from core.send_server import CloudSender
+
+
+class CloudOutbox:
+    """
+    Durable on-disk queue (outbox_batches table) between the sync job and the cloud.
+    Batches are serialized once at enqueue time, so retries never re-query device_records.
+    """
+
+    MAX_ATTEMPTS = 15          # After this many failures the batch goes to dead-letter
+    BASE_DELAY = 5             # Seconds, first retry delay
+    MAX_DELAY = 30 * 60        # Seconds, backoff cap (30 mins)
+    DRAIN_LIMIT = 100          # Max batches handled per delivery run
+    DEAD_LETTER_LIMIT = 200    # Dead batches kept for inspection (oldest are pruned)
+    FANOUT_WORKERS = 8         # Threads shared by all endpoints during one delivery run
+
+    # Scheduler job and manual /sync calls may overlap, only one drain at a time
+    _drain_lock = threading.Lock()
+
+    @staticmethod
+    def enqueue_payload(endpoint_id, url, json_payload, record_count=0, sensor_type=None):
+        """Add a serialized batch to the outbox. Caller commits (same transaction as its cursor)."""
+        batch = OutboxBatch(
+            endpoint_id=endpoint_id,
+            sensor_type=sensor_type,
+            url=url,
+            payload=json_payload,
+            record_count=record_count,
+            status='pending',
+            attempts=0,
+            next_attempt_at=datetime.now()
+        )
+        db.session.add(batch)
+        return batch
+
+    @staticmethod
+    def enqueue(ep_config, data_list, sensor_type=None):
+        """Apply the endpoint mapping, serialize and queue a bulk batch for ep_config (shim or model)."""
+        json_payload = CloudSender.serialize_bulk(data_list, ep_config.mapping)
+        return CloudOutbox.enqueue_payload(ep_config.id, ep_config.url, json_payload,
+                                           record_count=len(data_list), sensor_type=sensor_type)
+
+    @staticmethod
+    def backoff_delay(attempts):
+        """Exponential backoff with 'equal jitter': half fixed, half random."""
+        delay = min(CloudOutbox.MAX_DELAY, CloudOutbox.BASE_DELAY * (2 ** max(attempts - 1, 0)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def _is_retryable(status_code):
+        # No HTTP answer (network), server errors, timeouts and throttling are worth retrying.
+        # Other 4xx means the endpoint rejects the payload itself, retrying won't help.
+        return status_code == 0 or status_code >= 500 or status_code in (408, 425, 429)
+
+    @staticmethod
+    def deliver_pending(limit=None):
+        """
+        Drain due batches (oldest first), endpoints in parallel. Delivered batches are deleted.
+        A failure stops the rest of its lane for this run to keep batches in order.
+        Returns (delivered_batches, delivered_records, failed_batches).
+        """
+        if not CloudOutbox._drain_lock.acquire(blocking=False):
+            return 0, 0, 0
+        try:
+            return CloudOutbox._drain(limit or CloudOutbox.DRAIN_LIMIT)
+        finally:
+            CloudOutbox._drain_lock.release()
+
+    @staticmethod
+    def _deliver_lane(session, headers_str, use_gzip, lane):
+        """
+        Worker thread: POST a lane of (batch_id, url, payload) in order, stop at the first failure.
+        Touches no DB objects, results are applied by the caller.
+        """
+        results = []
+        for batch_id, url, payload in lane:
+            ok, msg, code = CloudSender.post_payload(url, payload, headers_str, session=session, use_gzip=use_gzip)
+            results.append((batch_id, ok, msg, code))
+            if not ok:
+                break
+        return results
+
+    @staticmethod
+    def _drain(limit):
+        now = datetime.now()
+        endpoints = {ep.id: ep for ep in EndpointConfig.query.filter_by(is_active=True).all()}
+        if not endpoints:
+            return 0, 0, 0
+
+        # Oldest batch still backing off per endpoint: newer batches wait behind it.
+        # Excluded in SQL, so a failing endpoint's backlog never takes the LIMIT slots of the others.
+        blocked = db.session.query(OutboxBatch.endpoint_id, db.func.min(OutboxBatch.id))\
+                            .filter(OutboxBatch.status == 'pending', OutboxBatch.next_attempt_at > now)\
+                            .group_by(OutboxBatch.endpoint_id).all()
+        # Disabled endpoints keep their backlog until re-activated
+        query = OutboxBatch.query.filter(OutboxBatch.status == 'pending',
+                                         OutboxBatch.next_attempt_at <= now,
+                                         OutboxBatch.endpoint_id.in_(endpoints))
+        for endpoint_id, first_id in blocked:
+            query = query.filter(db.not_(db.and_(OutboxBatch.endpoint_id == endpoint_id, OutboxBatch.id > first_id)))
+        batches = query.order_by(OutboxBatch.id.asc()).limit(limit).all()
+        if not batches:
+            return 0, 0, 0
+
+        # Group per endpoint (keeps id order)
+        per_endpoint = {}
+        for batch in batches:
+            per_endpoint.setdefault(batch.endpoint_id, []).append(batch)
+
+        # Split each endpoint into max_concurrency lanes. One lane = strictly ordered delivery.
+        jobs = []
+        for ep_id, ep_batches in per_endpoint.items():
+            ep = endpoints[ep_id]
+            lanes_count = max(1, min(int(ep.max_concurrency or 1), len(ep_batches)))
+            session = CloudSender.get_session(ep_id, lanes_count)
+            lanes = [[] for _ in range(lanes_count)]
+            for i, batch in enumerate(ep_batches):
+                lanes[i % lanes_count].append((batch.id, batch.url, batch.payload))
+            for lane in lanes:
+                jobs.append((session, ep.headers, bool(ep.use_gzip), lane))
+        if not jobs:
+            return 0, 0, 0
+
+        # Fan-out: total time is roughly the slowest endpoint instead of the sum of all
+        results = []
+        with ThreadPoolExecutor(max_workers=min(CloudOutbox.FANOUT_WORKERS, len(jobs))) as pool:
+            futures = [pool.submit(CloudOutbox._deliver_lane, *job) for job in jobs]
+            for future in futures:
+                results.extend(future.result())
+
+        by_id = {b.id: b for b in batches}
+        delivered, delivered_records, failed = 0, 0, 0
+        for batch_id, ok, msg, code in results:
+            batch = by_id[batch_id]
+            if ok:
+                delivered += 1
+                delivered_records += batch.record_count or 0
+                db.session.delete(batch)
+            else:
+                failed += 1
+                batch.attempts = (batch.attempts or 0) + 1
+                batch.last_error = msg[:255]
+                if not CloudOutbox._is_retryable(code) or batch.attempts >= CloudOutbox.MAX_ATTEMPTS:
+                    batch.status = 'dead'
+                    print(f"[OUTBOX] Batch {batch.id} to {endpoints[batch.endpoint_id].name} moved to dead-letter: {msg}")
+                else:
+                    batch.next_attempt_at = datetime.now() + timedelta(seconds=CloudOutbox.backoff_delay(batch.attempts))
+        db.session.commit()
+
+        CloudOutbox.prune_dead_letters()
+        if delivered or failed:
+            print(f"[OUTBOX] Delivered {delivered} batches ({delivered_records} records) to {len(per_endpoint)} endpoints, {failed} failed.")
+        return delivered, delivered_records, failed
+
+    @staticmethod
+    def prune_dead_letters():
+        """Keep only the newest DEAD_LETTER_LIMIT dead batches."""
+        keep_ids = [row.id for row in OutboxBatch.query.with_entities(OutboxBatch.id)
+                    .filter(OutboxBatch.status == 'dead')
+                    .order_by(OutboxBatch.id.desc()).limit(CloudOutbox.DEAD_LETTER_LIMIT).all()]
+        if len(keep_ids) < CloudOutbox.DEAD_LETTER_LIMIT:
+            return 0
+        removed = OutboxBatch.query.filter(OutboxBatch.status == 'dead', OutboxBatch.id < min(keep_ids))\
+                                   .delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+    @staticmethod
+    def stats():
+        pending = OutboxBatch.query.filter_by(status='pending').count()
+        dead = OutboxBatch.query.filter_by(status='dead').count()
+        return {'pending': pending, 'dead': dead}
@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import config
+from flask_server.app import db
+from flask_server.app.model.model import DeviceRecord, SyncCursor, EndpointConfig, Rollup1m, Rollup1h, Rollup1d
+
+
+class RetentionEngine:
+    """
+    Keeps device_records small: raw rows older than config.raw_retention_days are folded into
+    the 1m / 1h / 1d rollup tables and deleted, RETENTION_CHUNK rows per transaction
+    (roll-up and delete of a chunk commit together, so a crash never counts a row twice).
+    Readers (aggregate / series APIs) combine raw rows and rollups, see read_tiers().
+    """
+
+    # Numeric DeviceRecord columns that are rolled up
+    METRICS = ('power', 'voltage', 'current', 'frequency', 'energy', 'humidity', 'temperature',
+               'fire', 'gas', 'gas_ppm', 'gas_voltage', 'smoke', 'lux', 'water', 'water_level',
+               'total_volume', 'distance')
+
+    # (name, model, bucket seconds), finest first
+    TIERS = (
+        ('1m', Rollup1m, 60),
+        ('1h', Rollup1h, 3600),
+        ('1d', Rollup1d, 86400),
+    )
+
+    MAX_CHUNKS_PER_RUN = 200  # Bounds one scheduler run (200 x 5000 rows by default)
+
+    @staticmethod
+    def raw_cutoff(now=None):
+        """Raw rows before this (midnight, so every rollup bucket is complete) are rolled up."""
+        now = now or datetime.now()
+        return (now - timedelta(days=config.raw_retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def floor(ts, seconds):
+        if seconds >= 86400:
+            return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        if seconds >= 3600:
+            return ts.replace(minute=0, second=0, microsecond=0)
+        return ts.replace(second=0, microsecond=0)
+
+    @staticmethod
+    def _unsynced_filter():
+        """
+        Rows an active endpoint has not queued yet: for each synced type, the rows of that type
+        (SyncCursor.record_filter) above the lowest cursor of that type. They are kept so a slow or
+        disabled-then-enabled sync never loses history. A type without pending rows protects nothing.
+        None = no endpoint cursor, nothing to protect.
+        """
+        cursors = db.session.query(SyncCursor.sensor_type, db.func.min(SyncCursor.last_record_id))\
+                            .join(EndpointConfig, EndpointConfig.id == SyncCursor.endpoint_id)\
+                            .filter(EndpointConfig.is_active == True)\
+                            .group_by(SyncCursor.sensor_type).all()
+        clauses = []
+        for sensor_type, last_record_id in cursors:
+            pending = DeviceRecord.id > (last_record_id or 0)
+            record_filter = SyncCursor.record_filter(sensor_type)
+            clauses.append(pending if record_filter is None else (record_filter & pending))
+        return db.or_(*clauses) if clauses else None
+
+    @staticmethod
+    def _fold(rows):
+        """Aggregate raw rows in Python (one bounded chunk) -> {tier: [rollup dicts]}"""
+        result = {}
+        for name, model, seconds in RetentionEngine.TIERS:
+            buckets = {}
+            for row in rows:
+                created_at = row.created_at
+                bucket = RetentionEngine.floor(created_at, seconds)
+                for metric in RetentionEngine.METRICS:
+                    value = getattr(row, metric)
+                    if value is None:
+                        continue
+                    value = float(value)
+                    acc = buckets.get((row.device_id, metric, bucket))
+                    if acc is None:
+                        buckets[(row.device_id, metric, bucket)] = {
+                            'device_id': row.device_id, 'metric': metric, 'bucket': bucket,
+                            'min': value, 'max': value, 'sum': value, 'count': 1,
+                            'last': value, 'last_at': created_at
+                        }
+                        continue
+                    acc['min'] = min(acc['min'], value)
+                    acc['max'] = max(acc['max'], value)
+                    acc['sum'] += value
+                    acc['count'] += 1
+                    if created_at >= acc['last_at']:
+                        acc['last'], acc['last_at'] = value, created_at
+            result[name] = list(buckets.values())
+        return result
+
+    # Rows per upsert statement (10 bound parameters each, stays under SQLite's variable limit)
+    UPSERT_SLICE = 90
+
+    @staticmethod
+    def _upsert(model, items):
+        """INSERT ... ON CONFLICT merge, so a bucket can be filled by several chunks."""
+        table = model.__table__
+        for i in range(0, len(items), RetentionEngine.UPSERT_SLICE):
+            stmt = sqlite_insert(table).values(items[i:i + RetentionEngine.UPSERT_SLICE])
+            excluded = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['device_id', 'metric', 'bucket'],
+                set_={
+                    'min': db.func.min(table.c.min, excluded.min),
+                    'max': db.func.max(table.c.max, excluded.max),
+                    'sum': table.c.sum + excluded.sum,
+                    'count': table.c.count + excluded.count,
+                    'last': db.case((excluded.last_at >= table.c.last_at, excluded.last), else_=table.c.last),
+                    'last_at': db.func.max(table.c.last_at, excluded.last_at),
+                })
+            db.session.execute(stmt)
+
+    @staticmethod
+    def roll_up_chunk(cutoff, chunk_size, unsynced=None, after_id=0):
+        """
+        Roll up and delete the oldest chunk of raw rows before cutoff with id > after_id,
+        skipping `unsynced` rows. Returns (rows removed, last id scanned), (0, None) when done.
+        """
+        base = DeviceRecord.query.filter(DeviceRecord.created_at < cutoff, DeviceRecord.id > after_id)
+        if unsynced is not None:
+            base = base.filter(db.not_(unsynced))
+        ids = [r.id for r in base.with_entities(DeviceRecord.id)
+               .order_by(DeviceRecord.id.asc()).limit(chunk_size).all()]
+        if not ids:
+            return 0, None
+
+        # The chunk = every eligible row with id <= max id (ids were taken in id order)
+        chunk = base.filter(DeviceRecord.id <= ids[-1])
+        try:
+            folded = RetentionEngine._fold(chunk.all())
+            for name, model, seconds in RetentionEngine.TIERS:
+                RetentionEngine._upsert(model, folded[name])
+            removed = chunk.delete(synchronize_session=False)
+            db.session.commit()
+            return removed, ids[-1]
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @staticmethod
+    def prune_rollups(now=None):
+        """Drop 1m / 1h rollups past their own retention (chunked like raw rows)."""
+        now = now or datetime.now()
+        limits = ((Rollup1m, config.rollup_1m_retention_days), (Rollup1h, config.rollup_1h_retention_days))
+        removed = 0
+        for model, days in limits:
+            if not days:
+                continue
+            cutoff = now - timedelta(days=days)
+            while True:
+                ids = [r.id for r in db.session.query(model.id).filter(model.bucket < cutoff)
+                       .order_by(model.id.asc()).limit(config.retention_chunk).all()]
+                if not ids:
+                    break
+                removed += model.query.filter(model.bucket < cutoff, model.id <= ids[-1])\
+                                      .delete(synchronize_session=False)
+                db.session.commit()
+        return removed
+
+    @staticmethod
+    def run(now=None):
+        """One retention pass (scheduler job). Returns (raw rows rolled up, rollup rows pruned)."""
+        cutoff = RetentionEngine.raw_cutoff(now)
+        unsynced = RetentionEngine._unsynced_filter()
+        rolled, after_id = 0, 0
+        for _ in range(RetentionEngine.MAX_CHUNKS_PER_RUN):
+            removed, after_id = RetentionEngine.roll_up_chunk(cutoff, config.retention_chunk, unsynced, after_id)
+            if after_id is None:
+                break
+            rolled += removed
+        pruned = RetentionEngine.prune_rollups(now)
+        if rolled or pruned:
+            print(f"[RETENTION] Rolled up {rolled} raw records before {cutoff:%Y-%m-%d}, pruned {pruned} rollups")
+        return rolled, pruned
+
+    # --- Read side ---
+
+    @staticmethod
+    def tier_for(bucket_seconds):
+        """Coarsest rollup tier whose buckets fit exactly in bucket_seconds."""
+        chosen = RetentionEngine.TIERS[0]
+        for tier in RetentionEngine.TIERS:
+            if tier[2] <= bucket_seconds and bucket_seconds % tier[2] == 0:
+                chosen = tier
+        return chosen
+
+    @staticmethod
+    def read_rollups(model, device_id, metric, date_from, date_to, now=None):
+        """Rollup rows of one metric in [date_from, date_to), ordered by bucket. Empty when nothing was rolled up there."""
+        if date_from >= RetentionEngine.raw_cutoff(now):
+            return []
+        return model.query.filter(model.device_id == device_id, model.metric == metric,
+                                  model.bucket >= date_from, model.bucket < date_to)\
+                          .order_by(model.bucket.asc()).all()
+
+    @staticmethod
+    def kept_since(model, now=None):
+        """Oldest bucket a tier still keeps (its configured retention), None = kept forever."""
+        days = {Rollup1m: config.rollup_1m_retention_days, Rollup1h: config.rollup_1h_retention_days}.get(model)
+        if not days:
+            return None
+        return (now or datetime.now()) - timedelta(days=days)
+
+    @staticmethod
+    def ceil(ts, seconds):
+        floored = RetentionEngine.floor(ts, seconds)
+        return floored if floored == ts else floored + timedelta(seconds=seconds)
+
+    @staticmethod
+    def read_tiers(tier, device_id, metric, date_from, date_to, now=None):
+        """
+        Rollups of one metric in [date_from, date_to) read from `tier` where it is still kept, and from
+        the next coarser tier(s) for the part older than its retention (1m -> 1h -> 1d).
+        Segments meet on a bucket boundary of the coarser tier, so no reading is counted twice.
+        Returns [(tier, rows)], newest segment first.
+        """
+        tiers = RetentionEngine.TIERS[RetentionEngine.TIERS.index(tier):]
+        segments, end = [], date_to
+        for i, (name, model, seconds) in enumerate(tiers):
+            start = date_from
+            kept = RetentionEngine.kept_since(model, now)
+            if kept is not None and kept > date_from and i + 1 < len(tiers):
+                start = RetentionEngine.ceil(kept, tiers[i + 1][2])
+            if start < end:
+                rows = RetentionEngine.read_rollups(model, device_id, metric,
+                                                    RetentionEngine.floor(start, seconds), end, now)
+                segments.append((tiers[i], rows))
+                end = start
+            if start <= date_from:
+                break
+        return segments
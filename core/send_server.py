@@ -1,11 +1,64 @@
 import requests
 import json
+import gzip
+import threading
+from requests.adapters import HTTPAdapter
 from config import config
 from flask import current_app
+from flask_server.app import db
 from flask_server.app.model.model import EndpointConfig
 
+# Records per bulk request when the endpoint has no batch_size set
+DEFAULT_BATCH_SIZE = 500
+
+# Smart Routing suffixes used by bulk sync (per target_type)
+BULK_SUFFIX_MAP = {
+    'power': '/add_power', 'water': '/add_water', 'gas': '/add_gas',
+    'smoke': '/add_smoke', 'fire': '/add_fire', 'weather': '/add_weather',
+    'lux': '/add_lux', 'humidity': '/add_humidity_temp', 'temperature': '/add_humidity_temp',
+    'humidity_temp': '/add_humidity_temp', 'ultrasonic': '/add_ultrasonic'
+}
+
+class EndpointShim:
+    """Lightweight copy of an EndpointConfig with an overridden (routed) URL."""
+    def __init__(self, obj, url):
+        self.id = obj.id
+        self.url = url
+        self.mapping = obj.mapping
+        self.headers = obj.headers
+        self.name = obj.name
+        self.batch_size = getattr(obj, 'batch_size', None)
+        self.use_gzip = getattr(obj, 'use_gzip', False)
+
 class CloudSender:
-    
+
+    INLINE_TIMEOUT = 5 # Seconds for a live single-record POST before it falls back to the outbox
+
+    # Keep-alive sessions per endpoint id (reused across batches and sync runs)
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    @staticmethod
+    def get_session(endpoint_id, pool_size=None):
+        """
+        Persistent requests.Session for an endpoint, sized for its concurrency limit.
+        Without pool_size the existing session is reused whatever its size.
+        """
+        with CloudSender._sessions_lock:
+            entry = CloudSender._sessions.get(endpoint_id)
+            if entry and (pool_size is None or entry[1] == max(int(pool_size), 1)):
+                return entry[0]
+            pool_size = max(int(pool_size or 1), 1)
+            if entry:
+                entry[0].close() # Concurrency limit changed, rebuild the pool
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            CloudSender._sessions[endpoint_id] = (session, pool_size)
+            return session
+
     @staticmethod
     def send_data(data):
         # 1. Fetch Advanced Endpoints safely
@@ -128,30 +181,28 @@ class CloudSender:
                  else:
                      target_url += suffix
             
-            headers = {'Content-Type': 'application/json'}
-            headers = {'Content-Type': 'application/json'}
-            # Add Custom Headers if any
-            if ep_config.headers:
-                try:
-                    custom_headers = json.loads(ep_config.headers)
-                    if isinstance(custom_headers, dict):
-                        headers.update(custom_headers)
-                except:
-                    pass # Ignore if invalid JSON or empty
-
             def json_serial(obj):
                 if hasattr(obj, 'isoformat'):
                     return obj.isoformat()
                 return str(obj)
 
             json_payload = json.dumps(payload, default=json_serial)
-            
-            # Send to calculated target_url
-            response = requests.post(target_url, data=json_payload, headers=headers, timeout=5)
-            if response.status_code in [200, 201]:
-                 print(f"[CLOUD-MULTI] Sent to {ep_config.name} ✅")
-            else:
-                 print(f"[CLOUD-MULTI] Failed {ep_config.name}: {response.status_code}")
+
+            # Try the POST inline (keep-alive session), the durable outbox is only the fallback:
+            # one outbox row per message would cap the endpoint at the drain rate.
+            session = CloudSender.get_session(ep_config.id)
+            ok, msg, code = CloudSender.post_payload(target_url, json_payload, ep_config.headers,
+                                                     timeout=CloudSender.INLINE_TIMEOUT, session=session,
+                                                     use_gzip=bool(getattr(ep_config, 'use_gzip', False)))
+            if ok:
+                return
+
+            # Queue in the durable outbox, the delivery worker handles retries/backoff
+            from core.outbox import CloudOutbox
+            CloudOutbox.enqueue_payload(ep_config.id, target_url, json_payload, record_count=1,
+                                        sensor_type=ep_config.target_device_type)
+            db.session.commit()
+            print(f"[CLOUD-MULTI] {ep_config.name} failed ({msg}), queued for retry 📦")
 
         except Exception as e:
             print(f"[CLOUD-MULTI] Error {ep_config.name}: {e}")
@@ -216,132 +267,78 @@ class CloudSender:
             return data
 
     @staticmethod
-    def send_bulk_to_endpoint(data_list, ep_config):
+    def serialize_bulk(data_list, mapping_str):
+        """Apply the endpoint mapping to every item and serialize the list to a JSON body."""
+        mapped_list = [CloudSender._apply_mapping(item, mapping_str) for item in data_list]
+
+        def json_serial(obj):
+            if hasattr(obj, 'isoformat'): return obj.isoformat()
+            return str(obj)
+
+        return json.dumps(mapped_list, default=json_serial)
+
+    @staticmethod
+    def post_payload(url, json_payload, headers_str=None, timeout=10, session=None, use_gzip=False):
         """
-        Send a list of data to a specific Advanced Endpoint, applying its mapping.
+        POST an already serialized JSON body. Returns (ok, message, status_code).
+        status_code is 0 when the request never got an HTTP answer (timeout, DNS, refused).
+        Pass a session (see get_session) to reuse keep-alive connections.
         """
+        headers = {'Content-Type': 'application/json'}
+        body = json_payload
+        if use_gzip:
+            body = gzip.compress(json_payload.encode('utf-8'), compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        if headers_str:
+            try:
+                custom_headers = json.loads(headers_str)
+                if isinstance(custom_headers, dict):
+                    headers.update(custom_headers)
+            except:
+                pass # Ignore if invalid JSON or empty
+
         try:
-            # 1. Apply Mapping for each item
-            mapped_list = []
-            for item in data_list:
-                mapped_item = CloudSender._apply_mapping(item, ep_config.mapping)
-                mapped_list.append(mapped_item)
-            
-            # 2. Serialize
-            def json_serial(obj):
-                if hasattr(obj, 'isoformat'): return obj.isoformat()
-                return str(obj)
-            
-            json_payload = json.dumps(mapped_list, default=json_serial)
-            
-            # 3. Send
-            headers = {'Content-Type': 'application/json'}
-            # (Optional: Parse ep_config.headers here if needed)
-            
-            response = requests.post(ep_config.url, data=json_payload, headers=headers, timeout=10)
-            
-            if response.status_code in [200, 201]:
-                return True, "Success", 200
+            poster = session.post if session is not None else requests.post
+            response = poster(url, data=body, headers=headers, timeout=timeout)
+            if 200 <= response.status_code < 300:
+                return True, "Success", response.status_code
             return False, f"HTTP {response.status_code}: {response.text[:100]}", response.status_code
-            
         except Exception as e:
-            return False, str(e), 500
+            return False, str(e), 0
 
     @staticmethod
-    def send_bulk_data(data_list, target_type):
+    def get_bulk_targets(target_type):
         """
-        Smart Bulk Sync:
-        1. If Custom Endpoints exist: Send to ALL Active Endpoints (Multi-Cloud).
-        2. If No Custom Endpoints: Fallback to Legacy (.env).
+        Resolve which Advanced Endpoints should receive a bulk batch of target_type.
+        Returns (configured, targets) where targets is a list of (EndpointConfig, shim_ep)
+        and shim_ep carries the Smart Routing URL (suffix applied).
+        configured is False when no endpoint exists at all (Factory/Legacy mode).
         """
-        try:
-             advanced_endpoints = []
-             total_endpoints_count = -1
-             if current_app:
-                advanced_endpoints = EndpointConfig.query.filter_by(is_active=True).all()
-                total_endpoints_count = EndpointConfig.query.count()
-             
-             # 1. Advanced Mode
-             if total_endpoints_count > 0:
-                 if not advanced_endpoints:
-                     return True, "All endpoints disabled (No-Op)", 200
-                 
-                 success_count = 0
-                 errors = []
-                 
-                 for ep in advanced_endpoints:
-                     # Filter Logic: Check if this endpoint cares about this data type?
-                     # Currently send_bulk_to_endpoint applies mapping. 
-                     # Smart Routing (Suffix) is needed?
-                     
-                     # We need to construct a "Target EP" with the correct Suffix if needed.
-                     # Similar to send_data logic or toggle logic.
-                     # For Bulk, we blindly send to the configured URL unless we apply smart routing.
-                     # Let's apply Smart Routing here too to be consistent.
-                     
-                     suffix_map = {
-                        'power': '/add_power', 'water': '/add_water', 'gas': '/add_gas',
-                        'smoke': '/add_smoke', 'fire': '/add_fire', 'weather': '/add_weather',
-                        'lux': '/add_lux', 'humidity': '/add_humidity_temp', 'temperature': '/add_humidity_temp',
-                        'humidity_temp': '/add_humidity_temp', 'ultrasonic': '/add_ultrasonic'
-                     }
-                     
-                     target_ep = ep # Default
-                     
-                     # Apply Smart Routing Suffix if implicit type match or generic URL
-                     suffix = suffix_map.get(target_type, "")
-                     # Logic: If Type is set in Endpoint, strict match? 
-                     # For Bulk Sync, the triggerer (Scheduler) passes 'target_type'.
-                     
-                     # If Endpoint has Specific Type (e.g. 'power'), ONLY send if target_type matches.
-                     if ep.target_device_type and ep.target_device_type != 'all':
-                         if ep.target_device_type != target_type:
-                             # Skip this endpoint for this data batch
-                             continue
-                     
-                     # Construct Temp EP with Suffix
-                     temp_url = ep.url
-                     if suffix and suffix not in temp_url:
-                         if temp_url.endswith('/'): temp_url += suffix[1:]
-                         else: temp_url += suffix
-                     
-                     # We can't modify the SQLA object directly without persisting or detaching.
-                     # Use a lightweight shim/wrapper or just pass modified URL to a helper.
-                     # CloudSender.send_bulk_to_endpoint uses ep_config.url. 
-                     # Let's make a shim class again or modify the method signature. 
-                     # Shim is safer.
-                     class TempEP:
-                        def __init__(self, obj, url):
-                            self.url = url
-                            self.mapping = obj.mapping
-                            self.headers = obj.headers
-                            self.name = obj.name
-                     
-                     shim_ep = TempEP(ep, temp_url)
-                     
-                     ok, msg, code = CloudSender.send_bulk_to_endpoint(data_list, shim_ep)
-                     if ok: success_count += 1
-                     else: errors.append(f"{ep.name}: {msg}")
-
-                 if success_count > 0:
-                     return True, f"Synced to {success_count} endpoints", 200
-                 elif len(errors) > 0:
-                    return False, " | ".join(errors), 500
-                 else:
-                    return True, "No matching endpoints for this type", 200
-
-             # 2. Factory/Legacy Mode
-             if total_endpoints_count == 0:
-                 # DISABLING LEGACY FALLBACK as requested.
-                 # User must explicitly configure an endpoint in Settings.
-                 # return CloudSender._send_legacy_bulk(data_list, target_type)
-                 return True, "No endpoints configured (Legacy disabled)", 200
-                 
-             # Fallback
-             return True, "No endpoints", 200
+        advanced_endpoints = []
+        total_endpoints_count = 0
+        if current_app:
+            advanced_endpoints = EndpointConfig.query.filter_by(is_active=True).all()
+            total_endpoints_count = EndpointConfig.query.count()
 
-        except Exception as e:
-             return False, str(e), 500
+        if total_endpoints_count == 0:
+            return False, []
+
+        suffix = BULK_SUFFIX_MAP.get(target_type, "")
+        targets = []
+        for ep in advanced_endpoints:
+            # If Endpoint has Specific Type (e.g. 'power'), ONLY send if target_type matches.
+            if ep.target_device_type and ep.target_device_type != 'all':
+                if ep.target_device_type != target_type:
+                    continue
+
+            temp_url = ep.url
+            if suffix and suffix not in temp_url:
+                if temp_url.endswith('/'): temp_url += suffix[1:]
+                else: temp_url += suffix
+
+            # We can't modify the SQLA object directly without persisting or detaching.
+            targets.append((ep, EndpointShim(ep, temp_url)))
+        return True, targets
 
     @staticmethod
     def _send_legacy_bulk(data_list, target_type):
@@ -56,6 +56,12 @@ def add_device():
 def add_data_record():
     return DeviceController.add_data_record()
 
+# Bulk ingest (array of records of mixed types, one transaction)
+@api_app.route('/add_batch', methods=['POST'])
+@csrf.exempt
+def add_batch():
+    return DeviceController.add_batch()
+
 @api_app.route('/add_power', methods=['POST'])
 @csrf.exempt
 def add_power():
@@ -116,6 +122,23 @@ def get_devices():
 def get_records():
     return DeviceController.get_data_records()
 
+@api_app.route('/records/table/<table>', methods=['GET'])
+@csrf.exempt
+def get_records_table(table):
+    return DeviceController.data_record_table(table)
+
+# Ingest pipeline health (queue depth, shed counts, latency)
+@api_app.route('/ingest_stats', methods=['GET'])
+@csrf.exempt
+def ingest_stats():
+    return DeviceController.ingest_stats()
+
+# Latest values of many devices in one call
+@api_app.route('/latest', methods=['GET'])
+@csrf.exempt
+def get_latest_bulk():
+    return DeviceController.get_latest_bulk()
+
 # Type-Specific Routes
 @api_app.route('/get_power/<device_id>', methods=['GET'])
 @csrf.exempt
@@ -260,6 +283,28 @@ def pull_lux():
 def pull_humidity_temp():
     return DeviceController.pull_data_records('humidity_temp')
 
+# STREAMING EXPORT (NDJSON / CSV, chunked)
+@api_app.route('/export', methods=['GET'])
+@csrf.exempt
+def export_records():
+    return DeviceController.export_records()
+
+@api_app.route('/pull/<target_type>/stream', methods=['GET', 'POST'])
+@csrf.exempt
+def pull_stream(target_type):
+    return DeviceController.export_records(target_type)
+
+# CHART AGGREGATION (time buckets)
+@api_app.route('/records/aggregate', methods=['GET'])
+@csrf.exempt
+def aggregate_records():
+    return DeviceController.aggregate_records()
+
+@api_app.route('/records/series', methods=['GET'])
+@csrf.exempt
+def series_records():
+    return DeviceController.series_records()
+
 # --- DASHBOARD LIVE UPDATE ---
 from flask_server.app.controller.home_Controller import HomeController
 
@@ -1,10 +1,21 @@
-from flask import jsonify, render_template, request, redirect, url_for
-from core.send_server import CloudSender
+from flask import jsonify, render_template, request, redirect, url_for, make_response, Response, stream_with_context
+from core.send_server import CloudSender, DEFAULT_BATCH_SIZE
+from core.outbox import CloudOutbox
+from core.device_state import device_state
+from core.ingest import IngestWriter
+from core.backpressure import ingest_metrics
+from core.dashboard_feed import dashboard_feed
+from core.downsample import Downsampler
+from core.retention import RetentionEngine
 from flask_server.app import db
-from flask_server.app.model.model import Device, DeviceRecord
+from flask_server.app.model.model import Device, DeviceRecord, DeviceLatest, SyncCursor
 from flask_server.app.model.user_model import User
 from flask_login import current_user
 import json
+import csv
+import io
+import numpy as np
+from datetime import datetime, timedelta
 
 
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
@@ -41,39 +52,274 @@ class DeviceController:
         device_list = [device.to_dict() for device in devices]  # Convert each user to a dict
         return jsonify(device_list)  # Return the list as a JSON response
 
+    @staticmethod
+    def _parse_since_ts(value):
+        """Epoch seconds (int/float) or ISO 8601 string. Raises ValueError when it is neither."""
+        if not value:
+            return None
+        try:
+            return datetime.fromtimestamp(float(value))
+        except (OverflowError, OSError):
+            raise ValueError(f"since_ts out of range: {value}")
+        except ValueError:
+            pass
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+    @staticmethod
+    def _serialize_records(records):
+        record_list = []
+        for record in records:
+            d = record.to_dict()
+            if d.get('created_at'):
+                d['created_at'] = d['created_at'].isoformat()
+            record_list.append(d)
+        return record_list
+
+    @staticmethod
+    def _not_modified(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        return response
+
     @staticmethod
     def get_data_records():
-        from flask_server.app.model.model import DeviceRecord, Device
-        
+        """
+        Latest records of the user's devices.
+        Default: newest `limit` records (JSON list).
+        Cursor mode (?since_id=<id> or ?since_ts=<epoch|iso>): only records newer than the cursor,
+        oldest first, as {"records", "next_since_id", "next_since_ts", "has_more"}; keep calling with
+        the returned cursor until has_more is false so bursts are never missed.
+        Both modes send an ETag; a matching If-None-Match gets an empty 304.
+        since_id alone is the reliable cursor. With since_ts, records are ordered by reading time
+        (created_at, then id) and since_id only breaks ties: pass back both next_since_ts and
+        next_since_id so a page ending inside a run of equal timestamps continues where it stopped.
+        created_at is the device's own timestamp when it sent one: a backdated reading stored after
+        a poll is older than the cursor and is never returned in since_ts mode.
+        """
         user = DeviceController.get_authenticated_user()
         if not user:
             return jsonify([]), 401
         
         # Ambil parameter dari URL (contoh: ?device_id=ID_001&limit=5)
         device_id = request.args.get('device_id')
-        limit = request.args.get('limit', default=100, type=int)
+        limit = min(max(request.args.get('limit', default=100, type=int), 1), 1000)
+        since_id = request.args.get('since_id', type=int)
+        try:
+            since_ts = DeviceController._parse_since_ts(request.args.get('since_ts'))
+        except ValueError:
+            return jsonify({"code": 400, "message": "since_ts must be epoch seconds or an ISO 8601 date"}), 400
 
-        # Join with Device table to ensure ownership
-        query = DeviceRecord.query.join(Device, DeviceRecord.device_id == Device.device_id)\
-                                  .filter(Device.user_id == user.id)
+        # Ownership: records of the user's devices (IN avoids duplicates when a device_id has several types)
+        user_device_ids = db.session.query(Device.device_id).filter(Device.user_id == user.id)
+        query = DeviceRecord.query.filter(DeviceRecord.device_id.in_(user_device_ids))
 
-        # Jika ada parameter device_id, filter datanya (Ownership is already checked by join)
+        # Jika ada parameter device_id, filter datanya (Ownership is already checked above)
         if device_id:
             query = query.filter(DeviceRecord.device_id == device_id)
 
+        scope = f"{user.id}-{device_id or '*'}"
+
+        if since_id is not None or since_ts is not None:
+            if since_ts is not None:
+                # (created_at, id) keyset: since_id breaks ties between rows of the same timestamp
+                after = DeviceRecord.created_at > since_ts if since_id is None else \
+                        DeviceController._keyset_filter(since_ts, since_id, older=False)
+                query = query.filter(after).order_by(DeviceRecord.created_at.asc(), DeviceRecord.id.asc())
+            else:
+                query = query.filter(DeviceRecord.id > since_id).order_by(DeviceRecord.id.asc())
+            records = query.limit(limit + 1).all()
+            has_more = len(records) > limit
+            records = records[:limit]
+
+            next_since_id = records[-1].id if records else since_id
+            next_since_ts = records[-1].created_at.isoformat() if records else \
+                            (since_ts.isoformat() if since_ts else None)
+            etag = f"rec-{scope}-{next_since_id}-{next_since_ts}"
+            if not records and request.if_none_match.contains_weak(etag):
+                return DeviceController._not_modified(etag)
+
+            response = jsonify({
+                "records": DeviceController._serialize_records(records),
+                "next_since_id": next_since_id,
+                "next_since_ts": next_since_ts,
+                "has_more": has_more
+            })
+            response.set_etag(etag, weak=True)
+            return response
+
+        # Cheap change check before loading/serializing anything
+        newest_id = query.with_entities(db.func.max(DeviceRecord.id)).scalar() or 0
+        etag = f"rec-{scope}-{limit}-{newest_id}"
+        if request.if_none_match.contains_weak(etag):
+            return DeviceController._not_modified(etag)
+
         # Ambil data terbaru sesuai limit
         records = query.order_by(DeviceRecord.created_at.desc()).limit(limit).all()
 
-        record_list = []
-        for record in records:
-            d = record.to_dict()
-            if d.get('created_at'):
-                d['created_at'] = d['created_at'].isoformat()
-            record_list.append(d)
-        
-        return jsonify(record_list)
+        response = jsonify(DeviceController._serialize_records(records))
+        response.set_etag(etag, weak=True)
+        return response
+
+    # Data Record page tables: row filter + displayed columns (DataTables column order)
+    RECORD_TABLES = {
+        'power': (lambda: DeviceRecord.power.isnot(None),
+                  ['id', 'device_id', 'power', 'voltage', 'current', 'frequency', 'energy', 'created_at']),
+        'environment': (lambda: (DeviceRecord.temperature.isnot(None)) | (DeviceRecord.humidity.isnot(None)),
+                        ['id', 'device_id', 'humidity', 'temperature', 'created_at']),
+        'weather': (lambda: (DeviceRecord.weather.isnot(None)) & (DeviceRecord.weather != ''),
+                    ['id', 'device_id', 'weather', 'created_at']),
+        'lux': (lambda: DeviceRecord.lux.isnot(None),
+                ['id', 'device_id', 'lux', 'created_at']),
+        'fire': (lambda: (DeviceRecord.fire.isnot(None)) | (DeviceRecord.temperature.isnot(None)) | (DeviceRecord.smoke.isnot(None)),
+                 ['id', 'device_id', 'temperature', 'smoke', 'fire', 'created_at']),
+        'gas': (lambda: (DeviceRecord.gas.isnot(None)) | (DeviceRecord.gas_ppm.isnot(None)) | (DeviceRecord.gas_voltage.isnot(None)),
+                ['id', 'device_id', 'gas', 'gas_ppm', 'gas_voltage', 'created_at']),
+        'smoke': (lambda: DeviceRecord.smoke.isnot(None),
+                  ['id', 'device_id', 'smoke', 'created_at']),
+        'water': (lambda: (DeviceRecord.water_level.isnot(None)) | (DeviceRecord.total_volume.isnot(None)) | (DeviceRecord.water.isnot(None)),
+                  ['id', 'device_id', 'water_level', 'total_volume', 'created_at']),
+        'ultrasonic': (lambda: DeviceRecord.distance.isnot(None),
+                       ['id', 'device_id', 'distance', 'created_at'])
+    }
 
-    
+    @staticmethod
+    def _format_cell(field, row):
+        value = getattr(row, field)
+        if field == 'water_level' and value is None:
+            value = row.water
+        if field == 'created_at':
+            # Same as the 'wib_format' template filter
+            return (value + timedelta(hours=7)).strftime('%Y-%m-%d %H:%M:%S') if value else "-"
+        if field == 'fire':
+            return "Detected" if value == 1 else "Safe" if value == 0 else "-"
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return "%.2f" % value
+        return str(value)
+
+    @staticmethod
+    def _record_key(row):
+        # Keyset cursor "<created_at iso>|<id>", empty timestamp for a NULL created_at
+        return f"{row.created_at.isoformat() if row.created_at else ''}|{row.id}"
+
+    @staticmethod
+    def _parse_record_key(key):
+        try:
+            ts, record_id = key.rsplit('|', 1)
+            return (datetime.fromisoformat(ts) if ts else None), int(record_id)
+        except (ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def _keyset_filter(ts, record_id, older):
+        """
+        Rows strictly before (older) or after a (created_at, id) key in timestamp order.
+        SQLite sorts NULL created_at first ascending / last descending, so they sit below every timestamp.
+        """
+        created_at, row_id = DeviceRecord.created_at, DeviceRecord.id
+        if ts is None:
+            if older:
+                return created_at.is_(None) & (row_id < record_id)
+            return created_at.isnot(None) | (created_at.is_(None) & (row_id > record_id))
+        if older:
+            return (created_at < ts) | ((created_at == ts) & (row_id < record_id)) | created_at.is_(None)
+        return (created_at > ts) | ((created_at == ts) & (row_id > record_id))
+
+    @staticmethod
+    def _like_prefix(text):
+        """LIKE pattern matching text literally as a prefix (escape='\\')."""
+        return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+    @staticmethod
+    def data_record_table(table):
+        """
+        Server-side DataTables endpoint for one Data Record tab.
+        Filtering, sorting, projection and paging run in SQL; only the visible page is returned.
+        Sequential paging on the timestamp sort uses keyset cursors (?after= / ?before=),
+        other jumps fall back to OFFSET on an id-only subquery (deferred join).
+        """
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+        if table not in DeviceController.RECORD_TABLES:
+            return jsonify({"code": 404, "message": f"Unknown table {table}"}), 404
+
+        row_filter, columns = DeviceController.RECORD_TABLES[table]
+        draw = request.args.get('draw', default=0, type=int)
+        start = max(request.args.get('start', default=0, type=int), 0)
+        length = min(max(request.args.get('length', default=10, type=int), 1), 500)
+        search = (request.args.get('search[value]') or '').strip()
+        order_col = request.args.get('order[0][column]', default=len(columns) - 1, type=int)
+        order_desc = request.args.get('order[0][dir]', default='desc') != 'asc'
+
+        # Ownership: records of the user's devices (IN avoids duplicates when a device_id has several types)
+        user_device_ids = db.session.query(Device.device_id).filter(Device.user_id == user.id)
+        base = db.session.query(DeviceRecord.id).filter(DeviceRecord.device_id.in_(user_device_ids), row_filter())
+        records_total = base.order_by(None).count()
+
+        filtered = base
+        if search:
+            filtered = filtered.filter(DeviceRecord.device_id.like(DeviceController._like_prefix(search), escape='\\'))
+        records_filtered = filtered.order_by(None).count() if search else records_total
+
+        # '#' column and the timestamp column both sort by time (keyset capable)
+        sort_field = columns[order_col] if 0 < order_col < len(columns) else 'created_at'
+        keyset = sort_field == 'created_at'
+        sort_column = getattr(DeviceRecord, sort_field)
+
+        after = DeviceController._parse_record_key(request.args.get('after')) if keyset else None
+        before = DeviceController._parse_record_key(request.args.get('before')) if keyset else None
+        page_query = filtered
+        reverse = False
+        if after or before:
+            ts, record_id = after or before
+            # "after" continues in display order, "before" walks back against it
+            forward = bool(after)
+            older = order_desc == forward
+            page_query = page_query.filter(DeviceController._keyset_filter(ts, record_id, older))
+            desc = older
+            reverse = not forward
+            page_query = page_query.order_by(DeviceRecord.created_at.desc() if desc else DeviceRecord.created_at.asc(),
+                                             DeviceRecord.id.desc() if desc else DeviceRecord.id.asc()).limit(length)
+        else:
+            page_query = page_query.order_by(sort_column.desc() if order_desc else sort_column.asc(),
+                                             DeviceRecord.id.desc() if order_desc else DeviceRecord.id.asc())\
+                                   .offset(start).limit(length)
+
+        # Deferred join: page ids first (index only), then load the projected columns for those rows
+        page_ids = [row.id for row in page_query.all()]
+        if reverse:
+            page_ids.reverse()
+        rows_by_id = {}
+        if page_ids:
+            projection = [getattr(DeviceRecord, c) for c in set(columns) | {'id', 'water'}]
+            for row in db.session.query(*projection).filter(DeviceRecord.id.in_(page_ids)).all():
+                rows_by_id[row.id] = row
+
+        data = []
+        for i, record_id in enumerate(page_ids):
+            row = rows_by_id.get(record_id)
+            if row is None:
+                continue
+            cells = [start + i + 1] + [DeviceController._format_cell(c, row) for c in columns[1:]]
+            data.append(cells)
+
+        cursor = None
+        if page_ids and rows_by_id:
+            first, last = rows_by_id[page_ids[0]], rows_by_id[page_ids[-1]]
+            cursor = {
+                'first': DeviceController._record_key(first),
+                'last': DeviceController._record_key(last)
+            }
+
+        return jsonify({
+            "draw": draw,
+            "recordsTotal": records_total,
+            "recordsFiltered": records_filtered,
+            "data": data,
+            "cursor": cursor
+        })
 
     @staticmethod
     def add_device():
@@ -165,7 +411,10 @@ class DeviceController:
                     total_volume=initial_total_volume
                 )
                 db.session.add(new_record)
+                db.session.flush()
+                DeviceLatest.upsert([new_record.to_dict()])
                 db.session.commit()
+                dashboard_feed.forget(user.id)
                 data = {
                     "code": 200,
                     "message": "Device berhasil ditambahkan",
@@ -209,6 +458,7 @@ class DeviceController:
                     device.type_device = type_device
                     device.status = status
                     db.session.commit()
+                    dashboard_feed.forget(current_user.id)
                     data = {
                         "code":200,
                         "message":"Device berhasil diupdate"
@@ -265,8 +515,10 @@ class DeviceController:
                 return jsonify(data), 404
 
             # Delete the device object, not the ID string
+            DeviceLatest.query.filter_by(device_id=device_id).delete()
             db.session.delete(device)
             db.session.commit()
+            dashboard_feed.forget(user.id)
             
             data = {
                 "code":200,
@@ -290,39 +542,25 @@ class DeviceController:
         Helper function to process and save a new data record.
         valid_fields: list of fields to extract from data (others are ignored/None)
         """
-        try:
-            device_id = data.get('device_id')
-            if not device_id:
-                return jsonify({"code": 400, "message": "device_id is required"}), 400
+        if isinstance(data, list):
+            return DeviceController._process_add_batch([(item, valid_fields) for item in data])
+        if not isinstance(data, dict):
+            return jsonify({"code": 400, "message": "JSON object or array expected"}), 400
 
-            # Construct arguments for DeviceRecord based on valid_fields
-            record_args = {'device_id': device_id}
-            
-            # Explicitly mapping fields to ensure safety
-            allowed_keys = [
-                'power', 'voltage', 'current', 'frequency', 'energy',
-                'humidity', 'temperature', 'weather',
-                'fire', 'gas', 'smoke',
-                'lux', 'water', 'water_level', 'total_volume',
-                'gas_ppm', 'gas_voltage', 'distance'
-            ]
-            
-            # Only extract fields that are both in allowed_keys AND valid_fields (if specific)
-            # Or if valid_fields is None, take all known keys
-            target_keys = valid_fields if valid_fields else allowed_keys
-
-            for key in allowed_keys:
-                if key in target_keys:
-                    val = data.get(key)
-                    # Convert to appropriate type if needed, or let SQLAlchemy handle it (usually safer to cast if possible, but keeping it simple)
-                    record_args[key] = val
-                else:
-                     record_args[key] = None
+        # Same checks as a bulk item: device_id, numeric fields, at least one field of the type
+        record_args, error = DeviceController._validate_record(data, valid_fields)
+        if error:
+            return jsonify({"code": 400, "message": error}), 400
 
+        try:
             new_record = DeviceRecord(**record_args)
             
             db.session.add(new_record)
+            db.session.flush()
+            DeviceLatest.upsert([new_record.to_dict()])
             db.session.commit()
+            device_state.mark_accepted(new_record.device_id, new_record.created_at, new_record.to_dict())
+            dashboard_feed.notify()
 
             # Send to Cloud (Moved to Scheduler every 5 mins)
             # try:
@@ -340,6 +578,102 @@ class DeviceController:
             db.session.rollback()
             return jsonify({"code": 500, "message": f"Failed to save record: {str(e)}"}), 500
 
+    # Fields accepted by each /api/add_<type> route
+    ADD_FIELD_MAP = {
+        'power': ['power', 'voltage', 'current', 'frequency', 'energy'],
+        'lux': ['lux'],
+        'gas': ['gas', 'gas_ppm', 'gas_voltage'],
+        'smoke': ['smoke'],
+        'water': ['water', 'water_level', 'total_volume'],
+        'fire': ['fire', 'temperature', 'smoke'],
+        'weather': ['weather', 'temperature'],
+        'humidity_temp': ['humidity', 'temperature']
+    }
+
+    # All sensor columns a record may carry
+    RECORD_FIELDS = [
+        'power', 'voltage', 'current', 'frequency', 'energy',
+        'humidity', 'temperature', 'weather',
+        'fire', 'gas', 'smoke',
+        'lux', 'water', 'water_level', 'total_volume',
+        'gas_ppm', 'gas_voltage', 'distance'
+    ]
+
+    MAX_BATCH_ITEMS = 5000  # Records per bulk request
+
+    @staticmethod
+    def _validate_record(item, valid_fields):
+        """One bulk item -> (row dict for DeviceRecord insert, None) or (None, error message)."""
+        if not isinstance(item, dict):
+            return None, "JSON object expected"
+        device_id = item.get('device_id')
+        if not device_id or not isinstance(device_id, str):
+            return None, "device_id is required"
+
+        row = {'device_id': device_id.strip()}
+        target_keys = valid_fields if valid_fields else DeviceController.RECORD_FIELDS
+        for key in DeviceController.RECORD_FIELDS:
+            val = item.get(key) if key in target_keys else None
+            if val is not None and key != 'weather':
+                try:
+                    # Numbers (or numeric strings); fire is stored as 0/1
+                    val = int(float(val)) if key == 'fire' else float(val)
+                except (TypeError, ValueError):
+                    return None, f"{key} must be a number"
+            elif val is not None:
+                val = str(val)
+            row[key] = val
+        if valid_fields and all(row[key] is None for key in valid_fields):
+            return None, f"at least one of {', '.join(valid_fields)} is required"
+        row['created_at'] = IngestWriter.reading_time(item)
+        return row, None
+
+    @staticmethod
+    def _process_add_batch(items, rejected=None):
+        """
+        Bulk insert: items = [(record dict, valid_fields)], rejected = {index: message} found by the caller.
+        Valid items go in one multi-row INSERT + device_latest upsert + one commit,
+        invalid ones are reported per index and skipped.
+        """
+        rejected = rejected or {}
+        if not items:
+            return jsonify({"code": 400, "message": "Empty array"}), 400
+        if len(items) > DeviceController.MAX_BATCH_ITEMS:
+            return jsonify({"code": 413, "message": f"Max {DeviceController.MAX_BATCH_ITEMS} records per request"}), 413
+
+        rows, results = [], []
+        for index, (item, valid_fields) in enumerate(items):
+            error = rejected.get(index)
+            row = None
+            if not error:
+                row, error = DeviceController._validate_record(item, valid_fields)
+            if error:
+                results.append({"index": index, "status": "error", "message": error})
+                continue
+            rows.append(row)
+            results.append({"index": index, "status": "ok", "device_id": row['device_id']})
+
+        if rows:
+            try:
+                db.session.execute(DeviceRecord.__table__.insert(), rows)
+                DeviceLatest.upsert(rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                return jsonify({"code": 500, "message": f"Failed to save records: {str(e)}"}), 500
+            for row in rows:
+                device_state.mark_accepted(row['device_id'], row['created_at'], row)
+            dashboard_feed.notify()
+
+        failed = len(items) - len(rows)
+        return jsonify({
+            "code": 200 if not failed else 207,
+            "message": f"{len(rows)} records added, {failed} rejected",
+            "saved": len(rows),
+            "failed": failed,
+            "results": results
+        }), 200 if not failed else 207
+
     @staticmethod
     def add_data_record():
         """
@@ -347,91 +681,74 @@ class DeviceController:
         """
         return DeviceController._process_add_record(request.json, None)
 
+    @staticmethod
+    def add_batch():
+        """
+        POST /api/add_batch
+        [{"type": "power", "device_id": ..., ...}, ...] or {"type": "power", "records": [...]}
+        Each item is validated against the field list of its type (no type = all fields).
+        """
+        data = request.get_json(silent=True)
+        default_type = None
+        if isinstance(data, dict):
+            default_type = data.get('type')
+            data = data.get('records')
+        if not isinstance(data, list):
+            return jsonify({"code": 400, "message": "JSON array of records expected"}), 400
+
+        items, rejected = [], {}
+        for index, item in enumerate(data):
+            record_type = (item.get('type') if isinstance(item, dict) else None) or default_type
+            if record_type:
+                record_type = str(record_type).replace('-', '_')
+                if record_type not in DeviceController.ADD_FIELD_MAP:
+                    rejected[index] = f"Unknown type '{record_type}'"
+            items.append((item, DeviceController.ADD_FIELD_MAP.get(record_type)))
+        return DeviceController._process_add_batch(items, rejected)
+
     @staticmethod
     def add_power():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['power', 'voltage', 'current', 'frequency', 'energy']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['power'])
 
     @staticmethod
     def add_lux():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['lux']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['lux'])
 
     @staticmethod
     def add_gas():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['gas', 'gas_ppm', 'gas_voltage']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['gas'])
 
     @staticmethod
     def add_smoke():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['smoke']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['smoke'])
 
     @staticmethod
     def add_water():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['water', 'water_level', 'total_volume']
-        )
-    
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['water'])
+
     @staticmethod
     def add_fire():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['fire', 'temperature', 'smoke']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['fire'])
 
     @staticmethod
     def add_weather():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['weather', 'temperature']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['weather'])
 
     @staticmethod
     def add_humidity_temp():
-        return DeviceController._process_add_record(
-            request.json, 
-            ['humidity', 'temperature']
-        )
+        return DeviceController._process_add_record(request.json, DeviceController.ADD_FIELD_MAP['humidity_temp'])
 
 
     @staticmethod
-    def _get_sensor_data(device_id, target_type):
+    def _sensor_payload(record, target_type):
+        """Compact gw/id/amp/... payload of a DeviceLatest row (shared by /api/get_<type> and /api/latest)."""
         from config import config
-        device_id = device_id.strip()
-        
-        if not current_user.is_authenticated:
-             return jsonify([]), 401
 
-        # Check if device exists with specific type AND belongs to user
-        device = Device.query.filter_by(device_id=device_id, type_device=target_type, user_id=current_user.id).first()
-        if not device:
-             return jsonify({
-                "code": 404,
-                "message": f"Device {device_id} of type {target_type} not found in your account"
-             }), 404
-
-        record = DeviceRecord.query.filter_by(device_id=device_id).order_by(DeviceRecord.created_at.desc()).first()
-        if not record:
-            return jsonify({
-                "code": 404,
-                "message": f"No data for {device_id}"
-            }), 404
-        
         payload = {}
         # Common fields
         payload["gw"] = config.device_id
         payload["id"] = record.device_id
-        payload["amp"] = record.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        payload["amp"] = record.last_seen.strftime('%Y-%m-%d %H:%M:%S')
 
         if target_type == 'power':
             payload["vt"] = str(record.voltage if record.voltage is not None else 0)
@@ -462,7 +779,73 @@ class DeviceController:
              payload["hum"] = str(record.humidity if record.humidity is not None else 0)
              payload["temp"] = str(record.temperature if record.temperature is not None else 0)
         
-        return jsonify(payload), 200
+        return payload
+
+    @staticmethod
+    def _get_sensor_data(device_id, target_type):
+        device_id = device_id.strip()
+        
+        if not current_user.is_authenticated:
+             return jsonify([]), 401
+
+        # Check if device exists with specific type AND belongs to user
+        device = Device.query.filter_by(device_id=device_id, type_device=target_type, user_id=current_user.id).first()
+        if not device:
+             return jsonify({
+                "code": 404,
+                "message": f"Device {device_id} of type {target_type} not found in your account"
+             }), 404
+
+        record = DeviceLatest.query.get(device_id)
+        if not record or not record.last_seen:
+            return jsonify({
+                "code": 404,
+                "message": f"No data for {device_id}"
+            }), 404
+        
+        return jsonify(DeviceController._sensor_payload(record, target_type)), 200
+
+    @staticmethod
+    def get_latest_bulk():
+        """
+        GET /api/latest?type=power&device_ids=a,b,c
+        _get_sensor_data payloads for many devices in one call (one join on device_latest).
+        Without device_ids: every device of the user (of that type, if given).
+        """
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+
+        target_type = (request.args.get('type') or '').strip()
+        if target_type == 'humidity_temp':
+            target_type = 'humidity-temp' # Stored type name
+        device_ids = [d.strip() for d in (request.args.get('device_ids') or '').split(',') if d.strip()]
+
+        query = db.session.query(Device.device_id, Device.type_device, DeviceLatest)\
+                          .outerjoin(DeviceLatest, Device.device_id == DeviceLatest.device_id)\
+                          .filter(Device.user_id == user.id)
+        if target_type:
+            query = query.filter(Device.type_device == target_type)
+        if device_ids:
+            query = query.filter(Device.device_id.in_(device_ids))
+
+        data, seen = [], set()
+        for device_id, type_device, record in query.order_by(Device.id).all():
+            if record is None or not record.last_seen:
+                continue
+            seen.add(device_id)
+            data.append(DeviceController._sensor_payload(record, type_device))
+
+        not_found = [d for d in device_ids if d not in seen]
+        return jsonify({"code": 200, "count": len(data), "data": data, "not_found": not_found}), 200
+
+    @staticmethod
+    def ingest_stats():
+        """GET /api/ingest_stats: queue depth / shed counts per ingest queue, stage latencies, writer counters."""
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+        return jsonify(ingest_metrics.snapshot())
 
     @staticmethod
     def get_power_json(device_id):
@@ -496,124 +879,147 @@ class DeviceController:
     def get_humidity_temp_json(device_id):
         return DeviceController._get_sensor_data(device_id, 'humidity-temp')
 
+    # Define fields to keep for each type (bulk sync payloads)
+    SYNC_FIELD_MAP = {
+        'power': ['power', 'voltage', 'current', 'frequency', 'energy'],
+        'lux': ['lux'],
+        'gas': ['gas', 'gas_ppm', 'gas_voltage'],
+        'smoke': ['smoke'],
+        'water': ['water', 'water_level', 'total_volume'],
+        'fire': ['fire', 'temperature', 'smoke'],
+        'weather': ['weather', 'temperature'],
+        'humidity_temp': ['humidity', 'temperature']
+    }
+
+    @staticmethod
+    def _sync_query(target_type):
+        # Rows of the type (columns not null), same filter RetentionEngine uses to protect unsynced rows
+        query = DeviceRecord.query
+        record_filter = SyncCursor.record_filter(target_type)
+        if record_filter is not None:
+            query = query.filter(record_filter)
+        return query
+
+    @staticmethod
+    def _sync_payload(record, allowed_fields):
+        # Always include identification fields
+        base_fields = ['device_id', 'created_at']
+        full_data = record.to_dict()
+
+        # If type not found or generic, send everything (fallback)
+        if not allowed_fields:
+            return full_data
+
+        filtered_data = {k: full_data[k] for k in base_fields if k in full_data}
+        for field in allowed_fields:
+            if field in full_data:
+                filtered_data[field] = full_data[field]
+        return filtered_data
+
     @staticmethod
     def sync_data_records(type_arg=None):
         """
-        Manually trigger bulk sync of all local data to cloud.
+        Incremental bulk sync of local data to cloud.
+        Each endpoint keeps a SyncCursor per type (last DeviceRecord.id queued), so only rows
+        newer than the cursor are read. New rows go to the durable outbox in the same
+        transaction that advances the cursor; CloudOutbox handles delivery and retries.
         Supports filtering by type via query param ?type=power OR function argument
         """
         target_type = type_arg if type_arg else request.args.get('type') # e.g. power, water
         
         try:
-            query = DeviceRecord.query
-            
-            # Simple filtering logic based on columns being not null
-            if target_type == 'power':
-                query = query.filter(DeviceRecord.power.isnot(None))
-            elif target_type == 'water':
-                query = query.filter(DeviceRecord.water.isnot(None))
-            elif target_type == 'gas':
-                query = query.filter((DeviceRecord.gas.isnot(None)) | (DeviceRecord.gas_ppm.isnot(None)))
-            elif target_type == 'smoke':
-                query = query.filter(DeviceRecord.smoke.isnot(None))
-            elif target_type == 'fire':
-                query = query.filter(DeviceRecord.fire.isnot(None))
-            elif target_type == 'weather':
-                query = query.filter(DeviceRecord.weather.isnot(None))
-            elif target_type == 'lux':
-                query = query.filter(DeviceRecord.lux.isnot(None))
-            elif target_type == 'humidity_temp':
-                query = query.filter((DeviceRecord.humidity.isnot(None)) | (DeviceRecord.temperature.isnot(None)))
-            
-            # Get all matching records
-            records = query.all()
-            total = len(records)
-            success_count = 0
-
-            print(f"[BULK SYNC] Starting sync for {total} records (Type: {target_type})...")
-
-            # Define fields to keep for each type
-            field_map = {
-                'power': ['power', 'voltage', 'current', 'frequency', 'energy'],
-                'lux': ['lux'],
-                'gas': ['gas', 'gas_ppm', 'gas_voltage'],
-                'smoke': ['smoke'],
-                'water': ['water', 'water_level', 'total_volume'],
-                'fire': ['fire', 'temperature', 'smoke'],
-                'weather': ['weather', 'temperature'],
-                'humidity_temp': ['humidity', 'temperature']
-            }
-            
-            allowed_fields = field_map.get(target_type, [])
-            # Always include identification fields
-            base_fields = ['device_id', 'created_at']
+            configured, targets = CloudSender.get_bulk_targets(target_type)
+            if not configured:
+                # Legacy (.env) fallback is disabled, user must configure an endpoint in Settings.
+                return jsonify({
+                    "code": 200,
+                    "message": "No endpoints configured (Legacy disabled)",
+                    "queued_count": 0,
+                    "type_filter": target_type
+                })
+
+            query = DeviceController._sync_query(target_type)
+            allowed_fields = DeviceController.SYNC_FIELD_MAP.get(target_type, [])
+
+            queued_count = 0
+            for ep, shim_ep in targets:
+                cursor = SyncCursor.get_or_create(ep, target_type)
+                batch_size = ep.batch_size or DEFAULT_BATCH_SIZE
+                endpoint_count = 0
+
+                # Keyset pagination on id: one batch_size chunk in memory at a time,
+                # each chunk becomes one outbox batch and moves the cursor in the same commit.
+                while True:
+                    records = query.filter(DeviceRecord.id > (cursor.last_record_id or 0))\
+                                   .order_by(DeviceRecord.id.asc()).limit(batch_size).all()
+                    if not records:
+                        break
+
+                    data_list = [DeviceController._sync_payload(r, allowed_fields) for r in records]
+                    CloudOutbox.enqueue(shim_ep, data_list, sensor_type=target_type)
+                    cursor.last_record_id = records[-1].id
+                    db.session.commit()
+                    endpoint_count += len(data_list)
 
-            data_list = []
+                    if len(records) < batch_size:
+                        break
 
-            for record in records:
-                # Get full dict
-                full_data = record.to_dict()
-                
-                # If we have specific fields defined, filter the dict
-                if allowed_fields:
-                    filtered_data = {k: full_data[k] for k in base_fields if k in full_data}
-                    for field in allowed_fields:
-                        if field in full_data:
-                            filtered_data[field] = full_data[field]
-                    data_list.append(filtered_data)
-                else:
-                    # If type not found or generic, send everything (fallback)
-                    data_list.append(full_data)
+                if endpoint_count:
+                    print(f"[BULK SYNC] {ep.name}: queued {endpoint_count} new records (Type: {target_type}, up to id {cursor.last_record_id}).")
+                queued_count += endpoint_count
+
+            # Persist cursors created for endpoints that had nothing new yet
+            db.session.commit()
+
+            # Try to deliver right away, failures stay in the outbox for the retry worker
+            delivered, delivered_records, failed = CloudOutbox.deliver_pending()
 
-                success_count += 1
-            
-            # Send bulk data using CloudSender
-            if data_list:
-                # If triggered manually via sync endpoint, we send it to cloud
-                success, msg, status_code = CloudSender.send_bulk_data(data_list, target_type)
-                
-                if not success:
-                    return jsonify({
-                        "code": status_code if status_code != 0 else 500,
-                        "message": f"Cloud Sync Failed: {msg}",
-                        "synced_count": 0,
-                        "total_records": len(records),
-                        "type_filter": target_type
-                    }), status_code if status_code != 0 and status_code < 600 else 500
-                
             return jsonify({
                 "code": 200, 
-                "message": "Bulk sync completed successfully", 
-                "synced_count": len(data_list),
-                "total_records": len(records),
+                "message": "Bulk sync completed successfully" if not failed else "Queued, some deliveries will be retried",
+                "queued_count": queued_count,
+                "delivered_count": delivered_records,
+                "failed_batches": failed,
+                "outbox": CloudOutbox.stats(),
+                "endpoints": len(targets),
                 "type_filter": target_type
             })
 
         except Exception as e:
+            db.session.rollback()
             return jsonify({
                 "code": 500,
                 "message": f"Bulk sync failed: {str(e)}"
             }), 500
 
+    # Fields returned by the PULL API for each type
+    PULL_FIELD_MAP = {
+        'power': ['power', 'voltage', 'current', 'frequency', 'energy'],
+        'water': ['water_level', 'total_volume'],
+        'gas': ['gas', 'gas_ppm', 'gas_voltage'],
+        'smoke': ['smoke', 'fire', 'temperature'],
+        'fire': ['fire', 'smoke', 'temperature'],
+        'weather': ['weather', 'temperature'],
+        'lux': ['lux'],
+        'humidity_temp': ['humidity', 'temperature']
+    }
+
+    # Rows fetched per cursor round trip / written per chunk by export_records
+    EXPORT_CHUNK = 1000
+
+    @staticmethod
+    def _pull_main_field(target_type):
+        if target_type not in DeviceController.PULL_FIELD_MAP:
+            return None
+        return getattr(DeviceRecord, target_type if target_type != 'humidity_temp' else 'humidity', None)
+
     @staticmethod
     def pull_data_records(target_type='all'):
         try:
             query = DeviceRecord.query
             
-            # Simple Map for filters
-            field_map = {
-                'power': ['power', 'voltage', 'current', 'frequency', 'energy'],
-                'water': ['water_level', 'total_volume'],
-                'gas': ['gas', 'gas_ppm', 'gas_voltage'],
-                'smoke': ['smoke', 'fire', 'temperature'],
-                'fire': ['fire', 'smoke', 'temperature'],
-                'weather': ['weather', 'temperature'],
-                'lux': ['lux'],
-                'humidity_temp': ['humidity', 'temperature']
-            }
-
             base_fields = ['device_id', 'created_at']
-            allowed_fields = field_map.get(target_type, [])
+            allowed_fields = DeviceController.PULL_FIELD_MAP.get(target_type, [])
 
             if not current_user.is_authenticated:
                 return jsonify([])
@@ -622,11 +1028,10 @@ class DeviceController:
             query = query.join(Device, DeviceRecord.device_id == Device.device_id)\
                          .filter(Device.user_id == current_user.id)
 
-            if target_type in field_map:
-                 # Check if the MAIN field is not None
-                 main_field = getattr(DeviceRecord, target_type if target_type != 'humidity_temp' else 'humidity', None)
-                 if main_field:
-                     query = query.filter(main_field.isnot(None))
+            # Check if the MAIN field is not None
+            main_field = DeviceController._pull_main_field(target_type)
+            if main_field is not None:
+                query = query.filter(main_field.isnot(None))
 
             records = query.all()
             
@@ -647,7 +1052,318 @@ class DeviceController:
         except Exception as e:
             return jsonify({"code": 500, "message": str(e)}), 500
 
+    @staticmethod
+    def export_records(target_type=None, default_format='ndjson'):
+        """
+        Streaming export (chunked response, flat memory for any number of rows).
+        Query params: format=ndjson|csv, type=<pull type>, device_id=a,b,c, from=/to= (epoch or ISO).
+        Rows are read with a server-side cursor (yield_per) and written as they arrive.
+        """
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+
+        target_type = target_type or request.args.get('type') or 'all'
+        fmt = (request.args.get('format') or default_format).lower()
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({"code": 400, "message": "format must be ndjson or csv"}), 400
+
+        allowed_fields = DeviceController.PULL_FIELD_MAP.get(target_type)
+        if allowed_fields:
+            fields = ['id', 'device_id', 'created_at'] + allowed_fields
+        else:
+            fields = [c.name for c in DeviceRecord.__table__.columns]
+
+        # Projection only (no ORM objects), ownership via IN subquery
+        user_device_ids = db.session.query(Device.device_id).filter(Device.user_id == user.id)
+        query = db.session.query(*[getattr(DeviceRecord, f) for f in fields])\
+                          .filter(DeviceRecord.device_id.in_(user_device_ids))
+
+        main_field = DeviceController._pull_main_field(target_type)
+        if main_field is not None:
+            query = query.filter(main_field.isnot(None))
+
+        device_ids = [d.strip() for d in (request.args.get('device_id') or '').split(',') if d.strip()]
+        if device_ids:
+            query = query.filter(DeviceRecord.device_id.in_(device_ids))
+        try:
+            date_from = DeviceController._parse_since_ts(request.args.get('from'))
+            date_to = DeviceController._parse_since_ts(request.args.get('to'))
+        except ValueError:
+            return jsonify({"code": 400, "message": "from/to must be epoch seconds or ISO 8601 dates"}), 400
+        if date_from:
+            query = query.filter(DeviceRecord.created_at >= date_from)
+        if date_to:
+            query = query.filter(DeviceRecord.created_at < date_to)
+
+        query = query.order_by(DeviceRecord.id.asc()).yield_per(DeviceController.EXPORT_CHUNK)
+
+        def json_serial(obj):
+            if hasattr(obj, 'isoformat'): return obj.isoformat()
+            return str(obj)
+
+        def generate_ndjson():
+            buffer = []
+            for row in query:
+                buffer.append(json.dumps(dict(zip(fields, row)), default=json_serial))
+                if len(buffer) >= DeviceController.EXPORT_CHUNK:
+                    yield "\n".join(buffer) + "\n"
+                    buffer = []
+            if buffer:
+                yield "\n".join(buffer) + "\n"
+
+        def generate_csv():
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(fields)
+            count = 0
+            for row in query:
+                writer.writerow([v.isoformat() if hasattr(v, 'isoformat') else v for v in row])
+                count += 1
+                if count % DeviceController.EXPORT_CHUNK == 0:
+                    yield out.getvalue()
+                    out.seek(0)
+                    out.truncate(0)
+            yield out.getvalue()
+
+        if fmt == 'csv':
+            response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+            response.headers['Content-Disposition'] = f'attachment; filename=records_{target_type}.csv'
+        else:
+            response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+        return response
+
+    # Chart aggregation buckets (seconds)
+    AGGREGATE_BUCKETS = {'1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+    MAX_AGGREGATE_POINTS = 500  # Coarser bucket is chosen automatically above this
+
+    @staticmethod
+    def _chart_metrics(user, device_id):
+        """Numeric metrics valid for device_id, from the sync field map of its type(s). None if not owned."""
+        types = [d.type_device for d in Device.query.filter_by(device_id=device_id, user_id=user.id).all()]
+        if not types:
+            return None
+        metrics = []
+        for t in types:
+            for field in DeviceController.SYNC_FIELD_MAP.get(t.replace('-', '_'), []):
+                column = getattr(DeviceRecord, field, None)
+                if column is not None and column.type.python_type in (int, float) and field not in metrics:
+                    metrics.append(field)
+        return metrics
+
+    @staticmethod
+    def _chart_range():
+        """from/to query params (epoch or ISO), default last 24 hours. Raises ValueError on a bad date."""
+        date_to = DeviceController._parse_since_ts(request.args.get('to')) or datetime.now()
+        date_from = DeviceController._parse_since_ts(request.args.get('from')) or (date_to - timedelta(days=1))
+        return date_from, date_to
+
+    @staticmethod
+    def _aggregate_raw(device_id, metric, bucket_seconds, date_from, date_to):
+        """GROUP BY time bucket over device_records -> {bucket epoch: {min, max, sum, count, last, last_at}}"""
+        column = getattr(DeviceRecord, metric)
+        # SQLite: seconds since epoch of the naive timestamp, floored to the bucket
+        bucket = (db.func.cast(db.func.strftime('%s', DeviceRecord.created_at), db.Integer) / bucket_seconds) * bucket_seconds
+        base = db.session.query(bucket.label('bucket'))\
+                         .filter(DeviceRecord.device_id == device_id,
+                                 DeviceRecord.created_at >= date_from,
+                                 DeviceRecord.created_at < date_to,
+                                 column.isnot(None))
+
+        rows = base.add_columns(db.func.min(column), db.func.max(column), db.func.sum(column),
+                                db.func.count(column), db.func.max(DeviceRecord.id),
+                                db.func.max(DeviceRecord.created_at))\
+                   .group_by('bucket').order_by('bucket').all()
+
+        # 'last' = value of the newest row of each bucket (one lookup by primary key)
+        last_ids = [r[5] for r in rows]
+        last_values = dict(db.session.query(DeviceRecord.id, column).filter(DeviceRecord.id.in_(last_ids)).all()) if last_ids else {}
+
+        return {r[0]: {'min': r[1], 'max': r[2], 'sum': r[3], 'count': r[4],
+                       'last': last_values.get(r[5]), 'last_at': r[6]} for r in rows}
+
+    @staticmethod
+    def _merge_rollups(buckets, rollups, bucket_seconds):
+        """Fold rollup rows (finer or equal tier) into the raw buckets dict."""
+        for rollup in rollups:
+            key = int((rollup.bucket - datetime(1970, 1, 1)).total_seconds()) // bucket_seconds * bucket_seconds
+            acc = buckets.get(key)
+            if acc is None:
+                buckets[key] = {'min': rollup.min, 'max': rollup.max, 'sum': rollup.sum, 'count': rollup.count,
+                                'last': rollup.last, 'last_at': rollup.last_at}
+                continue
+            acc['min'] = min(acc['min'], rollup.min)
+            acc['max'] = max(acc['max'], rollup.max)
+            acc['sum'] += rollup.sum
+            acc['count'] += rollup.count
+            if rollup.last_at and (acc['last_at'] is None or rollup.last_at > acc['last_at']):
+                acc['last'], acc['last_at'] = rollup.last, rollup.last_at
+        return buckets
+
+    @staticmethod
+    def _aggregate(device_id, metric, bucket_seconds, date_from, date_to):
+        """
+        Raw rows + rollups (for the part of the range already compacted by the retention engine)
+        -> [{t, min, max, avg, count, last}]
+        """
+        buckets = DeviceController._aggregate_raw(device_id, metric, bucket_seconds, date_from, date_to)
+        tier = RetentionEngine.tier_for(bucket_seconds)
+        # Past the tier's retention, coarser rollups fill in (e.g. 1h rows in 5m buckets)
+        for _, rollups in RetentionEngine.read_tiers(tier, device_id, metric, date_from, date_to):
+            DeviceController._merge_rollups(buckets, rollups, bucket_seconds)
+
+        return [{
+            't': datetime.utcfromtimestamp(key).isoformat(),
+            'min': acc['min'], 'max': acc['max'],
+            'avg': acc['sum'] / acc['count'] if acc['count'] else None,
+            'count': acc['count'], 'last': acc['last']
+        } for key, acc in sorted(buckets.items())]
+
+    @staticmethod
+    def aggregate_records():
+        """
+        GET /api/records/aggregate?device_id=&metric=&bucket=1m|5m|1h|1d&from=&to=
+        Aggregated in SQL per time bucket, so a chart never gets more than MAX_AGGREGATE_POINTS points.
+        Ranges older than the raw retention window are read from the matching rollup tier.
+        """
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+
+        device_id = (request.args.get('device_id') or '').strip()
+        metric = (request.args.get('metric') or '').strip()
+        metrics = DeviceController._chart_metrics(user, device_id) if device_id else None
+        if metrics is None:
+            return jsonify({"code": 404, "message": f"Device {device_id} not found in your account"}), 404
+        if metric not in metrics:
+            return jsonify({"code": 400, "message": f"Invalid metric '{metric}'", "metrics": metrics}), 400
 
+        bucket_name = request.args.get('bucket')
+        if bucket_name and bucket_name not in DeviceController.AGGREGATE_BUCKETS:
+            return jsonify({"code": 400, "message": "bucket must be one of 1m, 5m, 1h, 1d"}), 400
 
+        try:
+            date_from, date_to = DeviceController._chart_range()
+        except ValueError:
+            return jsonify({"code": 400, "message": "from/to must be epoch seconds or ISO 8601 dates"}), 400
+        span = max((date_to - date_from).total_seconds(), 0)
+
+        # Requested (or finest) bucket, promoted until the range fits in MAX_AGGREGATE_POINTS
+        candidates = sorted(DeviceController.AGGREGATE_BUCKETS.items(), key=lambda kv: kv[1])
+        if bucket_name:
+            candidates = [kv for kv in candidates if kv[1] >= DeviceController.AGGREGATE_BUCKETS[bucket_name]]
+        bucket_name, bucket_seconds = candidates[-1]
+        for name, seconds in candidates:
+            if span / seconds <= DeviceController.MAX_AGGREGATE_POINTS:
+                bucket_name, bucket_seconds = name, seconds
+                break
+
+        points = DeviceController._aggregate(device_id, metric, bucket_seconds, date_from, date_to)
+        return jsonify({
+            "device_id": device_id,
+            "metric": metric,
+            "bucket": bucket_name,
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "points": points
+        })
+
+    # Series where a hidden spike means a hidden alarm: downsample with min/max by default
+    ALARM_METRICS = ('fire', 'smoke', 'gas', 'gas_ppm', 'gas_voltage')
+    DEFAULT_SERIES_POINTS = 1000
+    MAX_SERIES_POINTS = 5000
 
-        
\ No newline at end of file
+    @staticmethod
+    def _raw_series(device_id, metric, date_from, date_to):
+        """(epoch seconds, value) float arrays of one metric, ordered by time."""
+        column = getattr(DeviceRecord, metric)
+        # Epoch computed in SQLite, no datetime object per row
+        epoch = (db.func.julianday(DeviceRecord.created_at) - 2440587.5) * 86400.0
+        rows = db.session.query(epoch, column)\
+                         .filter(DeviceRecord.device_id == device_id,
+                                 DeviceRecord.created_at >= date_from,
+                                 DeviceRecord.created_at < date_to,
+                                 column.isnot(None))\
+                         .order_by(DeviceRecord.created_at.asc()).all()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    # Rollup tier for a series: the finest one that yields at most this many source points
+    MAX_ROLLUP_SOURCE_POINTS = 200000
+
+    @staticmethod
+    def _rollup_series(device_id, metric, date_from, date_to, mode):
+        """
+        Series points from rollups for the compacted part of the range.
+        minmax: min and max of each bucket (alarm spikes survive compaction), lttb: bucket average.
+        """
+        span = max((date_to - date_from).total_seconds(), 0)
+        chosen = RetentionEngine.TIERS[-1]
+        for tier in RetentionEngine.TIERS:
+            if span / tier[2] <= DeviceController.MAX_ROLLUP_SOURCE_POINTS:
+                chosen = tier
+                break
+        points = []
+        # Segments come newest first, older ones from coarser tiers past the chosen tier's retention
+        for (name, model, seconds), rollups in reversed(RetentionEngine.read_tiers(chosen, device_id, metric,
+                                                                                 date_from, date_to)):
+            for rollup in rollups:
+                t = (rollup.bucket - datetime(1970, 1, 1)).total_seconds()
+                if mode == 'minmax':
+                    points.append((t, rollup.min))
+                    points.append((t + seconds / 2, rollup.max))
+                elif rollup.count:
+                    points.append((t, rollup.sum / rollup.count))
+        data = np.array(points, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    @staticmethod
+    def series_records():
+        """
+        GET /api/records/series?device_id=&metric=&from=&to=&points=N&mode=lttb|minmax
+        Raw series capped at N points with NumPy (LTTB, or min/max per bucket for alarm metrics).
+        Older ranges come from the rollup tables once the retention engine has compacted them.
+        points: [[epoch_ms, value], ...] ready for Flot.
+        """
+        user = DeviceController.get_authenticated_user()
+        if not user:
+            return jsonify({"code": 401, "message": "Unauthorized"}), 401
+
+        device_id = (request.args.get('device_id') or '').strip()
+        metric = (request.args.get('metric') or '').strip()
+        metrics = DeviceController._chart_metrics(user, device_id) if device_id else None
+        if metrics is None:
+            return jsonify({"code": 404, "message": f"Device {device_id} not found in your account"}), 404
+        if metric not in metrics:
+            return jsonify({"code": 400, "message": f"Invalid metric '{metric}'", "metrics": metrics}), 400
+
+        mode = request.args.get('mode') or ('minmax' if metric in DeviceController.ALARM_METRICS else 'lttb')
+        if mode not in Downsampler.MODES:
+            return jsonify({"code": 400, "message": "mode must be lttb or minmax"}), 400
+        try:
+            points = int(request.args.get('points', DeviceController.DEFAULT_SERIES_POINTS))
+        except ValueError:
+            points = DeviceController.DEFAULT_SERIES_POINTS
+        points = max(10, min(points, DeviceController.MAX_SERIES_POINTS))
+
+        try:
+            date_from, date_to = DeviceController._chart_range()
+        except ValueError:
+            return jsonify({"code": 400, "message": "from/to must be epoch seconds or ISO 8601 dates"}), 400
+        x, y = DeviceController._raw_series(device_id, metric, date_from, date_to)
+        rx, ry = DeviceController._rollup_series(device_id, metric, date_from, date_to, mode)
+        if len(rx):
+            x, y = np.concatenate((rx, x)), np.concatenate((ry, y))
+            order = np.argsort(x, kind='stable')
+            x, y = x[order], y[order]
+        keep = Downsampler.downsample(x, y, points, mode)
+
+        return jsonify({
+            "device_id": device_id,
+            "metric": metric,
+            "mode": mode,
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+            "source_points": int(len(x)),
+            "points": np.column_stack((np.round(x[keep] * 1000), y[keep])).tolist()
+        })
@@ -1,8 +1,10 @@
 from flask import jsonify, render_template, request, redirect, url_for, flash
 from flask_server.app import db
-from flask_server.app.model.model import Device, DeviceRecord
+from flask_server.app.model.model import Device, DeviceRecord, DeviceLatest
 from flask_server.app.model.user_model import User
 from flask_login import current_user
+from config import config
+from core.dashboard_feed import dashboard_feed
 
 class DeviceController:
     # --- BAGIAN MANAJEMEN DEVICE (CRUD) ---
@@ -84,7 +86,10 @@ class DeviceController:
                     distance=initial_distance
                 )
                 db.session.add(new_record)
+                db.session.flush()
+                DeviceLatest.upsert([new_record.to_dict()])
                 db.session.commit()
+                dashboard_feed.forget(current_user.id)
                 flash('Device berhasil ditambahkan', 'success')
                 return redirect(url_for('app.list_device'))
             except Exception as e:
@@ -122,6 +127,7 @@ class DeviceController:
             
             try:
                 db.session.commit()
+                dashboard_feed.forget(current_user.id)
                 flash('Device berhasil diupdate', 'success')
                 return redirect(url_for('app.list_device'))
             except Exception as e:
@@ -153,6 +159,7 @@ class DeviceController:
                     device.type_device = type_device
                     device.status = status
                     db.session.commit()
+                    dashboard_feed.forget(current_user.id)
                     data = {
                         "code":200,
                         "message":"Device berhasil diupdate"
@@ -183,9 +190,11 @@ class DeviceController:
             if device_to_delete:
                 # Juga hapus semua data record milik device ini biar database bersih
                 DeviceRecord.query.filter_by(device_id=device_id).delete()
+                DeviceLatest.query.filter_by(device_id=device_id).delete()
                 
                 db.session.delete(device_to_delete)
                 db.session.commit()
+                dashboard_feed.forget(current_user.id)
                 flash('Device dan semua data recordnya berhasil dihapus', 'success')
             else:
                 flash('Device tidak ditemukan', 'danger')
@@ -199,16 +208,11 @@ class DeviceController:
     
     @staticmethod
     def data_record():
-        # Ambil semua data record milik user
+        # Halaman saja; isi tabel diambil per halaman dari /api/records/table/<tab> (server-side)
         page = {"title": "Data Record"}
         user = User.query.filter(User.id == current_user.id).first()
-        records = []
-        if current_user.is_authenticated:
-            # Join with Device table to ensure ownership
-            records = DeviceRecord.query.join(Device, DeviceRecord.device_id == Device.device_id)\
-                                      .filter(Device.user_id == current_user.id)\
-                                      .order_by(DeviceRecord.created_at.desc()).all()
-        return render_template('data_record.html', page=page, user=user, records=records)
+        return render_template('data_record.html', page=page, user=user,
+                               hostmqtt=config.hostmqtt, gateway_id=config.device_id)
 
     @staticmethod
     def add_data_record():
@@ -2,42 +2,48 @@ from flask import render_template, request, redirect, url_for, g, jsonify
 from flask_server.app import db
 from datetime import datetime
 from config import config
-from flask_server.app.model.model import Device, DeviceRecord
+from flask_server.app.model.model import Device, DeviceRecord, DeviceLatest
 from flask_server.app.model.user_model import User
 from flask_login import current_user
 import psutil 
 import random 
 
 class HomeController:
+    @staticmethod
+    def _devices_last_seen(user_id):
+        """
+        Devices of a user with the timestamp of their latest record, one join on the
+        device_latest primary key. Returns [(Device, last_seen or None)].
+        """
+        return db.session.query(Device, DeviceLatest.last_seen)\
+                         .outerjoin(DeviceLatest, Device.device_id == DeviceLatest.device_id)\
+                         .filter(Device.user_id == user_id)\
+                         .order_by(Device.id).all()
+
+    @staticmethod
+    def _status_ping(last_seen):
+        """(status, ping) of a device from its last record time: ON if seen < 20s ago."""
+        if not last_seen:
+            return 0, "N/A"
+        total_seconds = int((datetime.now() - last_seen).total_seconds())
+        hours, remainder = divmod(total_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        return (1 if total_seconds < 20 else 0), "{:02}:{:02}:{:02}".format(hours, minutes, seconds)
+
     @staticmethod
     def index():
         print("!!! CONTROLLER RELOADED - NEW VERSION !!!")
         page = {"title":"Dashboard"}
         user = User.query.filter(User.id == current_user.id).first()
         
-        # 1. Ambil Devices
-        devices = Device.query.filter_by(user_id=current_user.id).all()
-        
-        # 2. Logic Status & Ping Device
-        for d in devices:
-            last_rec = DeviceRecord.query.filter_by(device_id=d.device_id).order_by(DeviceRecord.created_at.desc()).first()
-            if last_rec:
-                delta = datetime.now() - last_rec.created_at
-                total_seconds = int(delta.total_seconds())
-                d.status = 1 if total_seconds < 20 else 0
-                
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                d.ping = "{:02}:{:02}:{:02}".format(hours, minutes, seconds)
-            else:
-                d.status = 0
-                d.ping = "N/A"
+        # 1 & 2. Ambil Devices + Status & Ping (satu query, bukan satu query per device)
+        devices = []
+        for d, last_seen in HomeController._devices_last_seen(current_user.id):
+            d.status, d.ping = HomeController._status_ping(last_seen)
+            devices.append(d)
 
-        # 3. Ambil Last Records (Pakai OUTER JOIN explicit)
-        raw_query = db.session.query(DeviceRecord, Device.device_name, Device.type_device)\
-                              .outerjoin(Device, DeviceRecord.device_id == Device.device_id)\
-                              .order_by(DeviceRecord.created_at.desc())\
-                              .limit(10).all()
+        # 3. Ambil Last Records (hanya device milik user ini)
+        raw_query = HomeController._last_records_query(current_user.id, 10)
 
         print(f"[DEBUG] Raw Query Result Len: {len(raw_query)}")
 
@@ -63,14 +69,16 @@ class HomeController:
             last_records.append(data)
 
         hostmqtt = config.hostmqtt
-        return render_template('home.html', page=page, devices=devices, last_records=last_records, hostmqtt=hostmqtt, user=user)
+        return render_template('home.html', page=page, devices=devices, last_records=last_records, hostmqtt=hostmqtt, user=user,
+                               gateway_id=config.device_id)
 
     @staticmethod
     def data_record():
         page = {"title":"Data Record"}
         user = User.query.filter(User.id == current_user.id).first()
-        records = DeviceRecord.query.order_by(DeviceRecord.created_at.desc()).all()
-        return render_template('data_record.html', page=page, records=records, user=user)
+        # Table rows are loaded page by page from /api/records/table/<tab>
+        return render_template('data_record.html', page=page, user=user,
+                               hostmqtt=config.hostmqtt, gateway_id=config.device_id)
     
     @staticmethod
     def system_stats():
@@ -108,35 +116,18 @@ class HomeController:
             'temp': round(temp, 1) # Kita buletin 1 angka belakang koma (cth: 45.2)
         })
     @staticmethod
-    def get_dashboard_updates():
-        # 1. Ambil Devices Status
-        devices = Device.query.filter_by(user_id=current_user.id).all()
-        devices_data = []
-        for d in devices:
-            d_dict = d.to_dict() # Pastikan to_dict ada dan lengkap
-            
-            # Hitung Status & Ping
-            last_rec = DeviceRecord.query.filter_by(device_id=d.device_id).order_by(DeviceRecord.created_at.desc()).first()
-            if last_rec:
-                delta = datetime.now() - last_rec.created_at
-                total_seconds = int(delta.total_seconds())
-                d_dict['status'] = 1 if total_seconds < 20 else 0
-                
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                d_dict['ping'] = "{:02}:{:02}:{:02}".format(hours, minutes, seconds)
-            else:
-                d_dict['status'] = 0
-                d_dict['ping'] = "N/A"
-            
-            devices_data.append(d_dict)
+    def _last_records_query(user_id, limit):
+        """Newest records of the user's devices with their device name/type: [(DeviceRecord, name, type)]."""
+        # Inner join on the user's own devices = ownership filter
+        return db.session.query(DeviceRecord, Device.device_name, Device.type_device)\
+                         .join(Device, db.and_(DeviceRecord.device_id == Device.device_id,
+                                               Device.user_id == user_id))\
+                         .order_by(DeviceRecord.created_at.desc())\
+                         .limit(limit).all()
 
-        # 2. Ambil Last Records
-        # Logic yang sama persis dengan Index
-        raw_query = db.session.query(DeviceRecord, Device.device_name, Device.type_device)\
-                              .outerjoin(Device, DeviceRecord.device_id == Device.device_id)\
-                              .order_by(DeviceRecord.created_at.desc())\
-                              .limit(10).all()
+    @staticmethod
+    def _last_records(user_id, limit=10):
+        raw_query = HomeController._last_records_query(user_id, limit)
 
         last_records = []
         for rec, dev_name, dev_type in raw_query:
@@ -153,11 +144,34 @@ class HomeController:
             # FORMATTING TIME (Jam Asli)
             # Karena JSON tidak punya object datetime, kita string-kan di sini
             data['created_at_fmt'] = rec.created_at.strftime('%H:%M:%S')
+            data['created_at'] = rec.created_at.isoformat()
 
             last_records.append(data)
+        return last_records
 
-        # Return JSON
-        return jsonify({
+    @staticmethod
+    def dashboard_snapshot(user_id):
+        """
+        Dashboard state of one user (devices status + last records) as plain JSON data.
+        Served by /api/dashboard_updates through DashboardFeed.snapshot (cached per change,
+        the MQTT DashboardFeed only signals when to fetch it).
+        'last_seen' (epoch seconds) lets the browser keep status/ping ticking by itself.
+        """
+        devices_data = []
+        for d, last_seen in HomeController._devices_last_seen(user_id):
+            d_dict = d.to_dict() # Pastikan to_dict ada dan lengkap
+            d_dict['status'], d_dict['ping'] = HomeController._status_ping(last_seen)
+            d_dict['last_seen'] = last_seen.timestamp() if last_seen else None
+            devices_data.append(d_dict)
+
+        return {
             'devices': devices_data,
-            'last_records': last_records
-        })
\ No newline at end of file
+            'last_records': HomeController._last_records(user_id),
+            'server_time': datetime.now().timestamp()
+        }
+
+    @staticmethod
+    def get_dashboard_updates():
+        # Initial load, MQTT change signals and fallback polling: built once per change, then from memory
+        from core.dashboard_feed import dashboard_feed
+        return jsonify(dashboard_feed.snapshot(current_user.id))
@@ -2,7 +2,7 @@ from flask import render_template, request, flash, redirect, url_for, jsonify
 from flask_login import login_required, current_user
 from config import config
 from flask_server.app.model.user_model import User
-from flask_server.app.model.model import EndpointConfig
+from flask_server.app.model.model import EndpointConfig, SyncCursor
 from flask_server.app import db
 import os
 import re
@@ -48,6 +48,11 @@ class SettingsController:
             mapping_str = request.form.get('mapping') 
             headers_str = request.form.get('headers')
             is_active = request.form.get('is_active') == 'on'
+            max_concurrency = request.form.get('max_concurrency', default=1, type=int) or 1
+            max_concurrency = min(max(max_concurrency, 1), 8)
+            batch_size = request.form.get('batch_size', default=500, type=int) or 500
+            batch_size = min(max(batch_size, 1), 5000)
+            use_gzip = request.form.get('use_gzip') == 'on'
             
             # Sync Params
             sync_history = request.form.get('sync_history') == 'on'
@@ -66,6 +71,9 @@ class SettingsController:
                     endpoint.mapping = mapping_str
                     endpoint.headers = headers_str
                     endpoint.is_active = is_active
+                    endpoint.max_concurrency = max_concurrency
+                    endpoint.batch_size = batch_size
+                    endpoint.use_gzip = use_gzip
                     # Update Target Type jika ada input (biasanya hidden input dari modal)
                     if preset_type:
                         endpoint.target_device_type = preset_type
@@ -77,19 +85,22 @@ class SettingsController:
                     return redirect(url_for('app.settings'))
             else:
                 # CREATE MODE
-                new_ep = EndpointConfig(name=name, url=url, mapping=mapping_str, headers=headers_str, is_active=is_active, target_device_type=preset_type)
+                new_ep = EndpointConfig(name=name, url=url, mapping=mapping_str, headers=headers_str, is_active=is_active, target_device_type=preset_type,
+                                        max_concurrency=max_concurrency, batch_size=batch_size, use_gzip=use_gzip)
                 db.session.add(new_ep)
+                db.session.flush()
                 msg = "Endpoint Added!"
+                # New endpoint: bulk sync starts after the newest record unless history is requested
+                if not sync_history:
+                    SyncCursor.start_endpoint(new_ep)
 
-            db.session.commit()
-            
             # --- SYNC HISTORY LOGIC ---
-            if sync_history and preset_type:
-                synced_count, sync_msg = SettingsController._sync_endpoint_history(new_ep, preset_type)
-                if synced_count > 0:
-                    msg += f" {sync_msg}"
-                else:
-                    msg += " (No historical data found)."
+            # Cursors go back to the first record, the scheduled sync queues the history in the outbox
+            if sync_history:
+                SyncCursor.start_endpoint(new_ep, history=True)
+                msg += " Historical data will be uploaded by the next sync."
+
+            db.session.commit()
             
             flash(msg, "success")
             return redirect(url_for('app.settings'))
@@ -113,82 +124,13 @@ class SettingsController:
             db.session.commit()
 
             if new_state: # Turned ON
-                preset_type = ep.target_device_type if ep.target_device_type else 'all'
-                synced_count, sync_msg = SettingsController._sync_endpoint_history(ep, preset_type)
-                flash(f"Endpoint {ep.name} ACTIVATED. {sync_msg}", "success")
+                # Cursors are kept: data written while it was off is queued by the next sync
+                flash(f"Endpoint {ep.name} ACTIVATED. Pending data will be uploaded by the next sync.", "success")
             else:
                 flash(f"Endpoint {ep.name} DEACTIVATED.", "warning")
 
         return redirect(url_for('app.settings'))
 
-    @staticmethod
-    def _sync_endpoint_history(endpoint, preset_type):
-        from flask_server.app.model.model import DeviceRecord
-        from core.send_server import CloudSender
-        
-        # Define types to sync
-        types_to_sync = []
-        if preset_type == 'all':
-            types_to_sync = ['power', 'water', 'gas', 'smoke', 'fire', 'weather', 'lux', 'humidity', 'temperature']
-        else:
-            types_to_sync = [preset_type]
-        
-        total_synced = 0
-        
-        # Suffix Map for Smart Routing
-        suffix_map = {
-            'power': '/add_power', 'water': '/add_water', 'gas': '/add_gas',
-            'smoke': '/add_smoke', 'fire': '/add_fire', 'weather': '/add_weather',
-            'lux': '/add_lux', 
-            'humidity': '/add_humidity_temp', 
-            'temperature': '/add_humidity_temp'
-        }
-
-        for p_type in types_to_sync:
-            # Re-use logic from DeviceController to fetch data
-            query = DeviceRecord.query
-            if p_type == 'power': query = query.filter(DeviceRecord.power.isnot(None))
-            elif p_type == 'water': query = query.filter(DeviceRecord.water.isnot(None))
-            elif p_type == 'gas': query = query.filter((DeviceRecord.gas.isnot(None)) | (DeviceRecord.gas_ppm.isnot(None)))
-            elif p_type == 'smoke': query = query.filter(DeviceRecord.smoke.isnot(None))
-            elif p_type == 'fire': query = query.filter(DeviceRecord.fire.isnot(None))
-            elif p_type == 'weather': query = query.filter(DeviceRecord.weather.isnot(None))
-            elif p_type == 'lux': query = query.filter(DeviceRecord.lux.isnot(None))
-            elif p_type == 'humidity': query = query.filter(DeviceRecord.humidity.isnot(None))
-            elif p_type == 'temperature': query = query.filter(DeviceRecord.temperature.isnot(None))
-            
-            records = query.all()
-            if records:
-                data_list = [r.to_dict() for r in records]
-                
-                # SMART ROUTING: Create Temp Endpoint with Specific Suffix
-                temp_url = endpoint.url
-                suffix = suffix_map.get(p_type, "")
-                
-                if suffix and suffix not in temp_url:
-                        if temp_url.endswith('/'):
-                            temp_url += suffix[1:] 
-                        else:
-                            temp_url += suffix
-                
-                class TempEP:
-                    def __init__(self, url, mapping, name):
-                        self.url = url
-                        self.mapping = mapping
-                        self.name = name
-                
-                target_ep = TempEP(temp_url, endpoint.mapping, endpoint.name)
-
-                # Send to specific endpoint
-                success, s_msg, code = CloudSender.send_bulk_to_endpoint(data_list, target_ep)
-                if success:
-                    total_synced += len(data_list)
-        
-        if total_synced > 0:
-            return total_synced, f"Backfilled {total_synced} historical records."
-        else:
-            return 0, "No historical data to sync."
-
     @staticmethod
     def _update_env_file(key, value):
         env_path = os.path.join(os.getcwd(), '.env')
@@ -1,5 +1,6 @@
 from flask_server.app import db
 from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 class Device(db.Model):
     __tablename__ = 'devices'
@@ -12,6 +13,11 @@ class Device(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Linked to User
     user = db.relationship('User', backref=db.backref('devices', cascade='all, delete-orphan'))
 
+    __table_args__ = (
+        db.Index('ix_devices_user_id', 'user_id'),
+        db.Index('ix_devices_device_id_type', 'device_id', 'type_device'),
+    )
+
     def __repr__(self):
         return f"<Device {self.device_id} ({self.mac_address}) - {self.type_device}>"
     def to_dict(self):
@@ -51,6 +57,23 @@ class DeviceRecord(db.Model):
     distance = db.Column(db.Float, nullable=True) # For Ultrasonic
     
     created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        # Latest-value / per-device range queries: WHERE device_id = ? ORDER BY created_at DESC
+        db.Index('ix_device_records_device_created', 'device_id', 'created_at'),
+        # Global "last N records" (dashboard, data record page)
+        db.Index('ix_device_records_created_at', 'created_at'),
+        # Partial indexes matching the per-type incremental sync filters (WHERE <col> IS NOT NULL AND id > ?)
+        db.Index('ix_device_records_sync_power', 'id', sqlite_where=power.isnot(None)),
+        db.Index('ix_device_records_sync_water', 'id', sqlite_where=water.isnot(None)),
+        db.Index('ix_device_records_sync_gas', 'id', sqlite_where=(gas.isnot(None)) | (gas_ppm.isnot(None))),
+        db.Index('ix_device_records_sync_smoke', 'id', sqlite_where=smoke.isnot(None)),
+        db.Index('ix_device_records_sync_fire', 'id', sqlite_where=fire.isnot(None)),
+        db.Index('ix_device_records_sync_weather', 'id', sqlite_where=weather.isnot(None)),
+        db.Index('ix_device_records_sync_lux', 'id', sqlite_where=lux.isnot(None)),
+        db.Index('ix_device_records_sync_humidity_temp', 'id',
+                 sqlite_where=(humidity.isnot(None)) | (temperature.isnot(None))),
+    )
     
     def __repr__(self):
         return f"<DeviceRecord {self.device_id}>"
@@ -80,6 +103,120 @@ class DeviceRecord(db.Model):
             'created_at': self.created_at
         }
     
+class DeviceLatest(db.Model):
+    """
+    One row per device_id: newest non-null value of every metric + last_seen.
+    Upserted in the same transaction as the ingest write, so latest-value reads are a primary key lookup.
+    """
+    __tablename__ = 'device_latest'
+    device_id = db.Column(db.String(100), primary_key=True)
+
+    power = db.Column(db.Float, nullable=True)
+    voltage = db.Column(db.Float, nullable=True)
+    current = db.Column(db.Float, nullable=True)
+    frequency = db.Column(db.Float, nullable=True)
+    energy = db.Column(db.Float, nullable=True)
+    humidity = db.Column(db.Float, nullable=True)
+    temperature = db.Column(db.Float, nullable=True)
+    weather = db.Column(db.String(50), nullable=True)
+    fire = db.Column(db.Integer, nullable=True)
+    gas = db.Column(db.Float, nullable=True)
+    gas_ppm = db.Column(db.Float, nullable=True)
+    gas_voltage = db.Column(db.Float, nullable=True)
+    smoke = db.Column(db.Float, nullable=True)
+    lux = db.Column(db.Float, nullable=True)
+    water = db.Column(db.Float, nullable=True)
+    water_level = db.Column(db.Float, nullable=True)
+    total_volume = db.Column(db.Float, nullable=True)
+    distance = db.Column(db.Float, nullable=True)
+
+    last_seen = db.Column(db.DateTime, nullable=True) # created_at of the newest record
+
+    VALUE_COLUMNS = ('power', 'voltage', 'current', 'frequency', 'energy', 'humidity', 'temperature',
+                     'weather', 'fire', 'gas', 'gas_ppm', 'gas_voltage', 'smoke', 'lux', 'water',
+                     'water_level', 'total_volume', 'distance')
+
+    # Rows per upsert statement (20 bound parameters each, stays under SQLite's variable limit)
+    UPSERT_SLICE = 45
+
+    @staticmethod
+    def _rounds(rows):
+        """
+        Split readings (dicts with device_id, created_at and metric columns) into rounds applied in
+        timestamp order: round n holds the n-th distinct reading time of every device, readings of a
+        device with the same created_at are merged. Usually a batch has one reading per device = one round.
+        """
+        per_device = {}
+        for row in sorted(rows, key=lambda r: r.get('created_at') or datetime.min):
+            device_id = row.get('device_id')
+            if not device_id:
+                continue
+            readings = per_device.setdefault(device_id, [])
+            if not readings or readings[-1]['last_seen'] != row.get('created_at'):
+                readings.append({'device_id': device_id, 'last_seen': row.get('created_at'),
+                                 **{c: None for c in DeviceLatest.VALUE_COLUMNS}})
+            acc = readings[-1]
+            for column in DeviceLatest.VALUE_COLUMNS:
+                if row.get(column) is not None:
+                    acc[column] = row[column]
+        depth = max((len(r) for r in per_device.values()), default=0)
+        return [[r[n] for r in per_device.values() if n < len(r)] for n in range(depth)]
+
+    @staticmethod
+    def upsert(rows):
+        """
+        Merge readings into device_latest (caller commits, same transaction as the insert).
+        A reading older than last_seen only fills metrics that are still empty. Readings are applied
+        one per device per statement, in timestamp order, so an old reading in the batch never
+        carries its values past a newer one.
+        """
+        table = DeviceLatest.__table__
+        for items in DeviceLatest._rounds(rows):
+            for i in range(0, len(items), DeviceLatest.UPSERT_SLICE):
+                stmt = sqlite_insert(table).values(items[i:i + DeviceLatest.UPSERT_SLICE])
+                excluded = stmt.excluded
+                is_newer = db.or_(table.c.last_seen.is_(None), excluded.last_seen >= table.c.last_seen)
+                set_ = {c: db.case((is_newer, db.func.coalesce(excluded[c], table.c[c])),
+                                   else_=db.func.coalesce(table.c[c], excluded[c]))
+                        for c in DeviceLatest.VALUE_COLUMNS}
+                set_['last_seen'] = db.case((is_newer, excluded.last_seen), else_=table.c.last_seen)
+                db.session.execute(stmt.on_conflict_do_update(index_elements=['device_id'], set_=set_))
+
+    @staticmethod
+    def backfill():
+        """
+        Build device_latest from device_records (data migration, see schema.DATA_MIGRATIONS).
+        Per metric, the value of the newest record (MAX(id)) where it is not null, so a device whose
+        last record lacks a metric still gets it. Merged with upsert(): rows written meanwhile by
+        live ingest are newer and keep their values. Returns devices written.
+        """
+        latest = {}
+        for device_id, last_seen in db.session.query(DeviceRecord.device_id, db.func.max(DeviceRecord.created_at))\
+                                              .group_by(DeviceRecord.device_id).all():
+            latest[device_id] = {'device_id': device_id, 'created_at': last_seen}
+
+        for column in DeviceLatest.VALUE_COLUMNS:
+            value = getattr(DeviceRecord, column)
+            newest = db.session.query(db.func.max(DeviceRecord.id).label('id'))\
+                               .filter(value.isnot(None)).group_by(DeviceRecord.device_id).subquery()
+            for device_id, v in db.session.query(DeviceRecord.device_id, value)\
+                                          .join(newest, DeviceRecord.id == newest.c.id).all():
+                latest[device_id][column] = v
+
+        DeviceLatest.upsert(list(latest.values()))
+        db.session.commit()
+        return len(latest)
+
+    def to_dict(self):
+        data = {'device_id': self.device_id}
+        for column in DeviceLatest.VALUE_COLUMNS:
+            data[column] = getattr(self, column)
+        data['created_at'] = self.last_seen
+        return data
+
+    def __repr__(self):
+        return f"<DeviceLatest {self.device_id} @{self.last_seen}>"
+
 class EndpointConfig(db.Model):
     __tablename__ = 'endpoint_configs'
     id = db.Column(db.Integer, primary_key=True)
@@ -90,6 +227,12 @@ class EndpointConfig(db.Model):
     mapping = db.Column(db.Text, nullable=True) # JSON string, e.g. {"gw_id": "Gateway ID"}
     is_active = db.Column(db.Boolean, default=True)
     target_device_type = db.Column(db.String(50), nullable=True) # Filter by device type, e.g. 'power'
+    max_concurrency = db.Column(db.Integer, default=1) # Parallel requests to this endpoint (1 = strict order)
+    batch_size = db.Column(db.Integer, default=500) # Records per request for bulk sync
+    use_gzip = db.Column(db.Boolean, default=False) # Send bulk bodies with Content-Encoding: gzip
+    sync_start_id = db.Column(db.Integer, nullable=True) # Bulk sync sends rows after this id (0 = full history)
+    cursors = db.relationship('SyncCursor', backref='endpoint', cascade='all, delete-orphan')
+    outbox = db.relationship('OutboxBatch', backref='endpoint', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -100,9 +243,156 @@ class EndpointConfig(db.Model):
             'headers': self.headers,
             'mapping': self.mapping,
             'is_active': self.is_active,
-            'target_device_type': self.target_device_type
+            'target_device_type': self.target_device_type,
+            'max_concurrency': self.max_concurrency,
+            'batch_size': self.batch_size,
+            'use_gzip': self.use_gzip
         }
 
+class SyncCursor(db.Model):
+    """High-water mark of the last DeviceRecord.id handed to an endpoint's outbox, per sensor type."""
+    __tablename__ = 'sync_cursors'
+    id = db.Column(db.Integer, primary_key=True)
+    endpoint_id = db.Column(db.Integer, db.ForeignKey('endpoint_configs.id'), nullable=False)
+    sensor_type = db.Column(db.String(50), nullable=False) # 'all' when sync runs without type filter
+    last_record_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        db.UniqueConstraint('endpoint_id', 'sensor_type', name='uq_sync_cursor_endpoint_type'),
+    )
+
+    @staticmethod
+    def record_filter(sensor_type):
+        """
+        Filter of the DeviceRecord rows a cursor of sensor_type covers (what bulk sync of that type sends).
+        None = every row ('all' and types without a specific column).
+        """
+        if sensor_type == 'power':
+            return DeviceRecord.power.isnot(None)
+        if sensor_type == 'water':
+            return DeviceRecord.water.isnot(None)
+        if sensor_type == 'gas':
+            return (DeviceRecord.gas.isnot(None)) | (DeviceRecord.gas_ppm.isnot(None))
+        if sensor_type == 'smoke':
+            return DeviceRecord.smoke.isnot(None)
+        if sensor_type == 'fire':
+            return DeviceRecord.fire.isnot(None)
+        if sensor_type == 'weather':
+            return DeviceRecord.weather.isnot(None)
+        if sensor_type == 'lux':
+            return DeviceRecord.lux.isnot(None)
+        if sensor_type == 'humidity_temp':
+            return (DeviceRecord.humidity.isnot(None)) | (DeviceRecord.temperature.isnot(None))
+        if sensor_type == 'ultrasonic':
+            return DeviceRecord.distance.isnot(None)
+        return None
+
+    @staticmethod
+    def start_endpoint(endpoint, history=False):
+        """
+        (Re)start bulk sync of an endpoint: from the first record when history is requested,
+        otherwise from the newest existing one (only data written from now on).
+        Drops the endpoint's cursors, they are recreated at the new start. Caller commits.
+        """
+        endpoint.sync_start_id = 0 if history else (db.session.query(db.func.max(DeviceRecord.id)).scalar() or 0)
+        SyncCursor.query.filter_by(endpoint_id=endpoint.id).delete(synchronize_session=False)
+        return endpoint.sync_start_id
+
+    @staticmethod
+    def get_or_create(endpoint, sensor_type):
+        sensor_type = sensor_type or 'all'
+        cursor = SyncCursor.query.filter_by(endpoint_id=endpoint.id, sensor_type=sensor_type).first()
+        if not cursor:
+            # A type the endpoint never synced starts at the endpoint's start point.
+            # Endpoints created before sync_start_id existed start from now, not from the full history.
+            if endpoint.sync_start_id is None:
+                endpoint.sync_start_id = db.session.query(db.func.max(DeviceRecord.id)).scalar() or 0
+            cursor = SyncCursor(endpoint_id=endpoint.id, sensor_type=sensor_type, last_record_id=endpoint.sync_start_id)
+            db.session.add(cursor)
+        return cursor
+
+    def __repr__(self):
+        return f"<SyncCursor ep={self.endpoint_id} {self.sensor_type} @{self.last_record_id}>"
+
+class OutboxBatch(db.Model):
+    """Serialized batch waiting to be delivered to an Advanced Endpoint (durable retry queue)."""
+    __tablename__ = 'outbox_batches'
+    id = db.Column(db.Integer, primary_key=True)
+    endpoint_id = db.Column(db.Integer, db.ForeignKey('endpoint_configs.id'), nullable=False)
+    sensor_type = db.Column(db.String(50), nullable=True)
+    url = db.Column(db.String(255), nullable=False) # Routed URL (suffix already applied)
+    payload = db.Column(db.Text, nullable=False) # JSON body, mapping already applied
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(10), nullable=False, default='pending') # pending | dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.now)
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'endpoint_id': self.endpoint_id,
+            'sensor_type': self.sensor_type,
+            'url': self.url,
+            'record_count': self.record_count,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at,
+            'last_error': self.last_error,
+            'created_at': self.created_at
+        }
+
+    def __repr__(self):
+        return f"<OutboxBatch {self.id} ep={self.endpoint_id} {self.status} x{self.attempts}>"
+
+class RollupMixin:
+    """
+    Aggregate of one metric of one device over a time bucket (written by core.retention).
+    sum/count instead of avg so buckets can be merged when late rows are rolled up.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.String(100), nullable=False)
+    metric = db.Column(db.String(30), nullable=False) # DeviceRecord column name, e.g. 'power'
+    bucket = db.Column(db.DateTime, nullable=False) # Bucket start
+    min = db.Column(db.Float, nullable=True)
+    max = db.Column(db.Float, nullable=True)
+    sum = db.Column(db.Float, nullable=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last = db.Column(db.Float, nullable=True) # Value of the newest raw row in the bucket
+    last_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'device_id': self.device_id,
+            'metric': self.metric,
+            'bucket': self.bucket,
+            'min': self.min,
+            'max': self.max,
+            'avg': self.sum / self.count if self.count else None,
+            'count': self.count,
+            'last': self.last
+        }
+
+class Rollup1m(RollupMixin, db.Model):
+    __tablename__ = 'rollups_1m'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'metric', 'bucket', name='uq_rollups_1m_device_metric_bucket'),
+    )
+
+class Rollup1h(RollupMixin, db.Model):
+    __tablename__ = 'rollups_1h'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'metric', 'bucket', name='uq_rollups_1h_device_metric_bucket'),
+    )
+
+class Rollup1d(RollupMixin, db.Model):
+    __tablename__ = 'rollups_1d'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'metric', 'bucket', name='uq_rollups_1d_device_metric_bucket'),
+    )
+
 class NetworkDevice(db.Model):
     __tablename__ = 'network_devices'
     id = db.Column(db.Integer, primary_key=True)
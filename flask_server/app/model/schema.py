@@ -0,0 +1,67 @@
+from flask_server.app import db
+from flask_server.app.model.model import DeviceLatest
+from sqlalchemy import inspect, text
+
+# Columns added to tables that already exist on deployed gateways.
+# db.create_all() only creates missing tables, it never alters existing ones.
+# {table: [(column, DDL type + default)]}
+ADDED_COLUMNS = {
+    'endpoint_configs': [
+        ('max_concurrency', 'INTEGER DEFAULT 1'),
+        ('batch_size', 'INTEGER DEFAULT 500'),
+        ('use_gzip', 'BOOLEAN DEFAULT 0'),
+        ('sync_start_id', 'INTEGER'),
+    ],
+}
+
+# One-off data migrations, each runs once per database, in order.
+# The last applied version is kept in SQLite's PRAGMA user_version. [(version, callable)]
+DATA_MIGRATIONS = [
+    (1, DeviceLatest.backfill), # device_latest from existing device_records
+]
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the current models (run after db.create_all()):
+    adds new columns and missing indexes, then runs pending DATA_MIGRATIONS.
+    Lightweight alternative to a migrations folder: idempotent, safe to run on every start.
+    """
+    inspector = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            for name, ddl in columns:
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    print(f"[SCHEMA] Added column {table}.{name}")
+
+    # Indexes declared in the models (__table_args__) that an older database doesn't have yet
+    created = 0
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created += 1
+                print(f"[SCHEMA] Created index {index.name}")
+    if created and db.engine.dialect.name == 'sqlite':
+        # Refresh planner statistics so SQLite picks the new indexes
+        with db.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    run_data_migrations()
+
+def run_data_migrations():
+    with db.engine.connect() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar() or 0
+    for target, migrate in DATA_MIGRATIONS:
+        if target <= version:
+            continue
+        result = migrate()
+        with db.engine.begin() as conn:
+            conn.execute(text(f"PRAGMA user_version = {int(target)}"))
+        print(f"[SCHEMA] Data migration {target} ({migrate.__name__}): {result}")
@@ -1,5 +1,7 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask_server.app.controller.api.device_controller import DeviceController
+from core.outbox import CloudOutbox
+from core.retention import RetentionEngine
 import atexit
 import logging
 
@@ -22,10 +24,28 @@ def job_sync_all(app):
     
     print("[SCHEDULER] Auto-Sync Finished!\n")
 
+def job_deliver_outbox(app):
+    # Retry worker: drains due outbox batches (exponential backoff is stored per batch)
+    with app.app_context():
+        try:
+            CloudOutbox.deliver_pending()
+        except Exception as e:
+            print(f"[SCHEDULER] Outbox delivery error: {e}")
+
+def job_retention(app):
+    # Roll raw records past the retention window into 1m/1h/1d tables, delete them in chunks
+    with app.app_context():
+        try:
+            RetentionEngine.run()
+        except Exception as e:
+            print(f"[SCHEDULER] Retention error: {e}")
+
 def init_scheduler(app):
     scheduler = BackgroundScheduler()
     # Pass 'app' as argument to the job
     scheduler.add_job(func=job_sync_all, args=[app], trigger="interval", minutes=5)
+    scheduler.add_job(func=job_deliver_outbox, args=[app], trigger="interval", seconds=30)
+    scheduler.add_job(func=job_retention, args=[app], trigger="interval", hours=1)
     
     scheduler.start()
     print("Background Scheduler Started: Auto-Sync every 5 minutes.")
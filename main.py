@@ -1,22 +1,39 @@
 from core import MqttSensor, SystemInfo
 from core.send_server import CloudSender
+from core.mqtt_consumer import MqttConsumer
+from core.decoders import DecoderRegistry, decoders
+from core.ingest import IngestWriter
+from core.device_state import device_state
+from core.dashboard_feed import dashboard_feed
 from config import config
 import threading
 
 from flask_server.app import create_app,db
 
 
-from flask_server.app.model.model import DeviceRecord
 import json
-from datetime import datetime, timedelta
+import re
+from datetime import datetime
 
 app = create_app()
+ingest_writer = IngestWriter(app, batch_size=500, flush_interval=0.2,
+                             max_queue=config.ingest_queue_size, shed_policy=config.ingest_shed_policy)
 
 from flask_server.app.scheduler import init_scheduler
+from flask_server.app.model.schema import upgrade_schema
 
-def start_flask():
+def prepare_database():
+    """
+    Create/upgrade the schema (incl. data migrations such as the device_latest backfill), then warm
+    the ingest cache from it. Runs once before any thread starts, so nothing reads half-built tables.
+    """
     with app.app_context():
         db.create_all()
+        upgrade_schema()
+        device_state.warm()
+
+def start_flask():
+    with app.app_context():
         # Start Auto-Sync Scheduler
         init_scheduler(app)
        
@@ -27,65 +44,83 @@ def publis_system():
     topic= config.device_id+"/status"
     return mqtt.system_info_msg(topic)
 
-def process_sensor_data(payload):
+def parse_sensor_payload(data, sensor_type=None):
+    """Map a decoded reading (flexible keys, optional ts/created_at) to DeviceRecord columns."""
+    row = decoders.extractor(sensor_type)(data)
+    row['created_at'] = IngestWriter.reading_time(data) # Device ts/created_at, else now
+    return row
+
+# sensor/data/<type>/<device_id>[/json|msgpack|cbor] (device_id and type from the topic)
+# or legacy sensor/data/... (both in the payload)
+SENSOR_TOPIC_PREFIX = "sensor/data/"
+SENSOR_TYPES = ('power', 'lux', 'gas', 'smoke', 'water', 'fire', 'weather', 'humidity_temp', 'humidity-temp', 'ultrasonic')
+
+def parse_sensor_topic(topic):
+    """(type, device_id, format) routed by the topic, (None, None, None) for legacy topics."""
+    parts = topic[len(SENSOR_TOPIC_PREFIX):].split('/') if topic.startswith(SENSOR_TOPIC_PREFIX) else []
+    fmt = None
+    if len(parts) == 3 and parts[2] in DecoderRegistry.FORMATS:
+        fmt = parts.pop()
+    if len(parts) == 2 and parts[0] in SENSOR_TYPES and parts[1]:
+        return parts[0], parts[1], fmt
+    return None, None, fmt
+
+# "ts" / "created_at" as a key of a raw JSON payload ("status" or a value does not match)
+DEVICE_TS_KEY_RE = re.compile(rb'"(?:ts|created_at)"\s*:')
+
+def may_have_device_time(payload, fmt=None):
+    """False only when the payload is JSON without a ts/created_at key (binary formats are decoded to know)."""
+    if DecoderRegistry.detect_format(payload, fmt) != 'json':
+        return True
+    return DEVICE_TS_KEY_RE.search(payload) is not None
+
+def process_sensor_data(payload, topic=""):
     """
-    Callback function to process incoming MQTT messages and save to DB.
-    Rate Limit: Saves only if > 5 minutes since last record for this device.
+    Callback function to process incoming MQTT messages.
+    Only decodes and queues the reading(s); IngestWriter saves to DB in batches.
+    Payload: one reading or an array of readings (10-100 samples per packet),
+    as JSON, MessagePack or CBOR (topic suffix or first byte, see DecoderRegistry).
+    Rate Limit: Saves only if > 5 minutes since last record for this device
+    (checked against the in-memory DeviceStateCache, no DB query per message).
     """
+    sensor_type, topic_device_id, fmt = parse_sensor_topic(topic)
+
+    # Routed topic + no device timestamp in the bytes = reading is "now":
+    # drop a rate limited message before paying for the decode
+    if topic_device_id and not may_have_device_time(payload, fmt) \
+            and device_state.is_rate_limited(topic_device_id, datetime.now(), IngestWriter.RATE_LIMIT):
+        return
+
     try:
-        data = json.loads(payload)
-        device_id = data.get('device_id')
-        
-        if not device_id:
-            return
-
-        with app.app_context():
-            # 1. Rate Limiting Check
-            last_record = DeviceRecord.query.filter_by(device_id=device_id).order_by(DeviceRecord.created_at.desc()).first()
-            
-            if last_record:
-                time_diff = datetime.now() - last_record.created_at
-                if time_diff < timedelta(minutes=5):
-                   return
-
-            # 2. Save Data (Flexible keys)
-            record = DeviceRecord(
-                device_id=device_id,
-                power=float(data.get('power')) if data.get('power') is not None else None,
-                humidity=float(data.get('humidity') or data.get('hum')) if (data.get('humidity') is not None or data.get('hum') is not None) else None,
-                temperature=float(data.get('temperature') or data.get('temp')) if (data.get('temperature') is not None or data.get('temp') is not None) else None,
-                weather=str(data.get('weather')) if data.get('weather') is not None else None,
-                fire=int(data.get('fire')) if data.get('fire') is not None else None,
-                gas=float(data.get('gas')) if data.get('gas') is not None else None,
-                gas_ppm=float(data.get('gas_ppm')) if data.get('gas_ppm') is not None else None,
-                gas_voltage=float(data.get('gas_voltage')) if data.get('gas_voltage') is not None else None,
-                smoke=float(data.get('smoke')) if data.get('smoke') is not None else None,
-                lux=float(data.get('lux')) if data.get('lux') is not None else None,
-                distance=float(data.get('distance')) if data.get('distance') is not None else None
-            )
-            
-            db.session.add(record)
-            db.session.commit()
-            print(f"Saved data for device {device_id}")
-
-            # Send to Cloud (Moved to Scheduler every 5 mins)
-            # try:
-            #     # Kirim data ASLI dari ESP32 (tanpa mapping ulang oleh gateway)
-            #     CloudSender.send_data(data)
-            # except Exception as e:
-            #     print(f"Cloud sync error: {e}")
-
-    except json.JSONDecodeError:
-        print("Error: Failed to decode JSON payload")
+        data = decoders.decode(payload, fmt)
     except Exception as e:
-        print(f"Error saving to DB: {e}")
+        print(f"Error: Failed to decode payload on {topic}: {e}")
+        return
+
+    readings = data if isinstance(data, list) else [data]
+    for reading in readings:
+        try:
+            if not isinstance(reading, dict):
+                continue
+            if topic_device_id:
+                reading.setdefault('device_id', topic_device_id)
+            if not reading.get('device_id'):
+                continue
+            ingest_writer.accept(parse_sensor_payload(reading, sensor_type))
+        except Exception as e:
+            print(f"Error processing sensor data: {e}")
 
 def subscribe_to_sensors():
-    mqtt = MqttSensor(config.hostmqtt)
-    mqtt.start_subscriber("sensor/data/#", on_message_callback=process_sensor_data)
+    ingest_writer.start()
+    dashboard_feed.start(app, MqttSensor(config.hostmqtt).publish_message)
+    consumer = MqttConsumer(config.hostmqtt, process_sensor_data,
+                            workers=config.mqtt_workers, share_group=config.mqtt_share_group,
+                            queue_size=config.ingest_queue_size, shed_policy=config.ingest_shed_policy)
+    consumer.run("sensor/data/#")
 
 if __name__ == '__main__':
-    
+    prepare_database()
+
     flask_thred = threading.Thread(target=start_flask)
     mqtt_thread = threading.Thread(target=publis_system)
     subscriber_thread = threading.Thread(target=subscribe_to_sensors)
@@ -0,0 +1,282 @@
+"""
+Record raw sensor MQTT traffic and replay it for load testing.
+
+  python mqtt_replay.py record capture.rxcap [--topic sensor/data/#] [--duration 600]
+  python mqtt_replay.py replay capture.rxcap --speed 1|10|max [--target mqtt]
+  python mqtt_replay.py replay capture.rxcap --speed 1|10|max --target ingest --database scratch.db [--no-rate-limit]
+  python mqtt_replay.py info capture.rxcap
+
+Capture file: append-only, header + frames of (epoch float64, topic len uint16, payload len uint32, topic, payload).
+replay --target mqtt publishes to the broker in config (a running gateway ingests it),
+replay --target ingest calls main.process_sensor_data directly (no broker, in this process) and
+writes into the scratch SQLite file given by --database, never the gateway's configured one.
+Both report messages/s, p50/p99 latency of the send call and the device_records rows written
+during the run. The send call of the mqtt target is only client.publish(), so that target also
+reports the gateway's stage latencies (MQTT callback, queue wait, DB flush) from /api/ingest_stats.
+"""
+import argparse
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+
+MAGIC = b'RXCAP1\n'
+FRAME = struct.Struct('<dHI')
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, ts, topic, payload):
+        topic = topic.encode() if isinstance(topic, str) else topic
+        with self._lock:
+            self.file.write(FRAME.pack(ts, len(topic), len(payload)))
+            self.file.write(topic)
+            self.file.write(payload)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self.file.flush()
+            self.file.close()
+
+
+def read_capture(path):
+    """Yields (epoch, topic, payload bytes). A truncated last frame (recorder killed) is ignored."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            header = f.read(FRAME.size)
+            if len(header) < FRAME.size:
+                return
+            ts, topic_len, payload_len = FRAME.unpack(header)
+            topic = f.read(topic_len)
+            payload = f.read(payload_len)
+            if len(payload) < payload_len:
+                return
+            yield ts, topic.decode(), payload
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+
+def mqtt_client():
+    import paho.mqtt.client as mqtt
+    from config import config
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    if config.user_mqtt and config.pass_mqtt:
+        client.username_pw_set(config.user_mqtt, config.pass_mqtt)
+    return client, config
+
+
+def print_stage_latency(snapshot):
+    for name, stats in snapshot['latency'].items():
+        print(f"  {name}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms ({stats['count']} samples)")
+    for name, queue in snapshot['queues'].items():
+        wait = queue['wait']
+        print(f"  queue {name} wait: p50 {wait['p50_ms']} ms, p99 {wait['p99_ms']} ms,"
+              f" max depth {queue['max_depth']}, dropped {queue['dropped']}")
+
+
+def gateway_stats(app, args):
+    """GET /api/ingest_stats of the running gateway, authenticated with a JWT signed by the shared SECRET_KEY."""
+    import requests
+    from flask_jwt_extended import create_access_token
+    from flask_server.app.model.user_model import User
+    with app.app_context():
+        email = args.user
+        if not email:
+            user = User.query.order_by(User.id).first()
+            if not user:
+                raise RuntimeError("no user to authenticate with, pass --user")
+            email = user.email
+        token = create_access_token(identity=email)
+    response = requests.get(f"{args.gateway.rstrip('/')}/api/ingest_stats",
+                            headers={'Authorization': f'Bearer {token}'}, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+def record(args):
+    writer = CaptureWriter(args.file)
+    client, config = mqtt_client()
+
+    def on_connect(client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(args.topic, qos=1)
+            print(f"Recording {args.topic} from {config.hostmqtt} to {args.file} (Ctrl+C to stop)")
+        else:
+            print(f"Failed to connect, return code {rc}")
+
+    client.on_connect = on_connect
+    client.on_message = lambda client, userdata, msg: writer.write(time.time(), msg.topic, msg.payload)
+    client.connect(config.hostmqtt, config.port_mqtt, 60)
+    client.loop_start()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *a: stop.set())
+    started = time.time()
+    while not stop.is_set() and (not args.duration or time.time() - started < args.duration):
+        stop.wait(1)
+    client.loop_stop()
+    client.disconnect()
+    writer.close()
+    print(f"Recorded {writer.count} messages in {time.time() - started:.1f}s")
+
+
+def info(args):
+    count, size, first, last, topics = 0, 0, None, None, {}
+    for ts, topic, payload in read_capture(args.file):
+        count += 1
+        size += len(payload)
+        first = ts if first is None else min(first, ts)
+        last = ts if last is None else max(last, ts)
+        prefix = '/'.join(topic.split('/')[:3])
+        topics[prefix] = topics.get(prefix, 0) + 1
+    span = (last - first) if count else 0
+    print(f"{count} messages, {size} payload bytes, {span:.1f}s captured"
+          f" ({count / span if span else 0:.1f} msg/s)")
+    for prefix, n in sorted(topics.items(), key=lambda kv: -kv[1]):
+        print(f"  {prefix}: {n}")
+
+
+def replay(args):
+    speed = None if args.speed == 'max' else float(args.speed)
+
+    if args.target == 'ingest':
+        # Point the app at the scratch database before flask_server.app is imported (it reads the URI once)
+        import config
+        config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(args.database)
+        import main
+        from datetime import timedelta
+        from core.ingest import IngestWriter
+        app, db = main.app, main.db
+        main.prepare_database()
+        if args.no_rate_limit:
+            IngestWriter.RATE_LIMIT = timedelta(0)
+        main.ingest_writer.start()
+        send = main.process_sensor_data
+    else:
+        from flask_server.app import create_app, db
+        app = create_app()
+        client, config = mqtt_client()
+        client.max_inflight_messages_set(100)
+        client.connect(config.hostmqtt, config.port_mqtt, 60)
+        client.loop_start()
+        send = lambda payload, topic: client.publish(topic, payload, qos=args.qos)
+        args.gateway = args.gateway or f"http://127.0.0.1:{config.port_app}"
+
+    from flask_server.app.model.model import DeviceRecord
+    with app.app_context():
+        start_id = db.session.query(db.func.max(DeviceRecord.id)).scalar() or 0
+
+    latencies, lags = [], []
+    count, t0, wall0 = 0, None, time.perf_counter()
+    for ts, topic, payload in read_capture(args.file):
+        if t0 is None:
+            t0 = ts
+        if speed:
+            due = wall0 + (ts - t0) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due))
+        started = time.perf_counter()
+        send(payload, topic)
+        latencies.append(time.perf_counter() - started)
+        count += 1
+    elapsed = time.perf_counter() - wall0
+
+    # Let the pipeline drain before counting rows
+    if args.target == 'ingest':
+        if not main.ingest_writer.wait_flushed(timeout=args.settle * 10):
+            print("ingest writer still busy, counting the rows written so far")
+    else:
+        time.sleep(args.settle)
+        client.loop_stop()
+        client.disconnect()
+    with app.app_context():
+        rows = DeviceRecord.query.filter(DeviceRecord.id > start_id).count()
+
+    latencies.sort()
+    lags.sort()
+    label = 'ingest callback' if args.target == 'ingest' else 'publish'
+    print(f"Replayed {count} messages in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} msg/s, speed {args.speed})")
+    print(f"{label} latency: p50 {percentile(latencies, 0.50)} ms, p99 {percentile(latencies, 0.99)} ms")
+    if lags:
+        print(f"schedule lag: p50 {percentile(lags, 0.50)} ms, p99 {percentile(lags, 0.99)} ms")
+    print(f"device_records rows written: {rows}")
+    if args.target == 'ingest':
+        from core.backpressure import ingest_metrics
+        print("ingest stages:")
+        print_stage_latency(ingest_metrics.snapshot())
+    else:
+        # Stage windows hold the last LatencyStats.WINDOW samples, i.e. mostly this run on a busy replay
+        try:
+            snapshot = gateway_stats(app, args)
+        except Exception as e:
+            print(f"gateway ingest stats unavailable ({e})")
+        else:
+            print(f"gateway ingest stages ({args.gateway}):")
+            print_stage_latency(snapshot)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Record / replay sensor MQTT traffic")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('record', help="record raw traffic to a capture file (appends)")
+    p.add_argument('file')
+    p.add_argument('--topic', default='sensor/data/#')
+    p.add_argument('--duration', type=float, default=0, help="seconds, 0 = until Ctrl+C")
+    p.set_defaults(func=record)
+
+    p = sub.add_parser('replay', help="replay a capture file")
+    p.add_argument('file')
+    p.add_argument('--speed', default='1', help="1, 10, ... or max")
+    p.add_argument('--target', choices=('mqtt', 'ingest'), default='mqtt')
+    p.add_argument('--qos', type=int, choices=(0, 1), default=0)
+    p.add_argument('--settle', type=float, default=3.0,
+                   help="mqtt target: seconds to wait for the gateway before counting rows"
+                        " (ingest target: waits for the writer's flush, up to 10x this)")
+    p.add_argument('--gateway', default=None, help="mqtt target: gateway web URL for /api/ingest_stats"
+                                                   " (default http://127.0.0.1:PORT_WEB)")
+    p.add_argument('--user', default=None, help="mqtt target: account email for /api/ingest_stats (default: first user)")
+    p.add_argument('--no-rate-limit', action='store_true', help="ingest target: disable the 5 minute per-device rate limit")
+    p.add_argument('--database', default=None,
+                   help="ingest target (required): scratch SQLite file to write into, never the gateway's database")
+    p.set_defaults(func=replay)
+
+    p = sub.add_parser('info', help="summary of a capture file")
+    p.add_argument('file')
+    p.set_defaults(func=info)
+
+    args = parser.parse_args(argv)
+    if args.command == 'replay' and args.speed != 'max':
+        try:
+            if float(args.speed) <= 0:
+                raise ValueError
+        except ValueError:
+            parser.error("--speed must be a positive number or 'max'")
+    if args.command == 'replay' and args.target == 'ingest':
+        import config
+        if not args.database:
+            parser.error("--target ingest needs --database <scratch file>")
+        if 'sqlite:///' + os.path.abspath(args.database) == config.SQLALCHEMY_DATABASE_URI:
+            parser.error("--database is the gateway's configured database, use a scratch file")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its database path from the environment when config is imported
+_DB_DIR = tempfile.mkdtemp(prefix="rex-gateway-tests-")
+os.environ['DATABASE'] = os.path.join(_DB_DIR, 'test.db')
+os.environ.setdefault('SECRET_KEY', 'rex-gateway-test-secret-key-0123456789')
+os.environ.setdefault('GATEWAY_ID', 'gw-test')
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture(scope='session')
+def app():
+    # main builds the app at import (create_app() can only run once per process)
+    from main import app
+    from flask_server.app import db
+    app.config['TESTING'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """Fresh tables for every test, inside an app context."""
+    from flask_server.app import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(db):
+    from flask_server.app.model.user_model import User
+
+    def make(name='alice'):
+        user = User(username=name, email=f"{name}@test", password='x')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_device(db):
+    from flask_server.app.model.model import Device
+
+    def make(user, device_id, type_device='power'):
+        device = Device(device_id=device_id, device_name=device_id, type_device=type_device,
+                        status=1, user_id=user.id)
+        db.session.add(device)
+        db.session.commit()
+        return device
+    return make
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_header(app):
+    """Bearer JWT header for a user (API routes accept a JWT or a login session)."""
+    from flask_jwt_extended import create_access_token
+
+    def header(user):
+        with app.app_context():
+            return {'Authorization': f"Bearer {create_access_token(identity=user.email)}"}
+    return header
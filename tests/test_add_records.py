@@ -0,0 +1,52 @@
+import pytest
+
+from flask_server.app.controller.api.device_controller import DeviceController
+from flask_server.app.model.model import DeviceRecord
+
+
+def test_single_record_is_saved(db, client):
+    response = client.post('/api/add_power', json={'device_id': 'd1', 'power': '12.5', 'voltage': 220})
+    assert response.status_code == 200
+    assert response.get_json()['data']['power'] == 12.5
+    assert DeviceRecord.query.one().voltage == 220.0
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'device_id': 'd1', 'power': 'abc'}, "power must be a number"),
+    ({'power': 1.0}, "device_id is required"),
+    ({'device_id': 'd1', 'lux': 3.0}, "at least one of power, voltage, current, frequency, energy is required"),
+])
+def test_invalid_single_record_is_a_bad_request(db, client, body, message):
+    response = client.post('/api/add_power', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == message
+    assert DeviceRecord.query.count() == 0
+
+
+def test_batch_reports_partial_failure(db, client):
+    response = client.post('/api/add_batch', json=[
+        {'type': 'power', 'device_id': 'd1', 'power': 1.0},
+        {'type': 'power', 'device_id': 'd2', 'power': 'abc'},
+        {'type': 'lux', 'device_id': 'd3', 'lux': 300},
+        {'type': 'power', 'device_id': 'd4'},
+    ])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['saved'], body['failed']) == (2, 2)
+    assert [r['status'] for r in body['results']] == ['ok', 'error', 'ok', 'error']
+    assert body['results'][1]['message'] == "power must be a number"
+    assert sorted(r.device_id for r in DeviceRecord.query) == ['d1', 'd3']
+
+
+def test_batch_rejects_unknown_type(db, client):
+    response = client.post('/api/add_batch', json={'type': 'plasma', 'records': [{'device_id': 'd1', 'power': 1.0}]})
+    assert response.status_code == 207
+    assert response.get_json()['results'][0]['message'] == "Unknown type 'plasma'"
+    assert DeviceRecord.query.count() == 0
+
+
+def test_batch_size_is_limited(db, client):
+    records = [{'device_id': 'd1', 'power': 1.0}] * (DeviceController.MAX_BATCH_ITEMS + 1)
+    assert client.post('/api/add_batch', json={'type': 'power', 'records': records}).status_code == 413
+    assert client.post('/api/add_batch', json=[]).status_code == 400
+    assert DeviceRecord.query.count() == 0
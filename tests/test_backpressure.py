@@ -0,0 +1,161 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from core.backpressure import IngestQueue, LatencyStats
+from core.mqtt_consumer import MqttConsumer
+
+
+def make_queue(policy, maxsize=4):
+    shed = []
+    return IngestQueue(f"test-{policy}", maxsize, policy, on_drop=shed.append), shed
+
+
+def drain(q):
+    items = []
+    while len(q):
+        items.append(q.get(timeout=0))
+    return items
+
+
+def test_drop_newest_rejects_when_full():
+    q, shed = make_queue('drop_newest', 3)
+    assert [q.put(i) for i in range(5)] == [True, True, True, False, False]
+    assert shed == [3, 4]
+    assert drain(q) == [0, 1, 2]
+    assert q.stats()['dropped']['full'] == 2
+
+
+def test_drop_oldest_evicts_the_oldest():
+    q, shed = make_queue('drop_oldest', 3)
+    for i in range(5):
+        assert q.put(i)
+    assert shed == [0, 1]
+    assert drain(q) == [2, 3, 4]
+    assert q.stats()['dropped']['evicted'] == 2
+
+
+def test_alarms_are_never_shed_and_keep_fifo_order():
+    q, shed = make_queue('drop_newest', 3)
+    q.put('a')
+    q.put('b')
+    q.put('fire-1', alarm=True)
+    assert q.put('fire-2', alarm=True) # Full: evicts the oldest sheddable item
+    assert q.put('c') is False
+    q.put('fire-3', alarm=True)
+    q.put('fire-4', alarm=True) # Only alarms left: goes over capacity
+    assert shed == ['a', 'c', 'b']
+    assert drain(q) == ['fire-1', 'fire-2', 'fire-3', 'fire-4']
+
+
+def test_sample_keeps_one_pending_item_per_device():
+    q, shed = make_queue('sample', 4)
+    q.put('a1', key='a')
+    q.put('b1', key='b')
+    q.put('a2', key='a') # At the high-water mark (2 of 4): replaces a1 in place
+    q.put('c1', key='c')
+    assert shed == ['a1']
+    assert drain(q) == ['a2', 'b1', 'c1']
+    assert q.stats()['dropped']['sampled'] == 1
+
+
+@pytest.mark.parametrize('policy', IngestQueue.POLICIES)
+def test_memory_and_time_stay_flat_while_the_consumer_is_stalled(policy):
+    q, shed = make_queue(policy, 1000)
+    started = time.monotonic()
+    for i in range(30000):
+        q.put(i, key=i % 50, alarm=(i % 1000 == 0))
+    elapsed = time.monotonic() - started
+
+    assert len(q) <= 1000 + 30 # Alarms may go over capacity
+    assert len(q._sheddable) + len(q._alarms) == len(q)
+    assert len(q._by_key) <= 50
+    assert elapsed < 2.0 # Was quadratic: dead entries rescanned on every put
+    assert len(shed) + len(q) == 30000
+
+
+def test_get_times_out():
+    q, _ = make_queue('drop_oldest')
+    with pytest.raises(IndexError):
+        q.get(timeout=0.01)
+
+
+def test_join_waits_for_task_done_and_counts_shed_items():
+    q, _ = make_queue('drop_oldest', maxsize=2)
+    for i in range(3):
+        q.put(i)                       # 0 is evicted: nothing to wait for
+    assert not q.join(timeout=0.01)
+    items = drain(q)
+    assert items == [1, 2]
+    assert not q.join(timeout=0.01)    # taken but not handled yet
+
+    threading.Timer(0.05, q.task_done, args=(len(items),)).start()
+    assert q.join(timeout=2)
+
+
+def test_writer_wait_flushed_covers_the_batch_being_committed(app, db, make_user, make_device):
+    from core.ingest import IngestWriter
+    from flask_server.app.model.model import DeviceRecord
+    make_device(make_user('flush'), 'dev-flush')
+    writer = IngestWriter(app, flush_interval=0.05)
+    slow_flush = writer._flush
+
+    def flush(rows):
+        time.sleep(0.2)                # queue is already empty while this commits
+        slow_flush(rows)
+    writer._flush = flush
+    writer.start()
+    for i in range(5):
+        writer.submit({'device_id': 'dev-flush', 'type_device': 'power', 'power': float(i),
+                       'created_at': datetime.now()})
+    assert writer.wait_flushed(timeout=5)
+    assert DeviceRecord.query.filter_by(device_id='dev-flush').count() == 5
+
+
+def test_latency_stats_percentiles():
+    stats = LatencyStats()
+    for ms in range(1, 101):
+        stats.add(ms / 1000.0)
+    snapshot = stats.snapshot()
+    assert (snapshot['count'], snapshot['p50_ms'], snapshot['p99_ms'], snapshot['max_ms']) == (100, 51.0, 100.0, 100.0)
+
+
+@pytest.mark.parametrize('payload, topic, expected', [
+    (b'{"device_id": "gas01", "power": 3}', 'sensor/data/power/gas01', False),
+    (b'{"device_id": "a", "type": "smoke", "lux": 1}', 'sensor/data', False),
+    (b'{"device_id": "a", "fire": null, "gas": 0, "smoke": 0.0}', 'sensor/data', False),
+    (b'{"device_id": "a", "fire": false}', 'sensor/data/fire/a', False),
+    (b'{"device_id": "a", "fire": 1}', 'sensor/data', True),
+    (b'{"device_id": "a", "gas": 0.4}', 'sensor/data/gas/a', True),
+    (b'{"device_id": "a", "smoke" : 120}', 'sensor/data', True),
+    (b'\x81\xa4fire\x00', 'sensor/data/fire/a/msgpack', True), # Binary: routed type decides
+    (b'\x81\xa5power\x01', 'sensor/data/power/a/msgpack', False),
+])
+def test_is_alarm(payload, topic, expected):
+    consumer = MqttConsumer('localhost', callback=None)
+    assert consumer.is_alarm(payload, topic) is expected
+
+
+def test_shared_subscription_keeps_device_order(monkeypatch):
+    consumer = MqttConsumer('broker', callback=None, workers=4, share_group='ingest')
+    subscriptions = []
+
+    class Client:
+        def loop_forever(self, retry_first_connection=False):
+            pass
+    monkeypatch.setattr(consumer, '_new_client', lambda sub, on_message: subscriptions.append(sub) or Client())
+    monkeypatch.setattr(consumer, '_worker', lambda q: None)
+    consumer.run('sensor/data/#')
+    assert subscriptions == ['$share/ingest/sensor/data/#']
+
+    for i in range(20):
+        consumer.dispatch(b'%d' % i, 'sensor/data/power/pm-%d' % (i % 3))
+    per_device = {}
+    for q in consumer.queues:
+        for payload, topic in drain(q):
+            per_device.setdefault(topic, []).append((consumer.queues.index(q), int(payload)))
+    for device, items in per_device.items():
+        assert len({index for index, _ in items}) == 1 # One worker per device
+        assert [i for _, i in items] == sorted(i for _, i in items)
@@ -0,0 +1,33 @@
+import importlib
+
+import pytest
+
+from config import config
+
+
+@pytest.fixture
+def reload_config(monkeypatch):
+    monkeypatch.delenv('MQTT_WORKERS', raising=False)
+    monkeypatch.delenv('MQTT_SHARE_GROUP', raising=False)
+    monkeypatch.delenv('CONFIG_INI', raising=False)
+    yield lambda: importlib.reload(config)
+    monkeypatch.undo()
+    importlib.reload(config)
+
+
+def test_mqtt_workers_come_from_config_ini(reload_config, tmp_path, monkeypatch):
+    ini = tmp_path / 'config.ini'
+    ini.write_text("[MQTT]\nHOST = localhost\nPASSWORD = !Password11\nWORKERS = 4\nSHARE_GROUP = ingest\n")
+    monkeypatch.setenv('CONFIG_INI', str(ini))
+    reload_config()
+    assert (config.mqtt_workers, config.mqtt_share_group) == (4, 'ingest')
+
+    monkeypatch.setenv('MQTT_WORKERS', '2')
+    monkeypatch.setenv('MQTT_SHARE_GROUP', '')
+    reload_config()
+    assert (config.mqtt_workers, config.mqtt_share_group) == (2, '')
+
+
+def test_repo_config_ini_defaults(reload_config):
+    reload_config()
+    assert (config.mqtt_workers, config.mqtt_share_group) == (1, '')
@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+
+from core.dashboard_feed import DashboardFeed
+from flask_server.app.controller.home_Controller import HomeController
+from flask_server.app.model.model import DeviceRecord
+
+
+def test_snapshot_only_has_the_users_records(db, make_user, make_device):
+    alice, bob = make_user('alice'), make_user('bob')
+    make_device(alice, 'pm-alice')
+    make_device(bob, 'pm-bob')
+    db.session.add_all([DeviceRecord(device_id='pm-alice', power=1.0, created_at=datetime.now()),
+                        DeviceRecord(device_id='pm-bob', power=2.0, created_at=datetime.now()),
+                        DeviceRecord(device_id='pm-unowned', power=3.0, created_at=datetime.now())])
+    db.session.commit()
+
+    snapshot = HomeController.dashboard_snapshot(alice.id)
+    assert [r['device_id'] for r in snapshot['last_records']] == ['pm-alice']
+    assert [d['device_id'] for d in snapshot['devices']] == ['pm-alice']
+
+
+def test_feed_publishes_change_signals_without_readings(db, make_user, make_device):
+    alice, bob = make_user('alice'), make_user('bob')
+    make_device(alice, 'pm-alice')
+    make_device(bob, 'pm-bob')
+
+    published = []
+    feed = DashboardFeed()
+    feed.publish = lambda topic, message, retain: published.append((topic, message, retain))
+    feed.last_record_id = 0
+    db.session.add(DeviceRecord(device_id='pm-alice', power=1.0, created_at=datetime.now()))
+    db.session.commit()
+
+    assert feed.publish_changes() == 1
+    (topic, message, retain), = published
+    assert topic == DashboardFeed.topic(alice.id)
+    assert retain is False
+    assert set(json.loads(message)) == {'last_record_id', 'server_time'}
+
+
+def test_snapshot_is_built_once_per_change(db, make_user, make_device, monkeypatch):
+    alice = make_user('alice')
+    make_device(alice, 'pm-alice')
+    builds = []
+    build = HomeController.dashboard_snapshot
+    monkeypatch.setattr(HomeController, 'dashboard_snapshot', staticmethod(lambda uid: builds.append(uid) or build(uid)))
+
+    feed = DashboardFeed()
+    feed.publish = lambda topic, message, retain: None
+    feed.last_record_id = 0
+    feed._thread = object() # Running: snapshots are cached
+    for _ in range(3):
+        assert feed.snapshot(alice.id)['last_records'] == []
+    assert builds == [alice.id]
+
+    db.session.add(DeviceRecord(device_id='pm-alice', power=1.0, created_at=datetime.now()))
+    db.session.commit()
+    feed.publish_changes() # Rebuilt once for the watched user, before the signal
+    for _ in range(3):
+        assert [r['power'] for r in feed.snapshot(alice.id)['last_records']] == [1.0]
+    assert builds == [alice.id, alice.id]
+
+    feed.forget(alice.id)
+    feed.snapshot(alice.id)
+    assert len(builds) == 3
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from core.decoders import DecoderRegistry, decoders
+
+
+def test_extractor_maps_aliases_and_types():
+    row = decoders.extractor('humidity-temp')({'device_id': 'env-1', 'hum': '55.5', 'temp': 21})
+    assert row['device_id'] == 'env-1'
+    assert (row['humidity'], row['temperature']) == (55.5, 21.0)
+    assert set(row) == {'device_id', *DecoderRegistry.COLUMNS}
+    assert all(row[c] is None for c in DecoderRegistry.COLUMNS if c not in ('humidity', 'temperature'))
+
+
+def test_extractor_reads_only_the_fields_of_its_type():
+    reading = {'device_id': 'pm-1', 'power': 10, 'voltage': 220, 'lux': 5, 'fire': True}
+    assert decoders.extractor('power')(reading)['lux'] is None
+    legacy = decoders.extractor(None)(reading)
+    assert (legacy['power'], legacy['lux'], legacy['fire'], legacy['voltage']) == (10.0, 5.0, 1, None)
+    assert decoders.extractor('unknown') is decoders.extractor(None)
+
+
+@pytest.mark.parametrize('payload, topic_format, expected', [
+    (b'{"a": 1}', None, 'json'),
+    (b' [1]', None, 'json'),
+    (b'', None, 'json'),
+    (b'\xa1\x61a\x01', None, 'cbor'),
+    (b'\xd9\xd9\xf7\xa0', None, 'cbor'),
+    (b'\x81\xa1a\x01', None, 'msgpack'),
+    (b'\xde\x00\x01', None, 'msgpack'),
+    (b'\x81\xa1a\x01', 'cbor', 'cbor'),
+])
+def test_detect_format(payload, topic_format, expected):
+    assert DecoderRegistry.detect_format(payload, topic_format) == expected
+
+
+def test_decode_json():
+    assert DecoderRegistry.decode(json.dumps([{'device_id': 'a'}]).encode()) == [{'device_id': 'a'}]
+
+
+def test_decode_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    data = {'device_id': 'pm-1', 'power': 1.5}
+    assert DecoderRegistry.decode(msgpack.packb(data)) == data
+
+
+def test_decode_cbor():
+    cbor2 = pytest.importorskip('cbor2')
+    data = {'device_id': 'pm-1', 'power': 1.5}
+    assert DecoderRegistry.decode(cbor2.dumps(data)) == data
+
+
+@pytest.mark.parametrize('payload, expected', [
+    (b'{"device_id": "a", "power": 1}', False),
+    (b'{"device_id": "a", "status": "ok", "tsX": 1}', False),
+    (b'{"device_id": "ts", "note": "created_at"}', False),
+    (b'{"device_id": "a", "ts": 1760000000}', True),
+    (b'[{"power": 1}, {"power": 2, "created_at" : "2026-01-01T00:00:00"}]', True),
+    (b'\x81\xa2ts\x01', True), # Binary: only a decode can tell
+])
+def test_may_have_device_time(payload, expected):
+    from main import may_have_device_time
+    assert may_have_device_time(payload) is expected
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from flask_server.app.model.model import DeviceLatest, DeviceRecord
+from flask_server.app.model.schema import run_data_migrations
+
+T0 = datetime(2026, 3, 1, 8, 0, 0)
+
+
+def test_backfill_takes_the_newest_value_of_each_metric(db):
+    db.session.add_all([
+        DeviceRecord(device_id='env-1', humidity=40.0, temperature=20.0, created_at=T0),
+        DeviceRecord(device_id='env-1', humidity=41.0, created_at=T0 + timedelta(minutes=5)),
+        DeviceRecord(device_id='pm-1', power=3.0, created_at=T0),
+    ])
+    db.session.commit()
+
+    assert DeviceLatest.backfill() == 2
+    env = db.session.get(DeviceLatest, 'env-1')
+    assert (env.humidity, env.temperature, env.last_seen) == (41.0, 20.0, T0 + timedelta(minutes=5))
+    assert db.session.get(DeviceLatest, 'pm-1').power == 3.0
+
+
+def test_backfill_keeps_newer_live_values(db):
+    db.session.add(DeviceRecord(device_id='pm-1', power=1.0, voltage=220.0, created_at=T0))
+    db.session.commit()
+    # Live ingest wrote a newer reading to device_latest before the backfill ran
+    DeviceLatest.upsert([{'device_id': 'pm-1', 'power': 5.0, 'created_at': T0 + timedelta(hours=1)}])
+    db.session.commit()
+
+    DeviceLatest.backfill()
+    row = db.session.get(DeviceLatest, 'pm-1')
+    assert (row.power, row.voltage, row.last_seen) == (5.0, 220.0, T0 + timedelta(hours=1))
+
+
+def test_upsert_applies_a_mixed_batch_in_time_order(db):
+    DeviceLatest.upsert([{'device_id': 'pm-1', 'power': 10.0, 'created_at': T0 + timedelta(minutes=5)}])
+    db.session.commit()
+    # Backlog reading older than the stored one, plus a newer reading of another metric
+    DeviceLatest.upsert([{'device_id': 'pm-1', 'power': 1.0, 'voltage': 230.0, 'created_at': T0},
+                         {'device_id': 'pm-1', 'lux': 3.0, 'created_at': T0 + timedelta(minutes=6)}])
+    db.session.commit()
+
+    row = db.session.get(DeviceLatest, 'pm-1')
+    assert (row.power, row.voltage, row.lux) == (10.0, 230.0, 3.0)
+    assert row.last_seen == T0 + timedelta(minutes=6)
+
+
+def test_data_migration_runs_once(db):
+    db.session.execute(text("PRAGMA user_version = 0"))
+    db.session.add(DeviceRecord(device_id='pm-1', power=1.0, created_at=T0))
+    db.session.commit()
+
+    run_data_migrations()
+    assert db.session.get(DeviceLatest, 'pm-1').power == 1.0
+    DeviceLatest.query.delete()
+    db.session.commit()
+    run_data_migrations()
+    assert DeviceLatest.query.count() == 0
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from core.device_state import DeviceStateCache
+from flask_server.app.model.model import DeviceLatest, DeviceRecord
+
+T0 = datetime(2026, 3, 1, 8, 0, 0)
+RATE = timedelta(minutes=5)
+
+
+def test_history_is_bounded_by_time(db):
+    cache = DeviceStateCache()
+    for i in range(3 * 288):  # Three days, one reading per 5 minutes
+        cache.mark_accepted('pm-1', T0 + i * RATE)
+    state = cache._state['pm-1']
+    assert len(state['accepted']) <= DeviceStateCache.HISTORY_WINDOW / RATE + 1
+    assert state['accepted'].itemsize == 8
+
+
+def test_old_backlog_is_checked_against_stored_rows(app, db):
+    db.session.add(DeviceRecord(device_id='pm-1', power=1.0, created_at=T0))
+    db.session.add(DeviceRecord(device_id='pm-1', power=2.0, created_at=T0 + timedelta(days=2)))
+    DeviceLatest.upsert([{'device_id': 'pm-1', 'power': 2.0, 'created_at': T0 + timedelta(days=2)}])
+    db.session.commit()
+
+    cache = DeviceStateCache()
+    cache.warm() # Only last_seen is known after a restart
+    assert cache.is_rate_limited('pm-1', T0 + timedelta(minutes=2), RATE)
+    assert not cache.is_rate_limited('pm-1', T0 + timedelta(minutes=10), RATE)
+
+
+def test_out_of_order_readings_are_limited_against_both_neighbours(db):
+    cache = DeviceStateCache()
+    cache.mark_accepted('pm-1', T0)
+    cache.mark_accepted('pm-1', T0 + timedelta(minutes=30))
+
+    assert not cache.is_rate_limited('pm-1', T0 + timedelta(minutes=15), RATE) # Backlog gap
+    assert cache.is_rate_limited('pm-1', T0 + timedelta(minutes=3), RATE)      # Too close after T0
+    assert cache.is_rate_limited('pm-1', T0 + timedelta(minutes=27), RATE)     # Too close before the newer one
+    assert not cache.is_rate_limited('pm-1', T0 + timedelta(minutes=40), RATE)
+
+    cache.mark_accepted('pm-1', T0 + timedelta(minutes=15))
+    assert cache.is_rate_limited('pm-1', T0 + timedelta(minutes=17), RATE)
+    assert cache.last_seen('pm-1') == T0 + timedelta(minutes=30) # Backlog does not move last_seen back
+
+    cache.forget('pm-1', T0 + timedelta(minutes=15)) # Write failed
+    assert not cache.is_rate_limited('pm-1', T0 + timedelta(minutes=17), RATE)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from core.downsample import Downsampler
+
+
+def series(n, seed=1):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=float)
+    y = np.sin(x / 50.0) * 10 + rng.normal(0, 0.5, n)
+    return x, y
+
+
+def reference_lttb(x, y, threshold):
+    """Straightforward per-point LTTB, same bucket edges as Downsampler.lttb."""
+    n = len(x)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept, a = [0], 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 20), (10, 10), (10, 2)])
+def test_short_series_is_returned_whole(n, threshold):
+    x, y = series(n)
+    assert list(Downsampler.lttb(x, y, threshold)) == list(range(n))
+    assert list(Downsampler.min_max(y, threshold)) == list(range(n))
+
+
+@pytest.mark.parametrize('n, threshold', [(5, 4), (1000, 100), (10007, 500), (501, 500)])
+def test_lttb_matches_reference(n, threshold):
+    x, y = series(n)
+    indices = Downsampler.lttb(x, y, threshold)
+    assert len(indices) == threshold
+    assert list(indices) == reference_lttb(x, y, threshold)
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_min_max_keeps_every_spike():
+    x, y = series(10000)
+    spikes = [1234, 5678, 9001]
+    y[spikes] = 1000.0
+    y[4321] = -1000.0
+    indices = Downsampler.min_max(y, 200)
+    assert len(indices) <= 200
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert set(spikes + [4321]) <= set(indices)
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_downsample_dispatches_on_mode():
+    x, y = series(1000)
+    assert list(Downsampler.downsample(x, y, 100, 'minmax')) == list(Downsampler.min_max(y, 100))
+    assert list(Downsampler.downsample(x, y, 100)) == list(Downsampler.lttb(x, y, 100))
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from core.ingest import IngestWriter
+from flask_server.app.model.model import DeviceLatest, DeviceRecord
+
+
+@pytest.fixture
+def writer(app, monkeypatch):
+    monkeypatch.setattr(IngestWriter, 'FLUSH_RETRY_DELAY', 0)
+    return IngestWriter(app)
+
+
+def locked_upsert(monkeypatch, failures):
+    """DeviceLatest.upsert raising "database is locked" for the first `failures` calls."""
+    upsert, calls = DeviceLatest.upsert, []
+
+    def flaky(rows):
+        calls.append(len(rows))
+        if len(calls) <= failures:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        upsert(rows)
+    monkeypatch.setattr(DeviceLatest, 'upsert', staticmethod(flaky))
+    return calls
+
+
+def rows(count):
+    return [{'device_id': 'pm-1', 'power': float(i), 'created_at': datetime(2026, 3, 1, 8, i)} for i in range(count)]
+
+
+def test_locked_flush_is_retried(db, writer, monkeypatch):
+    locked_upsert(monkeypatch, failures=2)
+    writer._flush(rows(3))
+    assert (writer.written, writer.failed, writer.retried) == (3, 0, 2)
+    assert DeviceRecord.query.count() == 3
+
+
+def test_flush_fails_after_the_last_retry(db, writer, monkeypatch):
+    calls = locked_upsert(monkeypatch, failures=IngestWriter.FLUSH_RETRIES + 1)
+    writer._flush(rows(3))
+    assert len(calls) == IngestWriter.FLUSH_RETRIES + 1
+    assert (writer.written, writer.failed) == (0, 3)
+    assert DeviceRecord.query.count() == 0
+
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+@pytest.mark.parametrize('data', [
+    {'ts': NOW.timestamp() - 60},
+    {'ts': (NOW.timestamp() - 60) * 1000},             # Milliseconds
+    {'ts': str(NOW.timestamp() - 60)},
+    {'created_at': (NOW - timedelta(minutes=1)).isoformat()},
+    {'ts': (NOW - timedelta(minutes=1)).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')},
+])
+def test_reading_time_formats(data):
+    assert IngestWriter.reading_time(data, now=NOW) == NOW - timedelta(minutes=1)
+
+
+@pytest.mark.parametrize('data', [
+    {},
+    {'ts': ''},
+    {'ts': 'yesterday'},
+    {'ts': (NOW + timedelta(hours=1)).timestamp()},    # Clock ahead of the gateway
+    {'ts': (NOW - timedelta(days=400)).timestamp()},   # Unsynced RTC after boot
+    {'ts': 1e30},
+])
+def test_reading_time_falls_back_to_now(data):
+    assert IngestWriter.reading_time(data, now=NOW) == NOW
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.outbox import CloudOutbox
+from core.send_server import CloudSender
+from flask_server.app.model.model import EndpointConfig, OutboxBatch
+
+
+@pytest.fixture
+def endpoint(db):
+    ep = EndpointConfig(name='cloud', url='http://cloud.test/api', is_active=True, max_concurrency=1)
+    db.session.add(ep)
+    db.session.commit()
+    return ep
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    """Replace the HTTP POST: answers are popped from `posts.codes` (default 200)."""
+    class Recorder:
+        def __init__(self):
+            self.calls = []
+            self.codes = []
+
+        def __call__(self, url, payload, headers_str=None, timeout=10, session=None, use_gzip=False):
+            self.calls.append((url, payload))
+            code = self.codes.pop(0) if self.codes else 200
+            if 200 <= code < 300:
+                return True, "Success", code
+            return False, f"HTTP {code}", code
+
+    recorder = Recorder()
+    monkeypatch.setattr(CloudSender, 'post_payload', staticmethod(recorder))
+    return recorder
+
+
+def queue(db, endpoint, count):
+    batches = [CloudOutbox.enqueue_payload(endpoint.id, endpoint.url, f'[{i}]', record_count=1)
+               for i in range(count)]
+    db.session.commit()
+    return batches
+
+
+def test_backoff_delay_is_capped_with_jitter():
+    for attempts in range(1, 30):
+        delay = min(CloudOutbox.MAX_DELAY, CloudOutbox.BASE_DELAY * 2 ** (attempts - 1))
+        assert delay / 2 <= CloudOutbox.backoff_delay(attempts) <= delay
+    assert CloudOutbox.backoff_delay(100) <= CloudOutbox.MAX_DELAY
+
+
+@pytest.mark.parametrize('code, retryable', [(0, True), (500, True), (503, True), (429, True),
+                                             (408, True), (400, False), (404, False), (422, False)])
+def test_is_retryable(code, retryable):
+    assert CloudOutbox._is_retryable(code) is retryable
+
+
+def test_delivered_batches_are_deleted_in_order(db, endpoint, posts):
+    queue(db, endpoint, 3)
+    assert CloudOutbox.deliver_pending() == (3, 3, 0)
+    assert [payload for _, payload in posts.calls] == ['[0]', '[1]', '[2]']
+    assert OutboxBatch.query.count() == 0
+
+
+def test_retryable_failure_backs_off_and_stops_the_lane(db, endpoint, posts):
+    batches = queue(db, endpoint, 3)
+    posts.codes = [200, 503]
+    before = datetime.now()
+
+    assert CloudOutbox.deliver_pending() == (1, 1, 1)
+    assert len(posts.calls) == 2 # Third batch waits behind the failed one
+
+    failed = db.session.get(OutboxBatch, batches[1].id)
+    assert failed.status == 'pending'
+    assert failed.attempts == 1
+    assert failed.next_attempt_at >= before + timedelta(seconds=CloudOutbox.BASE_DELAY / 2)
+    assert failed.last_error == 'HTTP 503'
+
+    # Not due yet: nothing is posted, not even the newer batch behind it
+    assert CloudOutbox.deliver_pending() == (0, 0, 0)
+
+    failed.next_attempt_at = datetime.now() - timedelta(seconds=1)
+    db.session.commit()
+    assert CloudOutbox.deliver_pending() == (2, 2, 0)
+    assert [payload for _, payload in posts.calls[2:]] == ['[1]', '[2]']
+
+
+def test_rejected_batch_goes_to_dead_letter(db, endpoint, posts):
+    batch = queue(db, endpoint, 1)[0]
+    posts.codes = [400]
+    CloudOutbox.deliver_pending()
+    assert db.session.get(OutboxBatch, batch.id).status == 'dead'
+    assert CloudOutbox.stats() == {'pending': 0, 'dead': 1}
+
+
+def test_too_many_attempts_goes_to_dead_letter(db, endpoint, posts):
+    batch = queue(db, endpoint, 1)[0]
+    batch.attempts = CloudOutbox.MAX_ATTEMPTS - 1
+    db.session.commit()
+    posts.codes = [500]
+    CloudOutbox.deliver_pending()
+    assert db.session.get(OutboxBatch, batch.id).status == 'dead'
+
+
+def test_inactive_endpoint_keeps_its_backlog(db, endpoint, posts):
+    queue(db, endpoint, 2)
+    endpoint.is_active = False
+    db.session.commit()
+    assert CloudOutbox.deliver_pending() == (0, 0, 0)
+    assert OutboxBatch.query.count() == 2
+
+
+def test_failing_endpoint_does_not_starve_the_others(db, endpoint, monkeypatch):
+    down = EndpointConfig(name='down', url='http://down.test/api', is_active=True, max_concurrency=1)
+    db.session.add(down)
+    db.session.commit()
+    queue(db, down, CloudOutbox.DRAIN_LIMIT + 50)
+    queue(db, endpoint, 5)
+
+    def post(url, payload, headers_str=None, timeout=10, session=None, use_gzip=False):
+        if url.startswith('http://down.test'):
+            return False, "HTTP 503", 503
+        return True, "Success", 200
+    monkeypatch.setattr(CloudSender, 'post_payload', staticmethod(post))
+
+    CloudOutbox.deliver_pending() # Down's backlog fills the run, its first batch backs off
+    CloudOutbox.deliver_pending()
+    assert OutboxBatch.query.filter_by(endpoint_id=endpoint.id).count() == 0
+    assert OutboxBatch.query.filter_by(endpoint_id=down.id).count() == CloudOutbox.DRAIN_LIMIT + 50
+
+
+def test_prune_dead_letters_keeps_the_newest(db, endpoint, monkeypatch):
+    monkeypatch.setattr(CloudOutbox, 'DEAD_LETTER_LIMIT', 3)
+    batches = queue(db, endpoint, 5)
+    for batch in batches:
+        batch.status = 'dead'
+    db.session.commit()
+    assert CloudOutbox.prune_dead_letters() == 2
+    assert [b.id for b in OutboxBatch.query.order_by(OutboxBatch.id)] == [b.id for b in batches[2:]]
+
+
+def test_live_message_is_posted_inline(db, endpoint, posts):
+    CloudSender._send_to_custom_endpoint({'device_id': 'pm-1', 'power': 12.5}, endpoint)
+    assert posts.calls[0][0] == 'http://cloud.test/api/add_power'
+    assert OutboxBatch.query.count() == 0
+
+
+def test_live_message_falls_back_to_outbox(db, endpoint, posts):
+    posts.codes = [0]
+    CloudSender._send_to_custom_endpoint({'device_id': 'pm-1', 'power': 12.5}, endpoint)
+    batch = OutboxBatch.query.one()
+    assert batch.url == 'http://cloud.test/api/add_power'
+    assert batch.record_count == 1
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from flask_server.app.model.model import DeviceRecord
+
+
+def fetch(client, headers, **params):
+    params.setdefault('length', 2)
+    response = client.get('/api/records/table/power', query_string=params, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def walk(client, headers):
+    """Page through the table with the keyset cursor, returns the ids in display order."""
+    page = fetch(client, headers)
+    ids = []
+    while page['data']:
+        ids += [int(key.rsplit('|', 1)[1]) for key in (page['cursor']['first'], page['cursor']['last'])]
+        page = fetch(client, headers, after=page['cursor']['last'])
+    return ids
+
+
+def test_keyset_paging_handles_null_created_at(db, client, make_user, make_device, auth_header):
+    user = make_user()
+    make_device(user, 'pm-1')
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    rows = [DeviceRecord(device_id='pm-1', power=float(i), created_at=now + timedelta(minutes=i)) for i in range(3)]
+    rows += [DeviceRecord(device_id='pm-1', power=9.0, created_at=None) for _ in range(3)]
+    db.session.add_all(rows)
+    db.session.commit()
+    # created_at has a Python default, NULL only comes from older rows / raw SQL
+    db.session.query(DeviceRecord).filter(DeviceRecord.power == 9.0).update({'created_at': None})
+    db.session.commit()
+
+    headers = auth_header(user)
+    page = fetch(client, headers, length=10)
+    assert page['recordsTotal'] == 6
+    assert page['data'][-1][-1] == '-'
+
+    # Newest first, NULL timestamps last; every row exactly once
+    ids = walk(client, headers)
+    timed = [r.id for r in sorted(rows[:3], key=lambda r: r.created_at, reverse=True)]
+    nulls = sorted((r.id for r in rows[3:]), reverse=True)
+    assert ids == timed + nulls
+
+
+def test_search_is_a_literal_prefix(db, client, make_user, make_device, auth_header):
+    user = make_user()
+    for device_id in ('pm_1', 'pmx1', 'pm%2'):
+        make_device(user, device_id)
+        db.session.add(DeviceRecord(device_id=device_id, power=1.0, created_at=datetime.now()))
+    db.session.commit()
+
+    page = fetch(client, auth_header(user), **{'search[value]': 'pm_', 'length': 10})
+    assert page['recordsFiltered'] == 1
+    page = fetch(client, auth_header(user), **{'search[value]': 'pm%', 'length': 10})
+    assert page['recordsFiltered'] == 1
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from flask_server.app.model.model import DeviceLatest, DeviceRecord
+
+
+@pytest.mark.parametrize('value', ['inf', '-inf', '1e300', 'nan', 'not-a-date'])
+def test_invalid_since_ts_is_a_bad_request(db, client, make_user, auth_header, value):
+    response = client.get('/api/records', query_string={'since_ts': value}, headers=auth_header(make_user()))
+    assert response.status_code == 400
+
+
+def test_since_id_returns_backdated_readings(db, client, make_user, make_device, auth_header):
+    user = make_user()
+    make_device(user, 'pm-1')
+    db.session.add(DeviceRecord(device_id='pm-1', power=1.0, created_at=datetime.now()))
+    db.session.commit()
+    headers = auth_header(user)
+    cursor = client.get('/api/records', query_string={'since_id': 0}, headers=headers).get_json()['next_since_id']
+
+    # Stored after the poll, timestamped by the device an hour earlier
+    db.session.add(DeviceRecord(device_id='pm-1', power=2.0, created_at=datetime.now() - timedelta(hours=1)))
+    db.session.commit()
+
+    page = client.get('/api/records', query_string={'since_id': cursor}, headers=headers).get_json()
+    assert [r['power'] for r in page['records']] == [2.0]
+    assert page['has_more'] is False
+
+
+def test_device_added_through_the_api_has_latest_values(db, client, make_user, auth_header):
+    headers = auth_header(make_user())
+    response = client.post('/api/add_device', headers=headers,
+                           json={'device_id': 'newdev', 'device_name': 'New', 'type_device': 'power', 'status': 1})
+    assert response.status_code == 200
+
+    latest = client.get('/api/latest', query_string={'device_ids': 'newdev'}, headers=headers).get_json()
+    assert latest['not_found'] == []
+    assert latest['count'] == 1
+
+    assert client.post('/api/delete_device', headers=headers, json={'device_id': 'newdev'}).status_code == 200
+    assert db.session.get(DeviceLatest, 'newdev') is None
+
+
+def test_since_ts_pages_through_equal_timestamps(db, client, make_user, make_device, auth_header):
+    user = make_user()
+    make_device(user, 'pm-1')
+    ts = datetime(2026, 3, 1, 8, 0, 0)
+    db.session.add_all([DeviceRecord(device_id='pm-1', power=float(i), created_at=ts) for i in range(4)])
+    db.session.commit()
+    headers = auth_header(user)
+
+    seen, query = [], {'since_ts': (ts - timedelta(seconds=1)).isoformat(), 'limit': 2}
+    while True:
+        page = client.get('/api/records', query_string=query, headers=headers).get_json()
+        seen += [r['power'] for r in page['records']]
+        query = {'since_ts': page['next_since_ts'], 'since_id': page['next_since_id'], 'limit': 2}
+        if not page['has_more']:
+            break
+    assert seen == [0.0, 1.0, 2.0, 3.0]
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import config
+from core.retention import RetentionEngine
+from core.send_server import CloudSender
+from flask_server.app.controller.api.device_controller import DeviceController
+from flask_server.app.model.model import (DeviceRecord, EndpointConfig, SyncCursor,
+                                          Rollup1m, Rollup1h, Rollup1d)
+from flask_server.app.scheduler import job_sync_all
+
+NOW = datetime(2026, 6, 15, 12, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def posts_ok(monkeypatch):
+    monkeypatch.setattr(CloudSender, 'post_payload', staticmethod(lambda *a, **kw: (True, "Success", 200)))
+
+
+def add_records(db, device_id, start, count, step=timedelta(seconds=20), **values):
+    rows = [DeviceRecord(device_id=device_id, created_at=start + i * step, **values) for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def test_active_all_endpoint_does_not_pin_retention(app, db):
+    """Bulk sync leaves cursors at 0 for types without rows (fire, ...): they must not block roll-up."""
+    db.session.add(EndpointConfig(name='cloud', url='http://cloud.test/api', is_active=True, sync_start_id=0))
+    db.session.commit()
+    old = NOW - timedelta(days=config.raw_retention_days + 10)
+    add_records(db, 'pm-1', old, 90, power=5.0)
+    job_sync_all(app)
+    assert SyncCursor.query.filter_by(sensor_type='fire').one().last_record_id == 0
+
+    # Rows arriving after the sync are still pending for the power cursor
+    unsynced = add_records(db, 'pm-1', old + timedelta(hours=1), 3, power=7.0)
+
+    rolled, _ = RetentionEngine.run(NOW)
+    assert rolled == 90
+    assert [r.id for r in DeviceRecord.query.order_by(DeviceRecord.id)] == [r.id for r in unsynced]
+
+    hour = Rollup1h.query.filter_by(device_id='pm-1', metric='power').order_by(Rollup1h.bucket).all()
+    assert sum(r.count for r in hour) == 90
+    assert sum(r.sum for r in hour) == pytest.approx(450.0)
+    day = Rollup1d.query.filter_by(device_id='pm-1', metric='power').one()
+    assert (day.min, day.max, day.count) == (5.0, 5.0, 90)
+
+    # Once synced, the rest goes too
+    job_sync_all(app)
+    assert RetentionEngine.run(NOW)[0] == 3
+    assert DeviceRecord.query.count() == 0
+
+
+def test_rows_of_a_stale_type_only_pin_themselves(db):
+    endpoint = EndpointConfig(name='cloud', url='http://cloud.test/api', is_active=True)
+    db.session.add(endpoint)
+    db.session.commit()
+    old = NOW - timedelta(days=config.raw_retention_days + 10)
+    power = add_records(db, 'pm-1', old, 5, power=1.0)
+    lux = add_records(db, 'lx-1', old, 5, lux=100.0)
+    db.session.add_all([SyncCursor(endpoint_id=endpoint.id, sensor_type='power', last_record_id=power[-1].id),
+                        SyncCursor(endpoint_id=endpoint.id, sensor_type='lux', last_record_id=0)])
+    db.session.commit()
+
+    assert RetentionEngine.run(NOW)[0] == 5
+    assert {r.device_id for r in DeviceRecord.query} == {'lx-1'}
+
+    # A disabled endpoint protects nothing
+    endpoint.is_active = False
+    db.session.commit()
+    assert RetentionEngine.run(NOW)[0] == len(lux)
+
+
+def add_rollup(db, model, bucket, value, count=1):
+    db.session.add(model(device_id='pm-1', metric='power', bucket=bucket, min=value, max=value,
+                         sum=value * count, count=count, last=value, last_at=bucket))
+
+
+def test_read_tiers_falls_back_to_coarser_tiers(db):
+    one_minute_kept = NOW - timedelta(days=config.rollup_1m_retention_days)
+    one_hour_kept = NOW - timedelta(days=config.rollup_1h_retention_days)
+    boundary = RetentionEngine.ceil(one_minute_kept, 3600)
+
+    # 1m only inside its retention, 1h / 1d everywhere (as the engine leaves them after pruning)
+    for hour in range(-48, 48):
+        bucket = RetentionEngine.floor(boundary + timedelta(hours=hour), 3600)
+        add_rollup(db, Rollup1h, bucket, 2.0, count=60)
+        if bucket >= one_minute_kept:
+            for minute in range(60):
+                add_rollup(db, Rollup1m, bucket + timedelta(minutes=minute), 2.0)
+    add_rollup(db, Rollup1d, RetentionEngine.floor(one_hour_kept - timedelta(days=3), 86400), 4.0, count=1440)
+    db.session.commit()
+
+    tier_1m = RetentionEngine.TIERS[0]
+    date_from, date_to = boundary - timedelta(hours=24), boundary + timedelta(hours=24)
+    segments = RetentionEngine.read_tiers(tier_1m, 'pm-1', 'power', date_from, date_to, now=NOW)
+    assert [tier[0] for tier, _ in segments] == ['1m', '1h']
+    assert sum(r.count for _, rows in segments for r in rows) == 48 * 60 # No bucket counted twice
+    assert max(r.bucket for r in segments[1][1]) < min(r.bucket for r in segments[0][1])
+
+    # Range entirely past the 1h retention: served by 1d
+    date_from = one_hour_kept - timedelta(days=5)
+    segments = RetentionEngine.read_tiers(tier_1m, 'pm-1', 'power', date_from, date_from + timedelta(days=4), now=NOW)
+    assert sum(len(rows) for tier, rows in segments if tier[0] == '1d') == 1
+
+
+def test_aggregate_reads_coarser_rollups_after_1m_expired(db):
+    old = datetime.now() - timedelta(days=config.rollup_1m_retention_days + 30)
+    bucket = RetentionEngine.floor(old, 3600)
+    add_rollup(db, Rollup1h, bucket, 3.0, count=60)
+    db.session.commit()
+
+    points = DeviceController._aggregate('pm-1', 'power', 300, bucket - timedelta(hours=1), bucket + timedelta(hours=2))
+    assert [(p['count'], p['avg']) for p in points] == [(60, 3.0)]
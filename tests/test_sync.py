@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from core.outbox import CloudOutbox
+from flask_server.app.controller.api.device_controller import DeviceController
+from flask_server.app.controller.settings_controller import SettingsController
+from flask_server.app.model.model import DeviceRecord, EndpointConfig, OutboxBatch
+
+
+@pytest.fixture(autouse=True)
+def no_delivery(monkeypatch):
+    # Keep queued batches in the outbox so the tests can count them
+    monkeypatch.setattr(CloudOutbox, 'deliver_pending', staticmethod(lambda limit=None: (0, 0, 0)))
+
+
+def add_records(db, count):
+    db.session.add_all([DeviceRecord(device_id='pm-1', power=float(i), created_at=datetime.now())
+                        for i in range(count)])
+    db.session.commit()
+
+
+def add_endpoint(app, **form):
+    form = {'name': 'cloud', 'url': 'http://cloud.test/api', 'is_active': 'on', 'preset_type': 'power', **form}
+    with app.test_request_context('/settings/add_endpoint', method='POST', data=form):
+        SettingsController.add_endpoint()
+    return EndpointConfig.query.filter_by(name=form['name']).one()
+
+
+def queued_records():
+    return sum(b.record_count for b in OutboxBatch.query.all())
+
+
+def sync(app):
+    with app.test_request_context('/api/sync'):
+        DeviceController.sync_data_records('power')
+
+
+def test_new_endpoint_only_syncs_new_data(app, db):
+    add_records(db, 3)
+    add_endpoint(app)
+    sync(app)
+    assert queued_records() == 0
+
+    add_records(db, 2)
+    sync(app)
+    assert queued_records() == 2
+
+
+def test_history_is_queued_once(app, db):
+    add_records(db, 3)
+    add_endpoint(app, sync_history='on')
+    sync(app)
+    sync(app)
+    assert queued_records() == 3
+
+
+def test_toggle_does_not_resend(app, db):
+    add_records(db, 3)
+    ep = add_endpoint(app, sync_history='on')
+    sync(app)
+    for _ in range(2):
+        with app.test_request_context(f'/settings/toggle_endpoint/{ep.id}'):
+            SettingsController.toggle_endpoint(ep.id)
+    add_records(db, 1) # Written while it was off and on again
+    sync(app)
+    assert queued_records() == 4
+
+
+def test_edit_with_history_restarts_from_the_first_record(app, db):
+    add_records(db, 3)
+    ep = add_endpoint(app)
+    sync(app)
+    add_endpoint(app, endpoint_id=str(ep.id), sync_history='on')
+    sync(app)
+    assert queued_records() == 3